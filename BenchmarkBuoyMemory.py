@@ -0,0 +1,42 @@
+import argparse
+import numpy as np
+from ndbc_analysis_utilities.BuoyDataUtilities import parseBOIFile
+from ndbc_analysis_utilities.FetchEngine import FetchEngine, printMemoryReport
+
+def checkCompactBuoy(buoy, compactBuoy):
+    # compact frames hold the same readings, only in narrower types
+    for dataSetName in ['realtime', 'historical']:
+        buoyDF = buoy.dataFrameRealtime if dataSetName == 'realtime' else buoy.dataFrameHistorical
+        compactDF = compactBuoy.dataFrameRealtime if dataSetName == 'realtime' else compactBuoy.dataFrameHistorical
+        if len(buoyDF) != len(compactDF) or not (buoyDF['Date'].to_numpy() == compactDF['Date'].to_numpy()).all():
+            raise AssertionError(f'{dataSetName} dates differ for station {buoy.stationID}')
+        for colName in buoyDF.columns.drop('Date'):
+            if not np.allclose(buoyDF[colName].to_numpy(), compactDF[colName].to_numpy(dtype=float), atol=1e-5, equal_nan=True):
+                raise AssertionError(f'{dataSetName} {colName} differs for station {buoy.stationID}')
+
+    buoy.setWVHTPercentileHistorical()
+    compactBuoy.setWVHTPercentileHistorical()
+    print(f'station {buoy.stationID}: historical wvht percentile {buoy.wvhtPercentileHistorical:.2f}% (float64) vs {compactBuoy.wvhtPercentileHistorical:.2f}% (compact)')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bf", type=str, required=True, help="text file name containing buoys of interest")
+    parser.add_argument("--nYears", type=int, default=10, help="# of years of historical data to load for each buoy")
+    args = parser.parse_args()
+
+    stationIDs = parseBOIFile(args.bf)
+    reports = dict()
+    buoysByMode = dict()
+    for compactStorage in [False, True]:
+        buoys = FetchEngine(compactStorage=compactStorage).fetchBuoys(stationIDs, False, nYearsBack=args.nYears, nHistoricalMonths=12)
+        buoysByMode[compactStorage] = buoys
+        print(f'---- compactStorage = {compactStorage} ----')
+        reports[compactStorage] = printMemoryReport(buoys)
+
+    for stationID, buoy in buoysByMode[False].items():
+        checkCompactBuoy(buoy, buoysByMode[True][stationID])
+
+    print(f'compact storage: {reports[True] / 1e6:.2f} MB instead of {reports[False] / 1e6:.2f} MB ({reports[True] / reports[False] * 100:.0f}%)')
+
+if __name__ == "__main__":
+    main()
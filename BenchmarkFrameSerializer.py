@@ -0,0 +1,63 @@
+import argparse
+import gzip
+import os
+import time
+import pandas as pd
+from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities import NDBCParser
+from ndbc_analysis_utilities.db_config.FrameSerializer import FrameSerializer
+
+SERIALIZERS = {
+        'json': FrameSerializer('json'),
+        'parquet zstd': FrameSerializer('parquet', 'zstd'),
+        'parquet lz4': FrameSerializer('parquet', 'lz4'),
+        'arrow zstd': FrameSerializer('arrow', 'zstd'),
+        'arrow lz4': FrameSerializer('arrow', 'lz4'),
+        }
+
+def loadHistoricalYears(station: str, nYears: int, dataDir: str) -> dict:
+    buoy = NDBCBuoy(station)
+    years = buoy.getHistoricalYears(nYears)
+    yearDFs = dict()
+    for year in years:
+        if dataDir is not None:
+            with open(os.path.join(dataDir, f'{station}h{year}.txt.gz'), 'rb') as f:
+                yearDFs[year] = NDBCParser.parseHistoricalStdmet(gzip.decompress(f.read()), list(range(1, 13)))
+        else:
+            yearDFs[year] = buoy.fetchHistoricalYear(year, list(range(1, 13)))
+    return yearDFs
+
+def timeRoundTrip(serializer: FrameSerializer, historicalDF: pd.DataFrame, nRepeats: int) -> dict:
+    writeTimes, readTimes = [], []
+    for _ in range(nRepeats):
+        startTime = time.perf_counter()
+        frameBlob = serializer.serialize(historicalDF)
+        writeTimes.append(time.perf_counter() - startTime)
+
+        startTime = time.perf_counter()
+        readDF = serializer.deserialize(frameBlob)
+        readTimes.append(time.perf_counter() - startTime)
+
+    pd.testing.assert_frame_equal(readDF, historicalDF, check_dtype=False)
+    return {'nBytes': len(frameBlob), 'writeTime': min(writeTimes), 'readTime': min(readTimes)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--station", type=str, required=True, help="station ID whose historical data gets serialized")
+    parser.add_argument("--dataDir", type=str, help="directory holding <station>h<year>.txt.gz files to use instead of the NDBC webpage / local cache")
+    parser.add_argument("--nRepeats", type=int, default=3, help="# of times to repeat each write and read, the best time is reported")
+    args = parser.parse_args()
+
+    yearCounts = [1, 5, 10]
+    yearDFs = loadHistoricalYears(args.station, max(yearCounts), args.dataDir)
+    years = sorted(yearDFs)
+
+    print(f"{'years':>5} {'rows':>8} {'format':>13} {'MB stored':>10} {'write s':>8} {'read s':>8}")
+    for nYears in yearCounts:
+        historicalDF = pd.concat([yearDFs[year] for year in years[-nYears:]], ignore_index=True)
+        for name, serializer in SERIALIZERS.items():
+            r = timeRoundTrip(serializer, historicalDF, args.nRepeats)
+            print(f"{nYears:>5} {len(historicalDF):>8} {name:>13} {r['nBytes'] / 1e6:>10.2f} {r['writeTime']:>8.3f} {r['readTime']:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import time
+from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.NDBCTransport import NDBCTransport
+
+def timeHistoricalFetch(buoy: NDBCBuoy, year: int, monthsToCheck: list[int]) -> dict:
+    nRecordsBefore = len(buoy.transport.records)
+    startTime = time.perf_counter()
+    yearDF = buoy.fetchHistoricalYear(year, monthsToCheck)
+    wallTime = time.perf_counter() - startTime
+
+    newRecords = buoy.transport.records[nRecordsBefore:]
+    requestTime = sum(r.latency for r in newRecords)
+    return {
+            'nBytesWire': sum(r.nBytesWire for r in newRecords),
+            'requestTime': requestTime,
+            'parseTime': wallTime - requestTime,
+            'wallTime': wallTime,
+            'nRows': len(yearDF),
+            }
+
+def printResults(results: dict, years: list[int]):
+    print(f"{'year':>6} {'source':>6} {'MB wire':>9} {'request s':>10} {'parse s':>9} {'wall s':>8} {'rows':>8}")
+    for year in years:
+        for source in results:
+            r = results[source][year]
+            print(f"{year:>6} {source:>6} {r['nBytesWire'] / 1e6:>9.3f} {r['requestTime']:>10.2f} {r['parseTime']:>9.2f} {r['wallTime']:>8.2f} {r['nRows']:>8}")
+
+    print('totals:')
+    for source in results:
+        nBytes = sum(r['nBytesWire'] for r in results[source].values())
+        wallTime = sum(r['wallTime'] for r in results[source].values())
+        print(f'{source:>6}: {nBytes / 1e6:.3f} MB over the wire, {wallTime:.2f} s wall time')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--station", type=str, required=True, help="station ID to benchmark")
+    parser.add_argument("--nYears", type=int, default=5, help="# of years of historical data to fetch with each source")
+    parser.add_argument("--pause", type=float, default=5.0, help="pause [s] between requests, not included in the timings")
+    args = parser.parse_args()
+
+    results = dict()
+    for source in ['html', 'gzip']:
+        buoy = NDBCBuoy(args.station)
+        buoy.transport = NDBCTransport()
+        buoy.historicalCache = None
+        buoy.nSecondsToPauseBtwnRequests = 0
+        buoy.historicalSource = source
+        years = buoy.getHistoricalYears(args.nYears)
+        results[source] = dict()
+        for year in years:
+            time.sleep(args.pause)
+            results[source][year] = timeHistoricalFetch(buoy, year, list(range(1, 13)))
+
+    printResults(results, years)
+
+if __name__ == "__main__":
+    main()
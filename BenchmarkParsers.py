@@ -0,0 +1,190 @@
+import argparse
+import gzip
+import io
+import itertools
+import os
+import re
+import time
+import tracemalloc
+import pandas as pd
+from bs4 import BeautifulSoup
+from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities import NDBCParser
+
+ALL_MONTHS = list(range(1, 13))
+
+
+def legacyParseRealtime(content: bytes) -> pd.DataFrame:
+    # the BeautifulSoup + regex parsing that NDBCBuoy used before NDBCParser
+    soupString = str(BeautifulSoup(content, 'html.parser'))
+    rowList = re.split("\n+", soupString)[:-1]
+    entryList = [re.split(" +", iRow) for iRow in rowList]
+    return pd.DataFrame(entryList[2:], columns=entryList[0])
+
+def legacyCleanRealtime(buoyDF: pd.DataFrame, swellDict: dict) -> pd.DataFrame:
+    # per cell applymap, string date concatenation and dict lookup, with MM written as 0.0
+    buoyDF['Date'] = buoyDF['#YY'] + buoyDF['MM'] + buoyDF['DD'] + buoyDF['hh'] + buoyDF['mm']
+    buoyDF['Date'] = pd.to_datetime(buoyDF['Date'], format='%Y%m%d%H%M')
+    buoyDF = buoyDF.loc[:, ['Date', 'WVHT', 'SwP', 'SwD']]
+    buoyDF = buoyDF.applymap(lambda dfItem: "0.0" if dfItem == "MM" else dfItem)
+    buoyDF["WVHT"] = pd.to_numeric(buoyDF["WVHT"])
+    buoyDF["SwP"] = pd.to_numeric(buoyDF["SwP"])
+    buoyDF["SwD"] = pd.to_numeric(buoyDF["SwD"].map(swellDict))
+    return buoyDF
+
+def legacyParseHistorical(content: bytes, monthsToCheck: list[int]) -> pd.DataFrame:
+    soupString = str(BeautifulSoup(content, 'html.parser'))
+    rowList = re.split("\n+", soupString)[:-1]
+    entryList = [re.split(" +", iRow.strip()) for iRow in rowList]
+    buoyDF = pd.DataFrame(entryList[2:], columns=entryList[0])
+
+    buoyDF = buoyDF.drop(buoyDF.loc[buoyDF['WVHT'] == '99.00'].index)
+    buoyDF = buoyDF[buoyDF['MM'].isin([f'{thisMonth:02d}' for thisMonth in monthsToCheck])]
+
+    buoyDF['Date'] = buoyDF['#YY'] + buoyDF['MM'] + buoyDF['DD'] + buoyDF['hh'] + buoyDF['mm']
+    buoyDF['Date'] = pd.to_datetime(buoyDF['Date'], format='%Y%m%d%H%M')
+    buoyDF = buoyDF.loc[:, ['Date', 'WVHT', 'DPD', 'MWD']]
+    for colName in ['WVHT', 'DPD', 'MWD']:
+        buoyDF[colName] = pd.to_numeric(buoyDF[colName])
+    return buoyDF
+
+def legacyFilterRowsByMonth(stream, monthsToCheck: list[int]) -> pd.DataFrame:
+    # the month pushdown before NDBCParser.filterRowsByMonth, splitting every row in Python
+    header, firstRow = NDBCParser.readHeader(stream)
+    monthTokens = {f'{thisMonth:02d}'.encode('ascii') for thisMonth in monthsToCheck}
+    keptRows = [row for row in itertools.chain([firstRow], stream) if row.split(None, 2)[1:2] and row.split(None, 2)[1] in monthTokens]
+    buoyDF = pd.read_csv(io.BytesIO(b''.join(keptRows)), sep=r'\s+', header=None, names=header, usecols=['#YY', 'MM', 'DD', 'hh', 'mm', 'WVHT', 'DPD', 'MWD'],
+                         na_values=[NDBCParser.MISSING_VALUE_MARKER], keep_default_na=False, engine='c')
+    buoyDF = NDBCParser.selectColumnsWithDate(buoyDF[buoyDF['WVHT'] != NDBCParser.HISTORICAL_WVHT_SENTINEL], NDBCParser.HISTORICAL_COLUMNS)
+    for colName in NDBCParser.HISTORICAL_COLUMNS:
+        buoyDF[colName] = buoyDF[colName].mask(buoyDF[colName] == NDBCParser.HISTORICAL_SENTINELS[colName])
+    return buoyDF
+
+def parseGzipStdmet(gzipContent: bytes, monthsToCheck: list[int], parseFn=NDBCParser.parseHistoricalStdmet) -> pd.DataFrame:
+    # decompresses while parsing, the way NDBCBuoy.fetchHistoricalYearGzip reads the .txt.gz files
+    with gzip.GzipFile(fileobj=io.BytesIO(gzipContent)) as gzipFile:
+        return parseFn(gzipFile, monthsToCheck)
+
+def checkRealtimeEquivalence(legacyDF: pd.DataFrame, newDF: pd.DataFrame):
+    # the legacy cleaning wrote missing readings as 0.0 where they are NaN now
+    legacyMissing = (legacyDF[['WVHT', 'SwP']] == 0.0).to_numpy()
+    newMissing = newDF[['WVHT', 'SwP']].isna().to_numpy()
+    if (newMissing & ~legacyMissing).any():
+        raise AssertionError('NaN readings that were not MM in the legacy output')
+    pd.testing.assert_frame_equal(legacyDF, newDF.fillna({'WVHT': 0.0, 'SwP': 0.0}))
+
+def checkHistoricalEquivalence(legacyDF: pd.DataFrame, newDF: pd.DataFrame):
+    # the legacy parser kept the DPD 99.00 and MWD 999 sentinels as readings, they are NaN now
+    expectedDF = legacyDF.copy()
+    for colName in ['DPD', 'MWD']:
+        sentinel = NDBCParser.HISTORICAL_SENTINELS[colName]
+        if (newDF[colName] == sentinel).any():
+            raise AssertionError(f'{colName} sentinel {sentinel} left in the parsed output')
+        expectedDF[colName] = expectedDF[colName].astype('float64').mask(expectedDF[colName] == sentinel)
+    pd.testing.assert_frame_equal(expectedDF, newDF)
+
+def loadFiles(station: str, nYears: int, dataDir: str) -> tuple:
+    buoy = NDBCBuoy(station)
+    buoy.nSecondsToPauseBtwnRequests = 0
+    years = buoy.getHistoricalYears(nYears)
+    if dataDir is not None:
+        with open(os.path.join(dataDir, f'{station}.spec'), 'rb') as f:
+            realtimeContent = f.read()
+        historicalGzipContents = dict()
+        for year in years:
+            with open(os.path.join(dataDir, f'{station}h{year}.txt.gz'), 'rb') as f:
+                historicalGzipContents[year] = f.read()
+        return buoy, realtimeContent, historicalGzipContents
+
+    realtimeContent = buoy.makeRealtimeDataRequest().content
+    historicalGzipContents = dict()
+    for year in years:
+        historicalGzipContents[year] = buoy.makeRawHistoricalDataRequest(year).content
+    return buoy, realtimeContent, historicalGzipContents
+
+def timeParser(parseFn, nRepeats: int) -> tuple:
+    bestTime = None
+    for _ in range(nRepeats):
+        startTime = time.perf_counter()
+        result = parseFn()
+        elapsed = time.perf_counter() - startTime
+        bestTime = elapsed if bestTime is None else min(bestTime, elapsed)
+    return bestTime, result
+
+def measurePeakMemory(parseFn) -> float:
+    tracemalloc.start()
+    parseFn()
+    _, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peakBytes
+
+def benchmarkMonthPushdown(historicalGzipContents: dict, monthsToCheck: list[int], nRepeats: int):
+    # time and peak memory per year when only some months are requested versus the full year, decompression included
+    print(f'historical stdmet .txt.gz, months {monthsToCheck} versus the full year:')
+    variants = {
+            'full year': lambda content: parseGzipStdmet(content, ALL_MONTHS),
+            'split loop': lambda content: parseGzipStdmet(content, monthsToCheck, legacyFilterRowsByMonth),
+            f'{len(monthsToCheck)} months': lambda content: parseGzipStdmet(content, monthsToCheck),
+            }
+    monthDFs = dict()
+    for name, parseFn in variants.items():
+        parseTime, peakBytes, yearDFs = 0.0, 0, []
+        for content in historicalGzipContents.values():
+            yearTime, yearDF = timeParser(lambda: parseFn(content), nRepeats)
+            parseTime += yearTime
+            peakBytes = max(peakBytes, measurePeakMemory(lambda: parseFn(content)))
+            yearDFs.append(yearDF.reset_index(drop=True))
+        monthDFs[name] = pd.concat(yearDFs, ignore_index=True)
+        print(f'{name:>10}: {parseTime:.3f} s, {peakBytes / 1e6:.1f} MB peak memory per year, {len(monthDFs[name])} rows')
+
+    fullYearDF = monthDFs['full year']
+    expectedDF = fullYearDF[fullYearDF['Date'].dt.month.isin(monthsToCheck)].reset_index(drop=True)
+    for name in list(variants)[1:]:
+        pd.testing.assert_frame_equal(expectedDF, monthDFs[name])
+    print('month pushdown output matches the filtered full year')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--station", type=str, required=True, help="station ID to benchmark")
+    parser.add_argument("--nYears", type=int, default=10, help="# of years of historical data to parse")
+    parser.add_argument("--dataDir", type=str, help="directory holding <station>.spec and <station>h<year>.txt.gz files to use instead of downloading them")
+    parser.add_argument("--nHistoricalMonths", type=int, default=3, help="# of months around the current one for the month pushdown benchmark")
+    parser.add_argument("--nRepeats", type=int, default=3, help="# of times to repeat each parse, the best time is reported")
+    args = parser.parse_args()
+
+    buoy, realtimeContent, historicalGzipContents = loadFiles(args.station, args.nYears, args.dataDir)
+    historicalContents = {year: gzip.decompress(content) for year, content in historicalGzipContents.items()}
+    historicalContent = b''.join(historicalContents.values())
+    nRealtimeRows = realtimeContent.count(b'\n') - 2
+    nHistoricalRows = sum(content.count(b'\n') - 2 for content in historicalContents.values())
+
+    legacyRawDF = legacyParseRealtime(realtimeContent)
+    newRawDF = NDBCParser.parseRealtimeSpec(realtimeContent)
+
+    # name: (legacy function, new function, equivalence check)
+    benchmarks = {
+            f'realtime .spec parse + clean ({nRealtimeRows} rows)': (
+                lambda: legacyCleanRealtime(legacyParseRealtime(realtimeContent), buoy.swellDict),
+                lambda: buoy.cleanRealtimeDataFrame(NDBCParser.parseRealtimeSpec(realtimeContent)),
+                checkRealtimeEquivalence),
+            f'realtime .spec clean only ({nRealtimeRows} rows)': (
+                lambda: legacyCleanRealtime(legacyRawDF.copy(), buoy.swellDict),
+                lambda: buoy.cleanRealtimeDataFrame(newRawDF.copy()),
+                checkRealtimeEquivalence),
+            f'historical stdmet, {len(historicalContents)} years ({nHistoricalRows} rows)': (
+                lambda: pd.concat([legacyParseHistorical(content, ALL_MONTHS) for content in historicalContents.values()]),
+                lambda: pd.concat([NDBCParser.parseHistoricalStdmet(content, ALL_MONTHS) for content in historicalContents.values()]),
+                checkHistoricalEquivalence),
+            }
+
+    print(f'{len(realtimeContent) / 1e6:.2f} MB of realtime data, {len(historicalContent) / 1e6:.2f} MB of historical data')
+    for name, (legacyFn, newFn, checkFn) in benchmarks.items():
+        legacyTime, legacyDF = timeParser(legacyFn, args.nRepeats)
+        newTime, newDF = timeParser(newFn, args.nRepeats)
+        checkFn(legacyDF, newDF)
+        print(f'{name}: legacy {legacyTime:.4f} s, new {newTime:.4f} s, {legacyTime / newTime:.1f}x faster, equivalent output')
+
+    benchmarkMonthPushdown(historicalGzipContents, buoy.getHistoricalMonths(args.nHistoricalMonths), args.nRepeats)
+
+if __name__ == "__main__":
+    main()
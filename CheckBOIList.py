@@ -1,6 +1,7 @@
 import argparse
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
 from ndbc_analysis_utilities.BuoyDataUtilities import parseBOIFile, getActiveNDBCStations
+from ndbc_analysis_utilities.NDBCTransport import getSharedTransport
 import os
 
 def makeDataRequest(stationID: str) -> bool:
@@ -56,5 +57,7 @@ def main():
     else:
         print('All stations are valid!')
 
+    getSharedTransport().printSummary()
+
 if __name__ == "__main__":
     main()
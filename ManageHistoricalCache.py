@@ -0,0 +1,35 @@
+import argparse
+from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
+from ndbc_analysis_utilities.LocalCache import getSharedHistoricalCache
+
+def warmCache(boiFName: str, nYears: int):
+    activeBOI = getActiveBOI(boiFName)
+    FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=nYears, nHistoricalMonths=12)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--action", type=str, required=True, help="list, warm or prune")
+    parser.add_argument("--bf", type=str, help="name of text file containing buoys of interest (warm)")
+    parser.add_argument("--nYears", type=int, default=5, help="# of past years to download for each buoy (warm)")
+    parser.add_argument("--maxMB", type=float, help="size [MB] to prune the cache down to (prune), defaults to the cache size limit")
+    args = parser.parse_args()
+
+    historicalCache = getSharedHistoricalCache()
+    if args.action == 'list':
+        historicalCache.printContents()
+    elif args.action == 'warm':
+        if args.bf is None:
+            raise ValueError('--bf is required to warm the cache')
+        warmCache(args.bf, args.nYears)
+        historicalCache.printContents()
+    elif args.action == 'prune':
+        maxBytes = None if args.maxMB is None else int(args.maxMB * 1e6)
+        evicted = historicalCache.prune(maxBytes)
+        print(f'Pruned {len(evicted)} cached years')
+        historicalCache.printContents()
+    else:
+        raise ValueError('Unrecognized action argument')
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF, getMonthName
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
 from ndbc_analysis_utilities.PlottingUtilities import makeCircularHist
-from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrame
+from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrames, queryHistoricalDataFrames, countHistoricalSamples
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -14,6 +13,19 @@ def getSwellDirs(df: pd.core.frame.DataFrame, month: int, minPeriod: float, minW
     swellDirs = goodSamples['MWD'].to_numpy()
     return swellDirs
 
+def getSwellDirsFromDB(activeBOI: dict, month: int, minPeriod: float, minWvht: float, nYears: int) -> dict:
+    # the database only sends the directions of the month's samples that pass the filters, plus the month's sample counts
+    goodSampleDFs = queryHistoricalDataFrames(activeBOI, nYears, months=[month], minPeriod=minPeriod, minWvht=minWvht, columns=['MWD'])
+    nMonthSamples = countHistoricalSamples(activeBOI, nYears, months=[month])
+    swellDirs = dict()
+    for stationID, goodSamples in goodSampleDFs.items():
+        if nMonthSamples[stationID] == 0:
+            print(f'No historical samples for station {stationID} in month {month}')
+            continue
+        print(f'% of samples that passed filtering = {len(goodSamples) / nMonthSamples[stationID] * 100:.1f}%')
+        swellDirs[stationID] = goodSamples['MWD'].to_numpy()
+    return swellDirs
+
 def plotDirDistribution(swellDirs: np.ndarray, stationID: str, month: int, showPlot: bool, minPeriod: float, minWvht: float):
     swellDirsRad = np.deg2rad(swellDirs) 
 
@@ -33,8 +45,13 @@ def plotDirDistribution(swellDirs: np.ndarray, stationID: str, month: int, showP
         plt.savefig(f'station_{stationID}_swelldist_{getMonthName(month)}.png', format='png')
 
 def makeDistributionPlots(activeBOI: dict, args: argparse.Namespace):
-    for stationID in activeBOI:
-        historicalDF = getCompleteHistoricalDataFrame(NDBCBuoy(stationID), args.nYears)
+    if args.db:
+        for stationID, swellDirs in getSwellDirsFromDB(activeBOI, args.month, args.minPeriod, args.minWvht, args.nYears).items():
+            plotDirDistribution(swellDirs, stationID, args.month, args.show, args.minPeriod, args.minWvht)
+        return
+
+    historicalDFs = getCompleteHistoricalDataFrames(activeBOI, args.nYears)
+    for stationID, historicalDF in historicalDFs.items():
         swellDirs = getSwellDirs(historicalDF, args.month, args.minPeriod, args.minWvht)
         plotDirDistribution(swellDirs, stationID, args.month, args.show, args.minPeriod, args.minWvht)
 
@@ -46,6 +63,7 @@ def main():
     parser.add_argument("--minWvht", type=float, default=0.0, help="minimum wave height [m] for filtering historical data")
     parser.add_argument("--month", type=int, required=True, help="month to look at (1-12)")
     parser.add_argument("--show", action='store_true', help="use this flag if you want to display the figures instead of saving them")
+    parser.add_argument("--db", action='store_true', help="use this flag if you are using a MySQL db instance")
     args = parser.parse_args()
 
     activeBOI = getActiveBOI(args.bf)
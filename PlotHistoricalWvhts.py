@@ -1,7 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
-from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrame
+from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrames, getClimatologiesForPlots
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -35,6 +34,25 @@ def processHistoricalData(df: pd.core.frame.DataFrame, minPeriod: float) -> tupl
     print(f"met period threshold percentages = {[f'{x:.2f}' for x in metPeriodThresholdPercentages]}")
     return percentileData, metPeriodThresholdPercentages
 
+def processClimatology(climatology: dict, minPeriod: float) -> tuple:
+    # same numbers as processHistoricalData, from the monthly climatology in the db
+    percentileData = [[], []]
+    metPeriodThresholdPercentages = []
+    for month in range(1, 13):
+        monthClimatology = climatology.get(month)
+        if monthClimatology is None:
+            # missing months become gaps in the plot
+            metPeriodThresholdPercentages.append(np.nan)
+            percentileData[0].append(np.nan)
+            percentileData[1].append(np.nan)
+            continue
+        metPeriodThresholdPercentages.append(monthClimatology.calcPercentAboveThresholds(minPeriod=minPeriod))
+        percentileData[0].append(monthClimatology.getWvhtAtPercentile(50, minPeriod))
+        percentileData[1].append(monthClimatology.getWvhtAtPercentile(90, minPeriod))
+
+    print(f"met period threshold percentages = {[f'{x:.2f}' for x in metPeriodThresholdPercentages]}")
+    return percentileData, metPeriodThresholdPercentages
+
 def transformData(data: list, currentRange: tuple, newRange: tuple) -> list:
     # transforms data from currentRange to newRange
     a, b = currentRange
@@ -68,9 +86,18 @@ def plotWvhts(percentileData: list, stationID: str, showPlot: bool, markerSizeDa
         plt.savefig(f'station_{stationID}_historicalwvhts.png', format='png')
 
 
-def plotWvhtsForStations(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float):
-    for stationID in activeBOI:
-        df = getCompleteHistoricalDataFrame(NDBCBuoy(stationID), nYearsBack)
+def plotWvhtsForStations(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float, useDB: bool):
+    if useDB:
+        for stationID, climatology in getClimatologiesForPlots(activeBOI).items():
+            firstYears = [c.firstYear for c in climatology.values() if c.firstYear is not None]
+            lastYears = [c.lastYear for c in climatology.values() if c.lastYear is not None]
+            print(f'climatology for station {stationID} covers {min(firstYears, default=None)} to {max(lastYears, default=None)}')
+            percentileData, metThresholdPercentages = processClimatology(climatology, minPeriod)
+            plotWvhts(percentileData, stationID, showPlots, metThresholdPercentages, minPeriod)
+        return
+
+    historicalDFs = getCompleteHistoricalDataFrames(activeBOI, nYearsBack)
+    for stationID, df in historicalDFs.items():
 
         percentileData, metThresholdPercentages = processHistoricalData(df, minPeriod)
 
@@ -81,11 +108,12 @@ def main():
     parser.add_argument("--bf", type=str, required=True, help="text file name containing buoys of interest")
     parser.add_argument("--nYears", type=int, required=True, help="# of years to include in historical data")
     parser.add_argument("--minPeriod", type=float, default=0.0, help="minimum swell period [s] for filtering historical data")
+    parser.add_argument("--db", action='store_true', help="use this flag to take the monthly climatology from the db instead of loading the historical data (--nYears is then set by UpdateSwellDB.py)")
     parser.add_argument("--show", action='store_true', help="use this flag if you want to display the figures instead of saving them")
     args = parser.parse_args()
 
     activeBOI = getActiveBOI(args.bf)
-    plotWvhtsForStations(activeBOI, args.nYears, args.show, args.minPeriod)
+    plotWvhtsForStations(activeBOI, args.nYears, args.show, args.minPeriod, args.db)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF, getMonthName, getNthPercentileSampleWithoutPMF
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -42,12 +42,8 @@ def plotGoodDaysPerYear(nGoodDays: list, years: list, stationID: str, showPlot:
 def makeNGoodDaysPlots(activeBOI: dict, args: argparse.Namespace):
     thisYear = datetime.datetime.now().year
     years = list(range(thisYear - args.nYears, thisYear))
-    for stationID in activeBOI:
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.nYearsBack = args.nYears
-        thisBuoy.nHistoricalMonths = 12
-        thisBuoy.buildHistoricalDataFrame()
-
+    buoys = FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=args.nYears, nHistoricalMonths=12)
+    for stationID, thisBuoy in buoys.items():
         nGoodDays = getNGoodDaysPerYear(thisBuoy.dataFrameHistorical, years, args.month, args.minPeriod, args.wvhtPercentile)
 
         plotGoodDaysPerYear(nGoodDays, years, stationID, args.show, args.minPeriod, args.wvhtPercentile, args.month)
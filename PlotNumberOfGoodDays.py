@@ -1,6 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -36,12 +36,8 @@ def plotNGoodDays(avgNGoodDays: list, minPeriod: float, minWvht: float, stationI
         plt.savefig(f'station_{stationID}_numgooddays.png', format='png')
 
 def makeNGoodDaysPlots(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float, minWvht: float):
-    for stationID in activeBOI:
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.nYearsBack = nYearsBack
-        thisBuoy.nHistoricalMonths = 12
-        thisBuoy.buildHistoricalDataFrame()
-
+    buoys = FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=nYearsBack, nHistoricalMonths=12)
+    for stationID, thisBuoy in buoys.items():
         nGoodDaysPerMonth = countGoodDays(thisBuoy.dataFrameHistorical, minPeriod, minWvht)
         avgNGoodDays = [s / nYearsBack for s in nGoodDaysPerMonth]
         print(f"avg # of good days for each month = {[f'{x:.1f}' for x in avgNGoodDays]}")
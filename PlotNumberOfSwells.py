@@ -1,6 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -36,12 +36,8 @@ def plotAvgSwellsPerMonth(avgSwellsPerMonth: list, minPeriod: float, minWvht: fl
         plt.savefig(f'station_{stationID}_numswells.png', format='png')
 
 def makeAvgSwellsPlots(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float, minWvht: float):
-    for stationID in activeBOI:
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.nYearsBack = nYearsBack
-        thisBuoy.nHistoricalMonths = 12
-        thisBuoy.buildHistoricalDataFrame()
-
+    buoys = FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=nYearsBack, nHistoricalMonths=12)
+    for stationID, thisBuoy in buoys.items():
         nSwellsPerMonth = analyzeSwells(thisBuoy.dataFrameHistorical, minPeriod, minWvht)
         avgSwellsPerMonth = [s / nYearsBack for s in nSwellsPerMonth]
         print(f"avg # of swells for each month = {[f'{x:.1f}' for x in avgSwellsPerMonth]}")
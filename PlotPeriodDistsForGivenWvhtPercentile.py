@@ -1,7 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF, estimateDensityTophatKernel, getNthPercentileSampleWithoutPMF, getMonthName
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
-from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrame
+from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrames, queryHistoricalDataFrames
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -37,8 +36,12 @@ def plotPeriodDist(periodSamples: np.ndarray, stationID: str, showPlot: bool, mi
 
 
 def makePeriodDistributionPlots(activeBOI: dict, args: argparse.Namespace):
-    for stationID in activeBOI:
-        historicalDF = getCompleteHistoricalDataFrame(NDBCBuoy(stationID), args.nYears)
+    if args.db:
+        # the percentile needs every waveheight of the month, so only the month and the columns are filtered in the database
+        historicalDFs = queryHistoricalDataFrames(activeBOI, args.nYears, months=[args.month], columns=['WVHT', 'DPD'])
+    else:
+        historicalDFs = getCompleteHistoricalDataFrames(activeBOI, args.nYears)
+    for stationID, historicalDF in historicalDFs.items():
         periodSamples = getPeriodSamples(historicalDF, args.month, args.wvhtPercentile)
         plotPeriodDist(periodSamples, stationID, args.show, args.minPeriod, args.wvhtPercentile, args.month)
 
@@ -50,6 +53,7 @@ def main():
     parser.add_argument("--wvhtPercentile", type=float, required=True, help="selected measurements need to have wvht measurements at or above this percentile")
     parser.add_argument("--month", type=int, required=True, help="month to look at (1-12)")
     parser.add_argument("--show", action='store_true', help="use this flag if you want to display the figures instead of saving them")
+    parser.add_argument("--db", action='store_true', help="use this flag if you are using a MySQL db instance")
     args = parser.parse_args()
 
     activeBOI = getActiveBOI(args.bf)
@@ -1,6 +1,7 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -28,12 +29,8 @@ def plotPercentAboveThreshold(metThresholdPercentages: list, minPeriod: float, s
         plt.savefig(f'station_{stationID}_periodThreshold.png', format='png')
 
 def makePeriodFilterPlots(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float):
-    for stationID in activeBOI:
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.nYearsBack = nYearsBack
-        thisBuoy.nHistoricalMonths = 12
-        thisBuoy.buildHistoricalDataFrame()
-
+    buoys = FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=nYearsBack, nHistoricalMonths=12)
+    for stationID, thisBuoy in buoys.items():
         metThresholdPercentages = processHistoricalDataThroughPeriodFilter(thisBuoy, minPeriod)
         print(f"met period threshold percentages = {[f'{x:.2f}' for x in metThresholdPercentages]}")
         plotPercentAboveThreshold(metThresholdPercentages, minPeriod, stationID, showPlots)
@@ -2,12 +2,12 @@ import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, truncateAndReverse, restricted_nDays_int, getNthPercentileSampleWithoutPMF
 from ndbc_analysis_utilities.PlottingUtilities import convertTimestampsToTimedeltas, getColors
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import matplotlib.cm as cmx
-import traceback
 
 def getRecentWvhtsAndPeriods(buoy: NDBCBuoy, nDays: int) -> tuple[np.ndarray]:
     nSamples = buoy.convertRequestedDaysIntoSamples(nDays)
@@ -62,17 +62,8 @@ def plotRecentData(dates: np.ndarray, wvhts: np.ndarray, swp: np.ndarray, statio
         plt.savefig(f'station_{stationID}_recentgooddays.png', format='png')
 
 def makeGoodSamplesPlots(activeBOI: dict, args: argparse.Namespace):
-    for stationID in activeBOI:
-        buoy = NDBCBuoy(stationID)
-        try:
-            buoy.fetchData(args.db)
-        except Exception as e:
-            print(f'---------')
-            print(f'EXCEPTION: {e}')
-            traceback.print_exc()
-            print(f'---------')
-            continue
-
+    buoys = FetchEngine().fetchBuoys(activeBOI, args.db)
+    for stationID, buoy in buoys.items():
         dates, wvhts, swp = getRecentWvhtsAndPeriods(buoy, args.nDays)
         minWvht = getNthPercentileSampleWithoutPMF(buoy.dataFrameHistorical['WVHT'].to_numpy(), args.wvhtPer)
         nGoodDays = calcNumGoodDays(buoy.dataFrameRealtime.head(len(dates)), minWvht, args.minPeriod)
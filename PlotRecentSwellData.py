@@ -1,16 +1,12 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, truncateAndReverse, restricted_nDays_int
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import numpy as np
 import matplotlib.pyplot as plt
 import traceback
 
-def getRecentSwellData(buoy: NDBCBuoy, useDB: bool, nDays: int) -> tuple[np.ndarray]:
-    if useDB:
-        buoy.fetchDataFromDB()
-    else:
-        buoy.buildRealtimeDataFrame()
-
+def getRecentSwellData(buoy: NDBCBuoy, nDays: int) -> tuple[np.ndarray]:
     nSamples = buoy.convertRequestedDaysIntoSamples(nDays)
     columnNames = ['Date', 'WVHT', 'SwP', 'SwD']
     dataContainer = []
@@ -55,9 +51,15 @@ def plotRecentData(dates: np.ndarray, wvhts: np.ndarray, swp: np.ndarray, swd: n
         plt.savefig(f'station_{stationID}_recentswelldata.png', format='png')
 
 def makeRecentPlots(activeBOI: dict, useDB: bool, nDays: int, showPlots: bool):
-    for stationID in activeBOI:
+    fetchEngine = FetchEngine()
+    if useDB:
+        buoys = fetchEngine.fetchBuoys(activeBOI, useDB)
+    else:
+        buoys = fetchEngine.fetchRealtimeBuoys(activeBOI)
+
+    for stationID, buoy in buoys.items():
         try:
-            dates, wvhts, swp, swd = getRecentSwellData(NDBCBuoy(stationID), useDB, nDays)
+            dates, wvhts, swp, swd = getRecentSwellData(buoy, nDays)
         except Exception as e:
             print(f'---------')
             print(f'EXCEPTION: {e}')
@@ -1,7 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF, getMonthName
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
-from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrame
+from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getCompleteHistoricalDataFrames
 from ndbc_analysis_utilities.PlottingUtilities import makeCircularHist
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -45,8 +44,8 @@ def plotDirDists(swellDirs: list[np.ndarray], stationID: str, showPlot: bool, mi
         plt.savefig(f'station_{stationID}_swelldists_allmonths.png', format='png')
 
 def makeDistributionPlots(activeBOI: dict, args: argparse.Namespace):
-    for stationID in activeBOI:
-        historicalDF = getCompleteHistoricalDataFrame(NDBCBuoy(stationID), args.nYears)
+    historicalDFs = getCompleteHistoricalDataFrames(activeBOI, args.nYears)
+    for stationID, historicalDF in historicalDFs.items():
         swellDirs = getSwellDirs(historicalDF, args.minPeriod, args.minWvht)
         plotDirDists(swellDirs, stationID, args.show, args.minPeriod, args.minWvht)
 
@@ -2,6 +2,7 @@ import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, truncateAndReverse, restricted_nDays_int 
 from ndbc_analysis_utilities.PlottingUtilities import makeCircularHist, convertTimestampsToTimedeltas, getColors
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
@@ -58,10 +59,9 @@ def plotSwellDirs(dates: np.ndarray, swd: np.ndarray, historicalSwd: np.ndarray,
         plt.savefig(f'station_{stationID}_recentswelldir_wdist.png', format='png')
 
 def makeDirDistPlot(activeBOI: dict, useDB: bool, nDays: int, showPlots: bool):
-    for stationID in activeBOI:
+    buoys = FetchEngine().fetchBuoys(activeBOI, useDB)
+    for stationID, buoy in buoys.items():
         try:
-            buoy = NDBCBuoy(stationID)
-            buoy.fetchData(useDB)
             dates, swd = getRecentSwellDirData(buoy, nDays)
             historicalSwd = getHistoricalSwellDirs(buoy)
         except Exception as e:
@@ -3,24 +3,52 @@ import numpy as np
 import plotly.graph_objects as go
 import argparse
 
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 from ndbc_analysis_utilities.BuoyDataUtilities import calcDistanceBetweenNM, getActiveBOI, convertSwellETAToDistance, convertDegreesToRadians, convertMetersToNM
 
 class SwellMapMaker():
-    def __init__(self, currentLoc: tuple, useDB=True):
+    def __init__(self, currentLoc: tuple, useDB=True, useLatestObs=False, calcPercentiles=True, dbBackend=None, useClimatology=False):
         self.currentLoc = currentLoc
         self.useDB = useDB
+        self.dbBackend = dbBackend   # StorageBackend for the database reads, None uses getSharedBackend
+        self.useLatestObs = useLatestObs   # one latest_obs.txt request for the readings instead of each station's realtime data
+        self.calcPercentiles = calcPercentiles
+        self.useClimatology = useClimatology   # historical percentiles from the database's monthly climatology instead of the samples
+
+    def fetchBuoys(self, activeBOI: dict) -> dict:
+        fetchEngine = FetchEngine(dbBackend=self.dbBackend)
+        if not self.useLatestObs:
+            if self.calcPercentiles or self.useDB:
+                buoys = fetchEngine.fetchBuoys(activeBOI, self.useDB)
+                if self.calcPercentiles and self.useClimatology:
+                    fetchEngine.loadClimatologies(buoys)
+                return buoys
+
+            # without percentiles only the realtime data is needed
+            buoys = fetchEngine.fetchRealtimeBuoys(activeBOI)
+            for thisBuoy in buoys.values():
+                thisBuoy.setRecentReadings()
+            return buoys
+
+        buoys = fetchEngine.fetchLatestBuoys(activeBOI)
+        if self.calcPercentiles and self.useClimatology:
+            buoys = fetchEngine.loadClimatologies(buoys)
+            buoysWithoutClimatology = {stationID: buoy for stationID, buoy in buoys.items() if buoy.climatology is None}
+            fetchEngine.loadHistoricalData(buoysWithoutClimatology, self.useDB)
+        elif self.calcPercentiles:
+            buoys = fetchEngine.loadHistoricalData(buoys, self.useDB)
+        return buoys
 
     def buildBOIDF(self, activeBOI: dict):
         boiData = []
-        for stationID, stationLatLon in activeBOI.items():
-            print(f'Instantiating NDBCBuoy {stationID}...')
-            thisBuoy = NDBCBuoy(stationID)
-            
-            thisBuoy.fetchData(self.useDB)
-
-            thisBuoy.setWVHTPercentileHistorical()
-            thisBuoy.setWVHTPercentileRealtime()
+        buoys = self.fetchBuoys(activeBOI)
+        for stationID, thisBuoy in buoys.items():
+            stationLatLon = activeBOI[stationID]
+            if self.calcPercentiles:
+                thisBuoy.setWVHTPercentileHistorical()
+                if not self.useLatestObs:
+                    # the realtime percentile needs the 45 days of realtime data that latest_obs.txt stands in for
+                    thisBuoy.setWVHTPercentileRealtime()
             distanceAway = calcDistanceBetweenNM(self.currentLoc, stationLatLon)
             buoyInfo = [stationID, stationLatLon[0], stationLatLon[1], distanceAway]
             buoyReadings = [thisBuoy.recentWVHT, thisBuoy.recentSwP, thisBuoy.recentSwD, thisBuoy.wvhtPercentileRealtime, thisBuoy.wvhtPercentileHistorical]
@@ -172,7 +200,7 @@ class SwellMapMaker():
 
     def calculateMarkerSizes(self, wvhtPercentiles):
         minMarkerSize = 6 
-        markerSizes = wvhtPercentiles // 10 + minMarkerSize 
+        markerSizes = np.maximum(wvhtPercentiles, 0) // 10 + minMarkerSize   # percentiles are -1 when they were not calculated
         return markerSizes
 
     def getMarkerColors(self, swp):
@@ -334,12 +362,15 @@ def main():
     parser.add_argument("--lon", type=float, required=True, help="longitude in degrees")
     parser.add_argument("--bf", type=str, required=True, help="text file name containing buoys of interest")
     parser.add_argument("--db", action='store_true', help="use this flag if you are using a MySQL db instance")
+    parser.add_argument("--latest", action='store_true', help="take the current readings from NDBC's latest_obs.txt in a single request")
+    parser.add_argument("--climatology", action='store_true', help="take the historical percentiles from the monthly climatology in the db instead of the historical samples")
+    parser.add_argument("--noPercentiles", action='store_true', help="skip the historical wave height percentiles (and loading the historical data)")
 
     args = parser.parse_args()
 
     activeBOI = getActiveBOI(args.bf)
     currentLoc = (args.lat, args.lon)
-    mapMaker = SwellMapMaker(currentLoc, args.db)
+    mapMaker = SwellMapMaker(currentLoc, args.db, args.latest, not args.noPercentiles, useClimatology=args.climatology)
     mapMaker.buildBOIDF(activeBOI)
     mapMaker.mapBuoys()
 
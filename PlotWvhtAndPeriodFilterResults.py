@@ -1,6 +1,7 @@
 import argparse
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, getMonthlyDF
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
+from ndbc_analysis_utilities.HistoricalAnalysisUtilities import getClimatologiesForPlots
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
@@ -23,6 +24,23 @@ def processHistoricalDataThroughFilter(df: pd.core.frame.DataFrame, minPeriod: f
 
     return jointResults, periodResults, wvhtResults
 
+def processClimatologyThroughFilter(climatology: dict, minPeriod: float, minWvht: float) -> list:
+    # same percentages as processHistoricalDataThroughFilter, from the monthly climatology in the db
+    jointResults, periodResults, wvhtResults = [], [], []
+    for month in range(1, 13):
+        monthClimatology = climatology.get(month)
+        if monthClimatology is None:
+            # missing months become gaps in the plot
+            jointResults.append(np.nan)
+            periodResults.append(np.nan)
+            wvhtResults.append(np.nan)
+            continue
+        jointResults.append(monthClimatology.calcPercentAboveThresholds(minPeriod=minPeriod, minWvht=minWvht))
+        periodResults.append(monthClimatology.calcPercentAboveThresholds(minPeriod=minPeriod))
+        wvhtResults.append(monthClimatology.calcPercentAboveThresholds(minWvht=minWvht))
+
+    return jointResults, periodResults, wvhtResults
+
 def plotPercentAboveThreshold(jointResults: list, periodResults: list, wvhtResults: list, minPeriod: float, minWvht: float, stationID: str, showPlot: bool):
     months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
     plt.plot(months, periodResults, 'o-', color="darkorange", zorder=2, label="period filter")
@@ -40,13 +58,16 @@ def plotPercentAboveThreshold(jointResults: list, periodResults: list, wvhtResul
     else:
         plt.savefig(f'station_{stationID}_periodandwvhtthreshold.png', format='png')
 
-def makePeriodWvhtFilterPlots(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float, minWvht: float):
-    for stationID in activeBOI:
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.nYearsBack = nYearsBack
-        thisBuoy.nHistoricalMonths = 12
-        thisBuoy.buildHistoricalDataFrame()
+def makePeriodWvhtFilterPlots(activeBOI: dict, nYearsBack: int, showPlots: bool, minPeriod: float, minWvht: float, useDB: bool):
+    if useDB:
+        for stationID, climatology in getClimatologiesForPlots(activeBOI).items():
+            joint, period, wvht = processClimatologyThroughFilter(climatology, minPeriod, minWvht)
+            print(f"met period and wvht threshold percentages = {[f'{x:.2f}' for x in joint]}")
+            plotPercentAboveThreshold(joint, period, wvht, minPeriod, minWvht, stationID, showPlots)
+        return
 
+    buoys = FetchEngine().fetchHistoricalBuoys(activeBOI, nYearsBack=nYearsBack, nHistoricalMonths=12)
+    for stationID, thisBuoy in buoys.items():
         joint, period, wvht = processHistoricalDataThroughFilter(thisBuoy.dataFrameHistorical, minPeriod, minWvht)
         print(f"met period and wvht threshold percentages = {[f'{x:.2f}' for x in joint]}")
         plotPercentAboveThreshold(joint, period, wvht, minPeriod, minWvht, stationID, showPlots)
@@ -57,11 +78,12 @@ def main():
     parser.add_argument("--nYears", type=int, required=True, help="# of years to include in historical data")
     parser.add_argument("--minPeriod", type=float, required=True, help="minimum swell period [s] for filtering historical data")
     parser.add_argument("--minWvht", type=float, required=True, help="minimum wave height [m] for filtering historical data")
+    parser.add_argument("--db", action='store_true', help="use this flag to take the monthly climatology from the db instead of loading the historical data (--nYears is then set by UpdateSwellDB.py)")
     parser.add_argument("--show", action='store_true', help="use this flag if you want to display the figures instead of saving them")
     args = parser.parse_args()
 
     activeBOI = getActiveBOI(args.bf)
-    makePeriodWvhtFilterPlots(activeBOI, args.nYears, args.show, args.minPeriod, args.minWvht)
+    makePeriodWvhtFilterPlots(activeBOI, args.nYears, args.show, args.minPeriod, args.minWvht, args.db)
 
 if __name__ == "__main__":
     main()
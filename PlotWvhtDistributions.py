@@ -1,5 +1,6 @@
 import argparse
 from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.FetchEngine import FetchEngine
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI, calcDistanceBetweenNM, convertDistanceToSwellETA, calculateBearingAngle, estimateDensityTophatKernel, getNthPercentileSample, restricted_nDays_int, truncateAndReverse
 from ndbc_analysis_utilities.PlottingUtilities import convertTimestampsToTimedeltas
 import numpy as np
@@ -104,12 +105,9 @@ def checkForArrivalWindow(swellDir: float, bearingAngle: float, distanceAway: fl
 
 def makeWVHTDistributionPlots(activeBOI: dict, args: argparse.Namespace):
     currentLoc = (args.lat, args.lon)
-    for stationID, stationLatLon in activeBOI.items():
-        print(f'Instantiating NDBCBuoy {stationID}...')
-        thisBuoy = NDBCBuoy(stationID)
-
-        thisBuoy.fetchData(args.db)
-
+    buoys = FetchEngine().fetchBuoys(activeBOI, args.db)
+    for stationID, thisBuoy in buoys.items():
+        stationLatLon = activeBOI[stationID]
         bearingAngle = calculateBearingAngle(stationLatLon, currentLoc)  # from buoy to current location in degrees
         arrivalWindow = checkForArrivalWindow(thisBuoy.recentSwD, bearingAngle, calcDistanceBetweenNM(currentLoc, stationLatLon))
 
@@ -19,9 +19,14 @@ def main():
             print(f'station {stationID} is not in the database, so we do not need to remove it')
             continue
 
-        # remove realtime entries, historical entries, stations table entry
+        # remove realtime entries, historical entries, cached frames, freshness rows, stations table entry
         dbInteractor.removeRealtimeSamplesForStation(stationID)
         dbInteractor.removeHistoricalSamplesForStation(stationID)
+        dbInteractor.removeArchiveForStation(stationID)
+        dbInteractor.removeClimatologyForStation(stationID)
+        dbInteractor.removeHistoricalManifestForStation(stationID)
+        dbInteractor.removeFrameCacheForStation(stationID)
+        dbInteractor.removeDataUpdatesForStation(stationID)
         dbInteractor.removeStationsTableEntry(stationID)
 
     dbInteractor.connection.commit()
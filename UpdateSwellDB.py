@@ -1,90 +1,138 @@
 import argparse
-from ndbc_analysis_utilities.db_config.DatabaseInteractor import DatabaseInteractor
-from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+import signal
+from ndbc_analysis_utilities.db_config.DatabaseInteractor import DatabaseInteractor, DEFAULT_ARCHIVE_RETENTION_MONTHS
+from ndbc_analysis_utilities.db_config.StorageBackend import getSharedBackend
+from ndbc_analysis_utilities.FetchEngine import FetchEngine, DEFAULT_N_WORKERS
+from ndbc_analysis_utilities.UpdatePipeline import UpdatePipeline, DEFAULT_N_WRITERS
+from ndbc_analysis_utilities.UpdateScheduler import UpdateScheduler
+from ndbc_analysis_utilities.NDBCTransport import getSharedTransport
+from ndbc_analysis_utilities.IngestMetrics import getSharedIngestMetrics
+from ndbc_analysis_utilities.IngestCheckpoint import IngestCheckpoint
 from ndbc_analysis_utilities.BuoyDataUtilities import getActiveBOI
 
-def updateRealtimeData(activeBOI: dict):
-    dbInteractor = DatabaseInteractor() 
-    if not dbInteractor.successfulConnection:
-        raise Exception("Unsuccessful attempt to connect to database")
+def getStationsToUpdate(activeBOI: dict, dbInteractor: DatabaseInteractor, dataSetName: str) -> list[str]:
+    # one query each for which stations exist and when they were last updated
+    existingStations = dbInteractor.getExistingStations(activeBOI)
+    lastUpdates = dbInteractor.getFreshnessForStations(activeBOI, dataSetName)
+    isItTimeToUpdate = dbInteractor.isItTimeToUpdateRealtimeData if dataSetName == 'realtime' else dbInteractor.isItTimeToUpdateHistoricalData
 
+    stationsToUpdate = []
     for stationID in activeBOI:
         # check if buoy is in stations table
-        if not dbInteractor.checkForBuoyExistenceInDB(stationID):
+        if stationID not in existingStations:
             print(f'station {stationID} is not in the database, so please add it before attempting to update its data!')
             continue
 
         # if buoy is in stations table, then check whether the current data is outdated
-        if not dbInteractor.isItTimeToUpdateRealtimeData(stationID):
-            print(f'realtime data for {stationID} is still current')
+        if not isItTimeToUpdate(stationID, lastUpdates[stationID]):
+            print(f'{dataSetName} data for {stationID} is still current')
             continue
 
-        # if time for update, then request current data from NOAA
-        thisBuoy = NDBCBuoy(stationID)
-        try:
-            thisBuoy.buildRealtimeDataFrame()
-        except Exception as e:
-            print('-------')
-            print(f'EXCEPTION: {e}')
-            print('-------')
-            print(f'Failed to build realtime data frame for station {stationID}!!!')
-            continue
-
-        # add realtime data set to realtime_data table
-        dbInteractor.updateRealtimeDataEntry(stationID, thisBuoy.dataFrameRealtime)
-
+        stationsToUpdate.append(stationID)
+    return stationsToUpdate
+
+def getUpdateJobs(activeBOI: dict, dbInteractor: DatabaseInteractor) -> list[tuple]:
+    # (dataSetName, stationID) of every outdated data set, for UpdatePipeline
+    jobs = [('realtime', stationID) for stationID in getStationsToUpdate(activeBOI, dbInteractor, 'realtime')]
+    jobs += [('historical', stationID) for stationID in getStationsToUpdate(activeBOI, dbInteractor, 'historical')]
+    return jobs
+
+def compactRealtimeArchive(stationIDs: list[str], dbInteractor: DatabaseInteractor, archiveRetentionMonths: int):
+    # the pipeline appended the new realtime observations to the archive, compact finished months and apply the retention
+    for stationID in stationIDs:
+        dbInteractor.compactArchivePartitions(stationID)
+        dbInteractor.applyArchiveRetention(stationID, archiveRetentionMonths)
+
+def rebuildClimatologies(activeBOI: dict, dbInteractor: DatabaseInteractor):
+    # the historical update rebuilds a station's climatology, this covers stations whose samples predate the climatology table
+    for stationID in dbInteractor.getExistingStations(activeBOI):
+        dbInteractor.rebuildClimatology(stationID)
+
+def runDaemon(activeBOI: dict, fetchEngine: FetchEngine, dbInteractor: DatabaseInteractor, nYears: int, nWriters: int, archiveRetentionMonths: int = None,
+              deltaHistorical: bool = True, promFile: str = None, metricsJSON: str = None, checkpoint: IngestCheckpoint = None):
+    scheduler = UpdateScheduler(fetchEngine, nYears, nWriters=nWriters, archiveRetentionMonths=archiveRetentionMonths, deltaHistorical=deltaHistorical,
+                                promFile=promFile, metricsJSON=metricsJSON, checkpoint=checkpoint)
+    scheduler.seed(activeBOI, dbInteractor)
     dbInteractor.closeConnection()
 
-def updateHistoricalData(activeBOI: dict):
-    dbInteractor = DatabaseInteractor() 
-    if not dbInteractor.successfulConnection:
-        raise Exception("Unsuccessful attempt to connect to database")
-
-    for stationID in activeBOI:
-        # check if buoy is in stations table
-        if not dbInteractor.checkForBuoyExistenceInDB(stationID):
-            print(f'station {stationID} is not in the database, so please add it before attempting to update its data!')
-            continue
-
-        # if it is, check whether it's time to update the historical data
-        if not dbInteractor.isItTimeToUpdateHistoricalData(stationID):
-            print(f'historical data for {stationID} is still applicable')
-            continue
-
-        # if it's time to update, then get historical data set for the buoy
-        thisBuoy = NDBCBuoy(stationID)
-        thisBuoy.buildHistoricalDataFrame()
-
-        # add historical data set to historical_data table
-        dbInteractor.updateHistoricalDataEntry(stationID, thisBuoy.dataFrameHistorical)
-
-    dbInteractor.closeConnection()
-
-def addDesiredBuoysToDB(activeBOI: dict):
-    dbInteractor = DatabaseInteractor() 
-    if not dbInteractor.successfulConnection:
-        raise Exception("Unsuccessful attempt to connect to database")
+    # SIGTERM (e.g. from systemd) finishes the current round and exits like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print('Stopping the update daemon')
+    scheduler.printSummary()
 
+def addDesiredBuoysToDB(activeBOI: dict, dbInteractor: DatabaseInteractor):
+    existingStations = dbInteractor.getExistingStations(activeBOI)
     for stationID, latLon in activeBOI.items():
-        if dbInteractor.checkForBuoyExistenceInDB(stationID):
+        if stationID in existingStations:
             print(f'station {stationID} is already in the database')
         else:
             print(f'adding station {stationID} to database...')
             dbInteractor.addBuoyToStationsTable(stationID, latLon)
 
     dbInteractor.printContentsOfStationsTable()
-    dbInteractor.closeConnection()
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--bf", type=str, required=True, help="name of text file containing buoys of interest")
+    parser.add_argument("--nYears", type=int, default=5, help="# of years of historical data to store for each buoy")
+    parser.add_argument("--workers", type=int, default=DEFAULT_N_WORKERS, help="# of threads downloading and parsing NDBC data")
+    parser.add_argument("--writers", type=int, default=DEFAULT_N_WRITERS, help="# of threads writing the parsed data to the db")
+    parser.add_argument("--fullHistorical", action='store_true', help="use this flag to re-download and rewrite all --nYears of historical data instead of only the newly published files")
+    parser.add_argument("--daemon", action='store_true', help="use this flag to keep running and poll each station on its own sampling cadence")
+    parser.add_argument("--rebuildClimatology", action='store_true', help="use this flag to rebuild the monthly climatology from the stored historical samples")
+    parser.add_argument("--archive", action='store_true', help="use this flag to also keep every realtime observation in the realtime archive")
+    parser.add_argument("--archiveRetentionMonths", type=int, default=DEFAULT_ARCHIVE_RETENTION_MONTHS, help="# of months of archived realtime data to keep")
+    parser.add_argument("--promFile", type=str, help="path of a .prom file to write the run's ingest metrics to, e.g. in node_exporter's textfile collector directory")
+    parser.add_argument("--metricsJSON", type=str, help="path of a JSON file to write the run's ingest metrics summary to")
+    parser.add_argument("--resetCheckpoint", action='store_true', help="use this flag to discard the historical files an earlier run fetched but did not store, instead of reusing them")
     args = parser.parse_args()
 
+    ingestMetrics = getSharedIngestMetrics()
+    ingestMetrics.reset()
+
     activeBOI = getActiveBOI(args.bf)
-    addDesiredBuoysToDB(activeBOI)
-    updateRealtimeData(activeBOI)
-    updateHistoricalData(activeBOI)
+    fetchEngine = FetchEngine(nWorkers=args.workers)
+    checkpoint = IngestCheckpoint()
+    checkpoint.startRun(reset=args.resetCheckpoint)
+
+    dbInteractor = DatabaseInteractor()
+    if not dbInteractor.successfulConnection:
+        raise Exception("Unsuccessful attempt to connect to database")
+
+    addDesiredBuoysToDB(activeBOI, dbInteractor)
+    if args.daemon:
+        runDaemon(activeBOI, fetchEngine, dbInteractor, args.nYears, args.writers, args.archiveRetentionMonths if args.archive else None,
+                  not args.fullHistorical, args.promFile, args.metricsJSON, checkpoint)
+        checkpoint.printSummary()
+        getSharedBackend().printSummary()
+        return
+
+    jobs = getUpdateJobs(activeBOI, dbInteractor)
+    # the pipeline's writers borrow their own connections, so this one goes back to the pool while they run
+    dbInteractor.closeConnection()
+
+    # request the outdated data sets from NOAA and write them to the db as they come in
+    pipeline = UpdatePipeline(fetchEngine, args.nYears, nWriters=args.writers, archive=args.archive, deltaHistorical=not args.fullHistorical,
+                              checkpoint=checkpoint)
+    pipeline.run(jobs)
+
+    dbInteractor.establishConnection()
+    if args.archive:
+        compactRealtimeArchive(pipeline.archivedStations, dbInteractor, args.archiveRetentionMonths)
+    if args.rebuildClimatology:
+        rebuildClimatologies(activeBOI, dbInteractor)
+    dbInteractor.closeConnection()
+
+    pipeline.printSummary()
+    checkpoint.printSummary()
+    getSharedTransport().printSummary()
+    getSharedBackend().printSummary()
+    ingestMetrics.printSummary()
+    ingestMetrics.export(args.promFile, args.metricsJSON)
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,12 @@
 # Buoy Utilities
 
 import numpy as np
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+from .NDBCTransport import NDBCTransport, getSharedTransport
+from . import NDBCParser
+
+LATEST_OBS_URL = 'https://www.ndbc.noaa.gov/data/latest_obs/latest_obs.txt'
 
 def parseBOIFile(boiFName: str) -> list:
     with open(boiFName) as f:
@@ -14,10 +17,13 @@ def parseBOIFile(boiFName: str) -> list:
     print(boiList)
     return boiList
 
-def getActiveNDBCStations() -> dict:
+def getActiveNDBCStations(transport: NDBCTransport = None) -> dict:
+    if transport is None:
+        transport = getSharedTransport()
+
     # get and parse the active stations webpage
     activeStationsUrl = 'https://www.ndbc.noaa.gov/activestations.xml'
-    ndbcPage = requests.get(activeStationsUrl)       #<class 'requests.models.Response'>
+    ndbcPage = transport.get(activeStationsUrl)       #<class 'requests.models.Response'>
     buoySoup = BeautifulSoup(ndbcPage.content, 'xml') #<class 'bs4.BeautifulSoup'>
     
     # find buoy station types
@@ -34,6 +40,18 @@ def getActiveNDBCStations() -> dict:
 
     return activeBuoys
 
+def getLatestObservations(transport: NDBCTransport = None) -> pd.DataFrame:
+    if transport is None:
+        transport = getSharedTransport()
+
+    # one file with the most recent observation of every active station
+    ndbcPage = transport.get(LATEST_OBS_URL)
+    if ndbcPage.status_code != 200:
+        raise Exception(f'Could not get the latest observations, status code {ndbcPage.status_code}')
+    latestObsDF = NDBCParser.parseLatestObs(ndbcPage.content)
+    print(f'# of stations in latest observations = {len(latestObsDF)}')
+    return latestObsDF
+
 def getActiveBOI(boiFName: str) -> dict:
     boiList = parseBOIFile(boiFName)
     activeNDBCStations = getActiveNDBCStations()
@@ -99,12 +117,14 @@ def calcDistanceBetweenNM(latLon1: tuple, latLon2: tuple) -> float:
     return distNM
 
 def estimateDensityGaussianKernel(data: np.ndarray[np.float64]) -> tuple:
+    data = data[~np.isnan(data)]   # missing readings
     xd = np.linspace(0, max(data), 100)
     density = sum(norm(xi).pdf(xd) for xi in data)
     density = density / (sum(density) * (xd[1]-xd[0]))
     return xd, density
 
 def estimateDensityTophatKernel(data: np.ndarray[np.float64], binWidth: float) -> tuple:
+    data = data[~np.isnan(data)]   # missing readings
     xd = np.linspace(0, max(data), 100)
     density = np.zeros(xd.shape)
     for xi in data:
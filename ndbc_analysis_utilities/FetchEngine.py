@@ -0,0 +1,267 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .NDBCBuoy import NDBCBuoy
+from .BuoyDataUtilities import getLatestObservations
+from .db_config.StorageBackend import StorageBackend
+from .db_config.DatabaseInteractor import DatabaseInteractor
+
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_N_WORKERS = 4
+
+
+class RateLimiter():
+    '''
+    Token bucket shared by every request we make to the NDBC webpage.
+
+    Tokens refill at requestsPerSecond up to burstSize, each request spends one token,
+    and no more than maxInFlight requests are allowed to be outstanding at once.
+    '''
+    def __init__(self, requestsPerSecond: float = DEFAULT_REQUESTS_PER_SECOND, maxInFlight: int = DEFAULT_MAX_IN_FLIGHT, burstSize: int = 1):
+        if requestsPerSecond <= 0:
+            raise ValueError('requestsPerSecond must be positive')
+
+        self.requestsPerSecond = requestsPerSecond
+        self.burstSize = burstSize
+        self.tokens = float(burstSize)
+        self.lastRefillTime = time.monotonic()
+        self.tokenLock = threading.Lock()
+        self.inFlightSlots = threading.BoundedSemaphore(maxInFlight)
+
+    def waitForToken(self):
+        while True:
+            with self.tokenLock:
+                now = time.monotonic()
+                self.tokens = min(self.burstSize, self.tokens + (now - self.lastRefillTime) * self.requestsPerSecond)
+                self.lastRefillTime = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                waitTime = (1 - self.tokens) / self.requestsPerSecond
+
+            time.sleep(waitTime)
+
+    def acquire(self):
+        self.inFlightSlots.acquire()
+        self.waitForToken()
+
+    def release(self):
+        self.inFlightSlots.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.release()
+        return False
+
+
+class FetchEngine():
+    '''
+    Builds NDBCBuoy objects for a whole list of stations concurrently.
+
+    Every buoy shares one RateLimiter, so the politeness towards the NDBC webpage is
+    enforced across all of the worker threads instead of with a fixed pause per request.
+    Stations that fail are left out of the returned dict and recorded in self.failures.
+    With compactStorage the buoys hold their data frames in the compact form of NDBCBuoy.compactDataFrame.
+    Database reads borrow their connections from dbBackend (getSharedBackend when None).
+    With revalidateRealtime the buoys send the conditional realtime request even when the cached response is fresh.
+    '''
+    def __init__(self, nWorkers: int = DEFAULT_N_WORKERS, rateLimiter: RateLimiter = None, compactStorage: bool = False, dbBackend: StorageBackend = None,
+                 revalidateRealtime: bool = False):
+        self.nWorkers = nWorkers
+        self.rateLimiter = rateLimiter if rateLimiter is not None else RateLimiter()
+        self.compactStorage = compactStorage
+        self.dbBackend = dbBackend
+        self.revalidateRealtime = revalidateRealtime
+        self.failures = dict()
+
+    def makeBuoy(self, stationID: str, nYearsBack: int = None, nHistoricalMonths: int = None) -> NDBCBuoy:
+        buoy = NDBCBuoy(stationID)
+        buoy.rateLimiter = self.rateLimiter
+        buoy.compactStorage = self.compactStorage
+        buoy.dbBackend = self.dbBackend
+        buoy.revalidateRealtime = self.revalidateRealtime
+        if nYearsBack is not None:
+            buoy.nYearsBack = nYearsBack
+        if nHistoricalMonths is not None:
+            buoy.nHistoricalMonths = nHistoricalMonths
+        return buoy
+
+    def runForStations(self, stationIDs, buildFn) -> dict:
+        self.failures = dict()
+
+        def runOne(stationID):
+            try:
+                return buildFn(stationID)
+            except Exception as e:
+                print('-------')
+                print(f'EXCEPTION for station {stationID}: {e}')
+                traceback.print_exc()
+                print('-------')
+                self.failures[stationID] = e
+                return None
+
+        stationIDs = list(stationIDs)
+        startTime = time.time()
+        with ThreadPoolExecutor(max_workers=self.nWorkers) as executor:
+            results = list(executor.map(runOne, stationIDs))
+        print(f'Fetched {len(stationIDs) - len(self.failures)} of {len(stationIDs)} stations in {time.time() - startTime:.1f} s')
+
+        return {stationID: buoy for stationID, buoy in zip(stationIDs, results) if buoy is not None}
+
+    def openDBInteractor(self) -> DatabaseInteractor:
+        dBInteractor = DatabaseInteractor(backend=self.dbBackend)
+        if not dBInteractor.successfulConnection:
+            raise Exception('Attempt to connect to database failed')
+        return dBInteractor
+
+    @staticmethod
+    def queryHistoricalDataForBuoys(dBInteractor: DatabaseInteractor, buoys: dict) -> dict:
+        # buoys with the same years and months share one filtered query
+        stationGroups = dict()
+        for stationID, buoy in buoys.items():
+            historicalFilters = buoy.getHistoricalQueryFilters()
+            groupKey = (tuple(historicalFilters['months']), historicalFilters['startDate'], historicalFilters['endDate'])
+            stationGroups.setdefault(groupKey, (historicalFilters, []))[1].append(stationID)
+
+        historicalDFs = dict()
+        for historicalFilters, groupStationIDs in stationGroups.values():
+            historicalDFs.update(dBInteractor.queryHistoricalData(groupStationIDs, **historicalFilters))
+        return historicalDFs
+
+    def fetchBuoysFromDB(self, stationIDs, nYearsBack: int = None, nHistoricalMonths: int = None) -> dict:
+        '''
+        Loads the realtime and historical data of every station with a few bulk queries instead of several queries per station.
+        '''
+        self.failures = dict()
+        stationIDs = list(stationIDs)
+        startTime = time.time()
+        dBInteractor = self.openDBInteractor()
+        try:
+            existingStations = dBInteractor.getExistingStations(stationIDs)
+            for stationID in stationIDs:
+                if stationID not in existingStations:
+                    print(f'Station {stationID} does not exist in database!')
+                    self.failures[stationID] = Exception(f'Station {stationID} does not exist in database!')
+
+            foundBuoys = {stationID: self.makeBuoy(stationID, nYearsBack, nHistoricalMonths) for stationID in stationIDs if stationID in existingStations}
+            realtimeDFs = dBInteractor.getRealtimeDataForStations(foundBuoys.keys())
+            historicalDFs = self.queryHistoricalDataForBuoys(dBInteractor, foundBuoys)
+        finally:
+            dBInteractor.closeConnection()
+
+        buoys = dict()
+        for stationID, buoy in foundBuoys.items():
+            buoy.storeDataFrame('realtime', realtimeDFs[stationID])
+            buoy.storeDataFrame('historical', historicalDFs[stationID])
+            if len(buoy.dataFrameRealtime) == 0:
+                print(f'No realtime data for station {stationID} in the database')
+                self.failures[stationID] = Exception(f'Station {stationID} has no realtime data in the database')
+                continue
+
+            buoy.setRecentReadings()
+            buoys[stationID] = buoy
+
+        print(f'Fetched {len(buoys)} of {len(stationIDs)} stations from the database in {time.time() - startTime:.1f} s')
+        return buoys
+
+    def fetchBuoys(self, stationIDs, useDB: bool, nYearsBack: int = None, nHistoricalMonths: int = None) -> dict:
+        if useDB:
+            return self.fetchBuoysFromDB(stationIDs, nYearsBack, nHistoricalMonths)
+
+        def build(stationID):
+            buoy = self.makeBuoy(stationID, nYearsBack, nHistoricalMonths)
+            buoy.fetchData(useDB)
+            return buoy
+
+        return self.runForStations(stationIDs, build)
+
+    def fetchLatestBuoys(self, stationIDs, nYearsBack: int = None, nHistoricalMonths: int = None) -> dict:
+        '''
+        Fills in the recent readings of every station from the single latest_obs.txt file.
+
+        No realtime or historical data frames are loaded, see loadHistoricalData for the history.
+        '''
+        self.failures = dict()
+        with self.rateLimiter:
+            latestObsDF = getLatestObservations()
+
+        buoys = dict()
+        for stationID in stationIDs:
+            if stationID not in latestObsDF.index or np.isnan(latestObsDF.loc[stationID, 'WVHT']):
+                print(f'No recent wave readings for station {stationID} in the latest observations')
+                self.failures[stationID] = Exception(f'Station {stationID} has no recent wave readings')
+                continue
+
+            buoy = self.makeBuoy(stationID, nYearsBack, nHistoricalMonths)
+            buoy.setRecentReadingsFromLatestObs(latestObsDF.loc[stationID])
+            buoys[stationID] = buoy
+
+        print(f'Found recent readings for {len(buoys)} of {len(stationIDs)} stations')
+        return buoys
+
+    def loadHistoricalData(self, buoys: dict, useDB: bool = False) -> dict:
+        if useDB:
+            self.failures = dict()
+            dBInteractor = self.openDBInteractor()
+            try:
+                historicalDFs = self.queryHistoricalDataForBuoys(dBInteractor, buoys)
+            finally:
+                dBInteractor.closeConnection()
+
+            for stationID, buoy in buoys.items():
+                if not isinstance(buoy.dataFrameHistorical, pd.DataFrame):
+                    buoy.storeDataFrame('historical', historicalDFs[stationID])
+            return buoys
+
+        def build(stationID):
+            buoys[stationID].ensureHistoricalDataFrame(useDB)
+            return buoys[stationID]
+
+        return self.runForStations(buoys.keys(), build)
+
+    def loadClimatologies(self, buoys: dict) -> dict:
+        # one climatology query for every buoy, only the months each buoy's historical percentile looks at
+        months = sorted({month for buoy in buoys.values() for month in buoy.getHistoricalMonths(buoy.nHistoricalMonths)})
+        dBInteractor = self.openDBInteractor()
+        try:
+            climatologies = dBInteractor.readClimatology(buoys.keys(), months)
+        finally:
+            dBInteractor.closeConnection()
+
+        for stationID, buoy in buoys.items():
+            if climatologies[stationID]:
+                buoy.climatology = climatologies[stationID]
+            else:
+                print(f'No climatology stored for station {stationID}, its historical percentile needs the historical samples')
+        return buoys
+
+    def fetchRealtimeBuoys(self, stationIDs) -> dict:
+        def build(stationID):
+            buoy = self.makeBuoy(stationID)
+            buoy.buildRealtimeDataFrame()
+            return buoy
+
+        return self.runForStations(stationIDs, build)
+
+    def fetchHistoricalBuoys(self, stationIDs, nYearsBack: int = None, nHistoricalMonths: int = None) -> dict:
+        def build(stationID):
+            buoy = self.makeBuoy(stationID, nYearsBack, nHistoricalMonths)
+            buoy.buildHistoricalDataFrame()
+            return buoy
+
+        return self.runForStations(stationIDs, build)
+
+
+def printMemoryReport(buoys: dict) -> int:
+    nTotalBytes = 0
+    for buoy in buoys.values():
+        nTotalBytes += buoy.printMemoryReport()
+    print(f'{len(buoys)} stations: {nTotalBytes / 1e6:.2f} MB')
+    return nTotalBytes
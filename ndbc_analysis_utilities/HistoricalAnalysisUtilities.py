@@ -1,4 +1,6 @@
 from .NDBCBuoy import NDBCBuoy
+from .FetchEngine import FetchEngine
+from datetime import date, datetime
 import pandas as pd
 
 def getCompleteHistoricalDataFrame(buoy: NDBCBuoy, nYears: int) -> pd.core.frame.DataFrame:
@@ -6,3 +8,71 @@ def getCompleteHistoricalDataFrame(buoy: NDBCBuoy, nYears: int) -> pd.core.frame
     buoy.nHistoricalMonths = 12
     buoy.buildHistoricalDataFrame()
     return buoy.dataFrameHistorical
+
+def getCompleteHistoricalDataFrames(stationIDs, nYears: int, fetchEngine: FetchEngine = None, useDB: bool = False) -> dict:
+    if useDB:
+        return queryHistoricalDataFrames(stationIDs, nYears, fetchEngine=fetchEngine)
+
+    if fetchEngine is None:
+        fetchEngine = FetchEngine()
+    buoys = fetchEngine.fetchHistoricalBuoys(stationIDs, nYearsBack=nYears, nHistoricalMonths=12)
+    return {stationID: buoy.dataFrameHistorical for stationID, buoy in buoys.items()}
+
+def getHistoricalDateRange(nYears: int) -> dict:
+    # the same whole years that fetchHistoricalBuoys requests
+    currentYear = date.today().year
+    return {'startDate': datetime(currentYear - nYears, 1, 1), 'endDate': datetime(currentYear, 1, 1)}
+
+def queryHistoricalDataFrames(stationIDs, nYears: int, months: list[int] = None, minPeriod: float = None, minWvht: float = None,
+                              columns: list[str] = None, fetchEngine: FetchEngine = None) -> dict:
+    '''
+    Loads the past nYears of historical data from the database with the month, period and wave height filters
+    and the column projection applied in SQL (see DatabaseInteractor.queryHistoricalData).
+    '''
+    if fetchEngine is None:
+        fetchEngine = FetchEngine()
+    dBInteractor = fetchEngine.openDBInteractor()
+    try:
+        return dBInteractor.queryHistoricalData(stationIDs, months=months, minPeriod=minPeriod, minWvht=minWvht, columns=columns,
+                                                **getHistoricalDateRange(nYears))
+    finally:
+        dBInteractor.closeConnection()
+
+def countHistoricalSamples(stationIDs, nYears: int, months: list[int] = None, minPeriod: float = None, minWvht: float = None,
+                           fetchEngine: FetchEngine = None) -> dict:
+    if fetchEngine is None:
+        fetchEngine = FetchEngine()
+    dBInteractor = fetchEngine.openDBInteractor()
+    try:
+        return dBInteractor.countHistoricalSamples(stationIDs, months=months, minPeriod=minPeriod, minWvht=minWvht,
+                                                   **getHistoricalDateRange(nYears))
+    finally:
+        dBInteractor.closeConnection()
+
+def getClimatologies(stationIDs, months: list[int] = None, withSamples: bool = True, fetchEngine: FetchEngine = None) -> dict:
+    '''
+    Reads stationID -> {month: MonthlyClimatology} from the climatology table UpdateSwellDB.py builds, which covers
+    the years of historical data stored in the database rather than a given nYears.
+    '''
+    if fetchEngine is None:
+        fetchEngine = FetchEngine()
+    dBInteractor = fetchEngine.openDBInteractor()
+    try:
+        return dBInteractor.readClimatology(stationIDs, months, withSamples)
+    finally:
+        dBInteractor.closeConnection()
+
+def getClimatologiesForPlots(stationIDs, fetchEngine: FetchEngine = None) -> dict:
+    '''
+    getClimatologies for the monthly plots. Stations without a climatology are skipped and missing months are
+    reported, the plots leave a gap for them.
+    '''
+    climatologies = getClimatologies(stationIDs, fetchEngine=fetchEngine)
+    for stationID in list(climatologies):
+        missingMonths = [month for month in range(1, 13) if month not in climatologies[stationID]]
+        if len(missingMonths) == 12:
+            print(f'Skipping station {stationID}, it has no climatology in the db')
+            del climatologies[stationID]
+        elif missingMonths:
+            print(f'Climatology of station {stationID} is missing months {missingMonths}, they are left out of its plot')
+    return climatologies
@@ -0,0 +1,162 @@
+import os
+import json
+import threading
+import time
+import pandas as pd
+from .LocalCache import DEFAULT_CACHE_DIR
+
+DEFAULT_RETRY_BACKOFF_BASE_MINUTES = 15
+DEFAULT_RETRY_BACKOFF_MAX_MINUTES = 24 * 60
+DEFAULT_MAX_UNIT_AGE_DAYS = 7
+
+
+class IngestCheckpoint():
+    '''
+    Historical files UpdateSwellDB.py fetched but has not committed to the database yet, plus a ledger of failed files.
+
+    A unit is one ('year', YYYY) or ('month', YYYYMM) file of a station. Every fetched unit is stored as a Parquet file
+    until its station's write commits (see clearStation), so a run after a crash or a failed station reads them back
+    instead of downloading them again. Units older than maxUnitAgeDays are discarded at startup, since NDBC may have
+    revised the files since. A failed unit is retried after a backoff that doubles from retryBackoffBaseMinutes
+    up to retryBackoffMaxMinutes, and the ledger carries over between runs.
+    '''
+    def __init__(self, cacheDir: str = DEFAULT_CACHE_DIR, retryBackoffBaseMinutes: float = DEFAULT_RETRY_BACKOFF_BASE_MINUTES,
+                 retryBackoffMaxMinutes: float = DEFAULT_RETRY_BACKOFF_MAX_MINUTES, maxUnitAgeDays: float = DEFAULT_MAX_UNIT_AGE_DAYS):
+        self.checkpointDir = os.path.join(cacheDir, 'checkpoint')
+        self.statePath = os.path.join(self.checkpointDir, 'state.json')
+        self.retryBackoffBase = retryBackoffBaseMinutes * 60
+        self.retryBackoffMax = retryBackoffMaxMinutes * 60
+        self.maxUnitAge = maxUnitAgeDays * 24 * 3600
+        self.lock = threading.Lock()
+        os.makedirs(self.checkpointDir, exist_ok=True)
+        self.state = self.loadState()
+
+    def loadState(self) -> dict:
+        try:
+            with open(self.statePath) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f'Discarding unreadable ingest checkpoint {self.statePath}: {e}')
+        return {'units': dict(), 'failedUnits': dict()}
+
+    def saveState(self):
+        # callers hold self.lock
+        tmpFilePath = f'{self.statePath}.{threading.get_ident()}.tmp'
+        with open(tmpFilePath, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmpFilePath, self.statePath)
+
+    @staticmethod
+    def getUnitKey(stationID: str, kind: str, period: int) -> str:
+        return f'{stationID}_{kind}_{period}'
+
+    def getUnitFilePath(self, unitKey: str) -> str:
+        return os.path.join(self.checkpointDir, f'{unitKey}.parquet')
+
+    def removeUnitFile(self, unitKey: str):
+        try:
+            os.remove(self.getUnitFilePath(unitKey))
+        except FileNotFoundError:
+            pass
+
+    def startRun(self, reset: bool = False):
+        # units left behind by an earlier run are reused unless reset is set or they are too old, the failure ledger is kept either way
+        with self.lock:
+            oldestFetchTime = time.time() - self.maxUnitAge
+            discardedUnitKeys = [unitKey for unitKey, unit in self.state['units'].items() if reset or unit['fetchedAt'] < oldestFetchTime]
+            for unitKey in discardedUnitKeys:
+                del self.state['units'][unitKey]
+                self.removeUnitFile(unitKey)
+            if discardedUnitKeys:
+                self.saveState()
+            print(f"Resuming with {len(self.state['units'])} checkpointed historical files, discarded {len(discardedUnitKeys)}")
+
+    def loadUnit(self, stationID: str, kind: str, period: int) -> tuple:
+        '''
+        Returns (True, data frame) for a checkpointed unit, the data frame being None when NDBC had no file for it,
+        and (False, None) for a unit that still has to be fetched.
+        '''
+        unitKey = self.getUnitKey(stationID, kind, period)
+        with self.lock:
+            unit = self.state['units'].get(unitKey)
+        if unit is None:
+            return False, None
+        if not unit['hasData']:
+            return True, None
+
+        try:
+            unitDF = pd.read_parquet(self.getUnitFilePath(unitKey))
+        except Exception as e:
+            print(f'Discarding unreadable checkpointed {kind} {period} of station {stationID}: {e}')
+            with self.lock:
+                self.state['units'].pop(unitKey, None)
+                self.saveState()
+            return False, None
+
+        print(f'Loaded {kind} {period} of station {stationID} from the ingest checkpoint')
+        return True, unitDF
+
+    def storeUnit(self, stationID: str, kind: str, period: int, unitDF: pd.DataFrame):
+        unitKey = self.getUnitKey(stationID, kind, period)
+        if unitDF is not None:
+            filePath = self.getUnitFilePath(unitKey)
+            tmpFilePath = f'{filePath}.{threading.get_ident()}.tmp'
+            unitDF.to_parquet(tmpFilePath)
+            os.replace(tmpFilePath, filePath)
+
+        with self.lock:
+            self.state['units'][unitKey] = {'stationID': stationID, 'hasData': unitDF is not None, 'fetchedAt': time.time()}
+            self.saveState()
+
+    def clearStation(self, stationID: str):
+        # the station's units are in the database now
+        with self.lock:
+            unitKeys = [unitKey for unitKey, unit in self.state['units'].items() if unit['stationID'] == stationID]
+            for unitKey in unitKeys:
+                del self.state['units'][unitKey]
+                self.removeUnitFile(unitKey)
+            if unitKeys:
+                self.saveState()
+
+    def recordUnitFailure(self, stationID: str, kind: str, period: int, e: Exception) -> float:
+        # returns the time the unit is due for its next attempt
+        unitKey = self.getUnitKey(stationID, kind, period)
+        with self.lock:
+            failedUnit = self.state['failedUnits'].get(unitKey, {'nAttempts': 0})
+            nAttempts = failedUnit['nAttempts'] + 1
+            delay = min(self.retryBackoffBase * 2 ** (nAttempts - 1), self.retryBackoffMax)
+            retryAt = time.time() + delay
+            self.state['failedUnits'][unitKey] = {'stationID': stationID, 'kind': kind, 'period': period, 'nAttempts': nAttempts,
+                                                  'error': f'{type(e).__name__}: {e}', 'retryAt': retryAt}
+            self.saveState()
+
+        print(f'Failed to fetch {kind} {period} of station {stationID} ({nAttempts} attempts), retrying in {delay / 60:.0f} minutes')
+        return retryAt
+
+    def clearUnitFailure(self, stationID: str, kind: str, period: int):
+        unitKey = self.getUnitKey(stationID, kind, period)
+        with self.lock:
+            if self.state['failedUnits'].pop(unitKey, None) is not None:
+                self.saveState()
+
+    def isUnitDue(self, stationID: str, kind: str, period: int, now: float = None) -> bool:
+        if now is None:
+            now = time.time()
+        with self.lock:
+            failedUnit = self.state['failedUnits'].get(self.getUnitKey(stationID, kind, period))
+        return failedUnit is None or failedUnit['retryAt'] <= now
+
+    def getFailedUnits(self) -> list[dict]:
+        with self.lock:
+            return sorted(self.state['failedUnits'].values(), key=lambda unit: (unit['stationID'], unit['kind'], unit['period']))
+
+    def printSummary(self):
+        failedUnits = self.getFailedUnits()
+        with self.lock:
+            nUnits = len(self.state['units'])
+        for unit in failedUnits:
+            retryAt = time.strftime('%Y-%m-%d %H:%M', time.localtime(unit['retryAt']))
+            print(f"  {unit['stationID']:>8} {unit['kind']:>5} {unit['period']:>6}: {unit['nAttempts']} attempts, retry after {retryAt} ({unit['error']})")
+        print(f"Ingest checkpoint: {nUnits} uncommitted historical files, {len(failedUnits)} failed files waiting for a retry")
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+METRIC_PREFIX = 'ndbc_ingest'
+# per station metrics of one run and their Prometheus help text
+STATION_METRICS = {
+        'http_requests': 'NDBC requests made, retries included',
+        'http_seconds': 'seconds spent waiting on NDBC requests',
+        'http_max_seconds': 'latency of the slowest NDBC request in seconds',
+        'http_bytes': 'bytes downloaded from NDBC, before gzip decoding',
+        'parse_seconds': 'seconds spent parsing NDBC files',
+        'rows_parsed': 'data rows in the parsed NDBC files',
+        'rows_kept': 'rows left after the parser dropped other months and missing wave heights',
+        'serialize_seconds': 'seconds spent serializing frame blobs for the database',
+        'db_write_seconds': 'seconds spent writing to the database, serialization included',
+        'rows_written': 'rows added to the database',
+        }
+
+
+def formatMetricValue(value: float) -> str:
+    # counters print as whole numbers, :g would turn large byte counts into rounded exponents
+    if float(value).is_integer():
+        return str(int(value))
+    return f'{value:.6f}'
+
+
+class IngestMetrics():
+    '''
+    Structured metrics of one UpdateSwellDB.py run, per station.
+
+    NDBCTransport reports every request, NDBCBuoy its parse times and row counts, DatabaseInteractor its serialize times
+    and UpdatePipeline its database writes and failures. writePrometheusTextfile writes them for node_exporter's textfile
+    collector and writeJSONSummary as a JSON document. reset starts a new run (the daemon calls it every round).
+    '''
+    def __init__(self):
+        self.metricsLock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.metricsLock:
+            self.stationMetrics = defaultdict(lambda: dict.fromkeys(STATION_METRICS, 0))
+            self.failures = defaultdict(int)   # (stationID, stage, error type) -> count
+            self.runStartTime = time.time()
+            self.runEndTime = None
+
+    def add(self, stationID: str, metricName: str, value: float):
+        with self.metricsLock:
+            self.stationMetrics[stationID][metricName] += value
+
+    def recordRequest(self, stationID: str, latency: float, nBytes: int):
+        # requests without a station label (e.g. latest_obs.txt) are kept under an empty station
+        stationID = stationID if stationID is not None else ''
+        with self.metricsLock:
+            thisStation = self.stationMetrics[stationID]
+            thisStation['http_requests'] += 1
+            thisStation['http_seconds'] += latency
+            thisStation['http_max_seconds'] = max(thisStation['http_max_seconds'], latency)
+            thisStation['http_bytes'] += nBytes
+
+    def recordFailure(self, stationID: str, stage: str, e: Exception):
+        with self.metricsLock:
+            self.failures[(stationID, stage, type(e).__name__)] += 1
+
+    def finishRun(self):
+        self.runEndTime = time.time()
+
+    def getRunDuration(self) -> float:
+        runEndTime = self.runEndTime if self.runEndTime is not None else time.time()
+        return runEndTime - self.runStartTime
+
+    def buildPrometheusText(self) -> str:
+        with self.metricsLock:
+            stationMetrics = {stationID: dict(metrics) for stationID, metrics in self.stationMetrics.items()}
+            failures = dict(self.failures)
+
+        lines = []
+        for metricName, helpText in STATION_METRICS.items():
+            lines.append(f'# HELP {METRIC_PREFIX}_{metricName} {helpText}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{metricName} gauge')
+            for stationID in sorted(stationMetrics):
+                lines.append(f'{METRIC_PREFIX}_{metricName}{{station="{stationID}"}} {formatMetricValue(stationMetrics[stationID][metricName])}')
+
+        lines.append(f'# HELP {METRIC_PREFIX}_failures failures by station, stage and error type')
+        lines.append(f'# TYPE {METRIC_PREFIX}_failures gauge')
+        for (stationID, stage, errorType), count in sorted(failures.items()):
+            lines.append(f'{METRIC_PREFIX}_failures{{station="{stationID}",stage="{stage}",type="{errorType}"}} {count}')
+
+        lines.append(f'# HELP {METRIC_PREFIX}_run_duration_seconds duration of the last run')
+        lines.append(f'# TYPE {METRIC_PREFIX}_run_duration_seconds gauge')
+        lines.append(f'{METRIC_PREFIX}_run_duration_seconds {self.getRunDuration():.3f}')
+        lines.append(f'# HELP {METRIC_PREFIX}_last_run_timestamp_seconds unix time the last run started')
+        lines.append(f'# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge')
+        lines.append(f'{METRIC_PREFIX}_last_run_timestamp_seconds {self.runStartTime:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def buildSummary(self) -> dict:
+        with self.metricsLock:
+            stationMetrics = {stationID: dict(metrics) for stationID, metrics in self.stationMetrics.items()}
+            failures = dict(self.failures)
+
+        totals = {metricName: sum(metrics[metricName] for metrics in stationMetrics.values()) for metricName in STATION_METRICS}
+        totals['http_max_seconds'] = max((metrics['http_max_seconds'] for metrics in stationMetrics.values()), default=0)
+        return {
+                'runStartTime': self.runStartTime,
+                'runDurationSeconds': self.getRunDuration(),
+                'totals': totals,
+                'stations': stationMetrics,
+                'failures': [{'station': stationID, 'stage': stage, 'type': errorType, 'count': count}
+                             for (stationID, stage, errorType), count in sorted(failures.items())],
+                }
+
+    @staticmethod
+    def writeAtomically(filePath: str, text: str):
+        # the textfile collector may read at any moment, so it must never see a half written file
+        tmpPath = f'{filePath}.{os.getpid()}.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(text)
+        os.replace(tmpPath, filePath)
+
+    def writePrometheusTextfile(self, filePath: str):
+        self.writeAtomically(filePath, self.buildPrometheusText())
+        print(f'Wrote ingest metrics to {filePath}')
+
+    def writeJSONSummary(self, filePath: str):
+        self.writeAtomically(filePath, json.dumps(self.buildSummary(), indent=2))
+        print(f'Wrote ingest summary to {filePath}')
+
+    def export(self, promFile: str = None, jsonFile: str = None):
+        # ends the run and writes whichever of the two files were asked for
+        self.finishRun()
+        if promFile is not None:
+            self.writePrometheusTextfile(promFile)
+        if jsonFile is not None:
+            self.writeJSONSummary(jsonFile)
+
+    def printSummary(self):
+        summary = self.buildSummary()
+        totals = summary['totals']
+        print(f"Ingest: {totals['rows_parsed']:.0f} rows parsed, {totals['rows_kept']:.0f} kept, {totals['rows_written']:.0f} written, "
+              f"parse {totals['parse_seconds']:.2f} s, serialize {totals['serialize_seconds']:.2f} s, db writes {totals['db_write_seconds']:.2f} s, "
+              f"{sum(failure['count'] for failure in summary['failures'])} failures")
+
+
+sharedIngestMetrics = None
+sharedIngestMetricsLock = threading.Lock()
+
+def getSharedIngestMetrics() -> IngestMetrics:
+    global sharedIngestMetrics
+    with sharedIngestMetricsLock:
+        if sharedIngestMetrics is None:
+            sharedIngestMetrics = IngestMetrics()
+        return sharedIngestMetrics
@@ -0,0 +1,209 @@
+import os
+import json
+import threading
+import time
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.environ.get('NDBC_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.ndbc_buoy_data'))
+DEFAULT_HISTORICAL_CACHE_MB = 500
+DEFAULT_REALTIME_MAX_STALENESS_MINUTES = 10
+HISTORICAL_CACHE_FORMAT_VERSION = 2   # bump whenever the cleaned historical data frame changes
+REALTIME_CACHE_FORMAT_VERSION = 2   # bump whenever the cleaned realtime data frame changes
+
+
+class HistoricalCache():
+    '''
+    On-disk cache of parsed historical years keyed by (station, year).
+
+    Each entry is the cleaned data frame for one full year stored as a Parquet file, tagged with
+    HISTORICAL_CACHE_FORMAT_VERSION in its metadata. Past years of stdmet data never change, so entries
+    only expire when the format version moves on. The cache is bounded in size instead, and the least
+    recently used years get evicted first.
+    '''
+    def __init__(self, cacheDir: str = DEFAULT_CACHE_DIR, maxMB: float = DEFAULT_HISTORICAL_CACHE_MB):
+        self.cacheDir = os.path.join(cacheDir, 'historical')
+        self.maxBytes = int(maxMB * 1e6)
+        self.lock = threading.Lock()
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def getFilePath(self, stationID: str, year: int) -> str:
+        return os.path.join(self.cacheDir, f'{stationID}_{year}.parquet')
+
+    def load(self, stationID: str, year: int) -> pd.DataFrame:
+        filePath = self.getFilePath(stationID, year)
+        try:
+            yearDF = pd.read_parquet(filePath)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f'Discarding unreadable cache entry {filePath}: {e}')
+            self.remove(stationID, year)
+            return None
+
+        if yearDF.attrs.pop('formatVersion', None) != HISTORICAL_CACHE_FORMAT_VERSION:
+            print(f'Discarding outdated cache entry {filePath}')
+            self.remove(stationID, year)
+            return None
+
+        # the modification time doubles as the last-used time for eviction
+        os.utime(filePath)
+        print(f'Loaded historical data for station {stationID} in {year} from cache')
+        return yearDF
+
+    def store(self, stationID: str, year: int, yearDF: pd.DataFrame):
+        filePath = self.getFilePath(stationID, year)
+        tmpFilePath = f'{filePath}.{threading.get_ident()}.tmp'
+        taggedDF = yearDF.copy(deep=False)
+        taggedDF.attrs['formatVersion'] = HISTORICAL_CACHE_FORMAT_VERSION
+        taggedDF.to_parquet(tmpFilePath)
+        os.replace(tmpFilePath, filePath)
+        self.prune()
+
+    def remove(self, stationID: str, year: int):
+        try:
+            os.remove(self.getFilePath(stationID, year))
+        except FileNotFoundError:
+            pass
+
+    def listEntries(self) -> list[dict]:
+        entries = []
+        for fileName in os.listdir(self.cacheDir):
+            if not fileName.endswith('.parquet'):
+                continue
+            stationID, year = fileName[:-len('.parquet')].rsplit('_', 1)
+            fileStats = os.stat(os.path.join(self.cacheDir, fileName))
+            entries.append({'stationID': stationID, 'year': int(year), 'nBytes': fileStats.st_size, 'lastUsed': fileStats.st_mtime})
+
+        return sorted(entries, key=lambda entry: (entry['stationID'], entry['year']))
+
+    def getTotalBytes(self) -> int:
+        return sum(entry['nBytes'] for entry in self.listEntries())
+
+    def prune(self, maxBytes: int = None) -> list[dict]:
+        if maxBytes is None:
+            maxBytes = self.maxBytes
+
+        with self.lock:
+            entries = sorted(self.listEntries(), key=lambda entry: entry['lastUsed'])
+            totalBytes = sum(entry['nBytes'] for entry in entries)
+            evicted = []
+            while entries and totalBytes > maxBytes:
+                entry = entries.pop(0)
+                self.remove(entry['stationID'], entry['year'])
+                totalBytes -= entry['nBytes']
+                evicted.append(entry)
+
+        for entry in evicted:
+            print(f"Evicted historical data for station {entry['stationID']} in {entry['year']} from cache")
+        return evicted
+
+    def printContents(self):
+        entries = self.listEntries()
+        for entry in entries:
+            lastUsed = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['lastUsed']))
+            print(f"{entry['stationID']:>8} {entry['year']:>6} {entry['nBytes'] / 1e3:>10.1f} kB   last used {lastUsed}")
+        print(f'{len(entries)} cached years, {sum(entry["nBytes"] for entry in entries) / 1e6:.2f} of {self.maxBytes / 1e6:.0f} MB in {self.cacheDir}')
+
+
+class RealtimeCache():
+    '''
+    Last realtime .spec response for each station together with its parsed data frame.
+
+    Entries younger than maxStalenessMinutes are reused without touching the network.
+    Older entries are revalidated with If-None-Match / If-Modified-Since, and a 304 response
+    hands back the stored data frame without any parsing.
+    '''
+    def __init__(self, cacheDir: str = DEFAULT_CACHE_DIR, maxStalenessMinutes: float = DEFAULT_REALTIME_MAX_STALENESS_MINUTES):
+        self.cacheDir = os.path.join(cacheDir, 'realtime')
+        self.maxStalenessMinutes = maxStalenessMinutes
+        self.memoryEntries = dict()   # stationID -> (metadata, data frame), saves rereading the files within a process
+                                      # the frames are private copies, callers always get their own copy to modify
+        self.lock = threading.Lock()
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def getFilePaths(self, stationID: str) -> tuple[str]:
+        return os.path.join(self.cacheDir, f'{stationID}.parquet'), os.path.join(self.cacheDir, f'{stationID}.json')
+
+    def load(self, stationID: str) -> tuple:
+        with self.lock:
+            if stationID in self.memoryEntries:
+                metadata, realtimeDF = self.memoryEntries[stationID]
+                return metadata, realtimeDF.copy()
+
+        dataFilePath, metadataFilePath = self.getFilePaths(stationID)
+        try:
+            with open(metadataFilePath) as f:
+                metadata = json.load(f)
+            realtimeDF = pd.read_parquet(dataFilePath)
+        except (FileNotFoundError, ValueError):
+            return None, None
+        except Exception as e:
+            print(f'Discarding unreadable realtime cache entry for station {stationID}: {e}')
+            return None, None
+
+        if metadata.get('formatVersion') != REALTIME_CACHE_FORMAT_VERSION:
+            print(f'Discarding outdated realtime cache entry for station {stationID}')
+            return None, None
+
+        with self.lock:
+            self.memoryEntries[stationID] = (metadata, realtimeDF)
+        return metadata, realtimeDF.copy()
+
+    def writeMetadata(self, stationID: str, metadata: dict):
+        _, metadataFilePath = self.getFilePaths(stationID)
+        tmpFilePath = f'{metadataFilePath}.{threading.get_ident()}.tmp'
+        with open(tmpFilePath, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmpFilePath, metadataFilePath)
+
+    def store(self, stationID: str, realtimeDF: pd.DataFrame, responseHeaders: dict):
+        metadata = {
+                'etag': responseHeaders.get('ETag'),
+                'lastModified': responseHeaders.get('Last-Modified'),
+                'fetchedAt': time.time(),
+                'formatVersion': REALTIME_CACHE_FORMAT_VERSION,
+                }
+
+        dataFilePath, _ = self.getFilePaths(stationID)
+        tmpFilePath = f'{dataFilePath}.{threading.get_ident()}.tmp'
+        realtimeDF.to_parquet(tmpFilePath)
+        os.replace(tmpFilePath, dataFilePath)
+        self.writeMetadata(stationID, metadata)
+
+        with self.lock:
+            self.memoryEntries[stationID] = (metadata, realtimeDF.copy())
+
+    def markRevalidated(self, stationID: str, metadata: dict):
+        metadata['fetchedAt'] = time.time()
+        self.writeMetadata(stationID, metadata)
+
+    def isFresh(self, metadata: dict) -> bool:
+        return time.time() - metadata['fetchedAt'] < self.maxStalenessMinutes * 60
+
+    @staticmethod
+    def getConditionalHeaders(metadata: dict) -> dict:
+        headers = dict()
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('lastModified'):
+            headers['If-Modified-Since'] = metadata['lastModified']
+        return headers
+
+
+sharedHistoricalCache = None
+sharedRealtimeCache = None
+sharedCacheLock = threading.Lock()
+
+def getSharedHistoricalCache() -> HistoricalCache:
+    global sharedHistoricalCache
+    with sharedCacheLock:
+        if sharedHistoricalCache is None:
+            sharedHistoricalCache = HistoricalCache()
+        return sharedHistoricalCache
+
+def getSharedRealtimeCache() -> RealtimeCache:
+    global sharedRealtimeCache
+    with sharedCacheLock:
+        if sharedRealtimeCache is None:
+            sharedRealtimeCache = RealtimeCache()
+        return sharedRealtimeCache
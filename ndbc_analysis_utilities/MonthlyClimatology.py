@@ -0,0 +1,131 @@
+import json
+import numpy as np
+import pandas as pd
+
+PERCENTILE_GRID = np.arange(1, 100)
+PERIOD_BIN_EDGES = np.arange(0, 27)   # 1 s bins, periods past 26 s and missing (NaN) periods are left out
+DIRECTION_BIN_EDGES = np.arange(0, 370, 10)   # 10 degree bins of MWD, missing (NaN) directions are left out
+
+
+def getNearestRankIndex(nthPercentile: float, nSamples: int) -> int:
+    # same rule as getPercentileSample in PlotHistoricalWvhts.py
+    return int(np.ceil(nthPercentile / 100 * nSamples) - 1)
+
+
+class MonthlyClimatology():
+    '''
+    Summary of one station's historical samples in one calendar month, as stored in the climatology table.
+
+    Holds the sample count, the wave heights at PERCENTILE_GRID, period and direction histograms and the wave heights
+    sorted ascending together with the period of each sample. The sorted arrays answer percentiles and threshold
+    counts exactly, they are only loaded when readClimatology is asked for them.
+    '''
+    def __init__(self, month: int, nSamples: int, wvhtPercentiles: np.ndarray, periodHist: np.ndarray, directionHist: np.ndarray,
+                 wvhtsSorted: np.ndarray = None, periodsByWvht: np.ndarray = None, firstYear: int = None, lastYear: int = None):
+        self.month = month
+        self.nSamples = nSamples
+        self.wvhtPercentiles = wvhtPercentiles
+        self.periodHist = periodHist
+        self.directionHist = directionHist
+        self.wvhtsSorted = wvhtsSorted
+        self.periodsByWvht = periodsByWvht
+        self.firstYear = firstYear
+        self.lastYear = lastYear
+
+    @classmethod
+    def fromHistoricalDF(cls, month: int, monthDF: pd.DataFrame):
+        monthDF = monthDF[monthDF['WVHT'].notna()].sort_values('WVHT', kind='stable')
+        wvhtsSorted = monthDF['WVHT'].to_numpy(dtype='float64')
+        periodsByWvht = monthDF['DPD'].to_numpy(dtype='float64')
+        directions = monthDF['MWD'].to_numpy(dtype='float64')
+
+        nSamples = len(wvhtsSorted)
+        if nSamples > 0:
+            wvhtPercentiles = wvhtsSorted[[getNearestRankIndex(p, nSamples) for p in PERCENTILE_GRID]]
+        else:
+            wvhtPercentiles = np.full(len(PERCENTILE_GRID), np.nan)
+
+        periodHist = np.histogram(periodsByWvht[~np.isnan(periodsByWvht)], PERIOD_BIN_EDGES)[0]
+        directionHist = np.histogram(directions[~np.isnan(directions)], DIRECTION_BIN_EDGES)[0]
+        years = monthDF['Date'].dt.year
+        firstYear, lastYear = (int(years.min()), int(years.max())) if nSamples > 0 else (None, None)
+        return cls(month, nSamples, wvhtPercentiles, periodHist, directionHist, wvhtsSorted, periodsByWvht, firstYear, lastYear)
+
+    def checkSamplesLoaded(self):
+        if self.wvhtsSorted is None:
+            raise ValueError(f'Month {self.month} climatology was read without its sorted samples')
+
+    def countBelow(self, wvht):
+        # wvht can also be an array, which gets an array of counts back
+        self.checkSamplesLoaded()
+        counts = np.searchsorted(self.wvhtsSorted, wvht, side='left')
+        return counts if np.ndim(counts) > 0 else int(counts)
+
+    def calcWVHTPercentile(self, wvht: float) -> float:
+        # % of samples smaller than wvht, like NDBCBuoy.calcWVHTPercentile
+        if self.nSamples == 0:
+            return np.nan
+        return self.countBelow(wvht) / self.nSamples * 100
+
+    def getWvhtAtPercentile(self, nthPercentile: float, minPeriod: float = None) -> float:
+        if minPeriod is None and nthPercentile in PERCENTILE_GRID:
+            return float(self.wvhtPercentiles[int(nthPercentile) - 1])
+
+        self.checkSamplesLoaded()
+        wvhts = self.wvhtsSorted if minPeriod is None else self.wvhtsSorted[self.periodsByWvht >= minPeriod]
+        if len(wvhts) == 0:
+            # nothing passed the period filter
+            return np.nan
+        return float(wvhts[getNearestRankIndex(nthPercentile, len(wvhts))])
+
+    def countAboveThresholds(self, minPeriod: float = None, minWvht: float = None) -> int:
+        # samples with period >= minPeriod and wave height >= minWvht
+        if minPeriod is None and minWvht is None:
+            return self.nSamples
+
+        self.checkSamplesLoaded()
+        firstIndex = 0 if minWvht is None else self.countBelow(minWvht)
+        if minPeriod is None:
+            return self.nSamples - firstIndex
+        return int(np.count_nonzero(self.periodsByWvht[firstIndex:] >= minPeriod))
+
+    def calcPercentAboveThresholds(self, minPeriod: float = None, minWvht: float = None) -> float:
+        if self.nSamples == 0:
+            return np.nan
+        return self.countAboveThresholds(minPeriod, minWvht) / self.nSamples * 100
+
+    def getSamplesDF(self) -> pd.DataFrame:
+        return pd.DataFrame({'WVHT': self.wvhtsSorted, 'DPD': self.periodsByWvht})
+
+    def toRow(self) -> tuple:
+        # (month, n_samples, first_year, last_year, wvht_percentiles, period_hist, direction_hist) column values
+        return (self.month, self.nSamples, self.firstYear, self.lastYear, json.dumps([None if np.isnan(x) else float(x) for x in self.wvhtPercentiles]),
+                json.dumps(self.periodHist.tolist()), json.dumps(self.directionHist.tolist()))
+
+    @classmethod
+    def fromRow(cls, row: tuple, samplesDF: pd.DataFrame = None):
+        month, nSamples, firstYear, lastYear, wvhtPercentiles, periodHist, directionHist = row
+        wvhtsSorted, periodsByWvht = None, None
+        if samplesDF is not None:
+            wvhtsSorted, periodsByWvht = samplesDF['WVHT'].to_numpy(dtype='float64'), samplesDF['DPD'].to_numpy(dtype='float64')
+        return cls(month, nSamples, np.array(json.loads(wvhtPercentiles), dtype='float64'), np.array(json.loads(periodHist)),
+                   np.array(json.loads(directionHist)), wvhtsSorted, periodsByWvht, firstYear, lastYear)
+
+
+def buildClimatology(historicalDF: pd.DataFrame) -> dict:
+    # month -> MonthlyClimatology for every month with samples in historicalDF
+    months = historicalDF['Date'].dt.month
+    return {int(month): MonthlyClimatology.fromHistoricalDF(int(month), monthDF) for month, monthDF in historicalDF.groupby(months)}
+
+def calcWVHTPercentileOverMonths(climatology: dict, months: list[int], wvht) -> tuple:
+    '''
+    % of the samples from the given months that are smaller than wvht, the same number calcWVHTPercentile gets from
+    the concatenated historical samples. wvht can also be an array. Returns (percentile, # of samples).
+    '''
+    monthClimatologies = [climatology[month] for month in months if month in climatology]
+    nTotalValues = sum(monthClimatology.nSamples for monthClimatology in monthClimatologies)
+    if nTotalValues == 0:
+        raise ValueError(f'Climatology has no samples for months {months}')
+
+    nBelow = sum(monthClimatology.countBelow(wvht) for monthClimatology in monthClimatologies)
+    return nBelow / nTotalValues * 100, nTotalValues
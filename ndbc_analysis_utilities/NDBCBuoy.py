@@ -1,28 +1,43 @@
 import requests
-from bs4 import BeautifulSoup
-from scipy.stats import norm
 import numpy as np
 import pandas as pd
-import re
 import time
-from datetime import date, datetime, timedelta
+import calendar
+import gzip
+import io
+from datetime import date, datetime
 from .db_config.DatabaseInteractor import DatabaseInteractor
+from .NDBCTransport import getSharedTransport
+from . import NDBCParser
+from .LocalCache import getSharedHistoricalCache, getSharedRealtimeCache
+from .MonthlyClimatology import calcWVHTPercentileOverMonths
+from .IngestMetrics import getSharedIngestMetrics
 
-
-def cleanBuoyData(dfItem):
-    if dfItem == "MM":
-        return "0.0"
-    else:
-        return dfItem
+MONTHLY_FILE_CODES = '123456789abc'   # month character in the names of the monthly stdmet files
 
 
 class NDBCBuoy():
     def __init__(self, stationID: str):
         self.stationID = stationID
         self.swellDict = self.buildSwellDirDict()
+        self.swellDirLookup = self.buildSwellDirLookup(self.swellDict)
         self.nYearsBack = 5   # number of years to go back for historical analysis
         self.nHistoricalMonths = 3 # number of months in historical data range
         self.nSecondsToPauseBtwnRequests = 5
+        self.historicalSource = 'gzip'   # 'gzip' downloads the raw .txt.gz files, 'html' goes through view_text_file.php
+        self.rateLimiter = None   # shared RateLimiter from FetchEngine, replaces the fixed pause when set
+        self.transport = getSharedTransport()
+        self.historicalCache = getSharedHistoricalCache()   # set to None to always go to the network
+        self.realtimeCache = getSharedRealtimeCache()   # set to None to always download and parse the .spec file
+        self.revalidateRealtime = False   # True skips the cache's freshness window and always sends the conditional request
+        self.compactStorage = False   # float32 columns and a contiguous index, see compactDataFrame
+        self.dbBackend = None   # StorageBackend to borrow database connections from, None uses getSharedBackend
+        self.climatology = None   # month -> MonthlyClimatology from the database, calcWVHTPercentile uses it instead of the historical samples
+        self.historicalDelta = []   # (kind, period, data frame) pieces from fetchHistoricalDelta
+        self.historicalFailures = []   # (kind, period, exception) of the files fetchHistoricalDelta could not fetch, None for files still backing off
+        self.ingestCheckpoint = None   # IngestCheckpoint that fetchHistoricalDelta reads, stores and records failed files in
+        self.wvhtECDFs = dict()   # data set name -> sorted wave heights, see getWVHTECDF
+        self.metrics = getSharedIngestMetrics()   # parse times and row counts of this buoy's files
 
         # default values
         self.dataFrameRealtime = []
@@ -58,37 +73,105 @@ class NDBCBuoy():
     
         return swellDirDict
 
+    @staticmethod
+    def buildSwellDirLookup(swellDirDict: dict) -> np.ndarray:
+        # degrees in the order of the parser's compass categories, the trailing NaN is picked up by the -1 code of missing directions
+        return np.append([swellDirDict[iDir] for iDir in NDBCParser.COMPASS_POINTS], np.nan)
+
+    def requestNDBCPage(self, url: str, headers: dict = None) -> requests.models.Response:
+        if self.rateLimiter is None:
+            print(f'requesting {url} after {self.nSecondsToPauseBtwnRequests}s pause...')
+            time.sleep(self.nSecondsToPauseBtwnRequests)
+            return self.transport.get(url, headers=headers, label=self.stationID)
+
+        print(f'requesting {url}...')
+        with self.rateLimiter:
+            return self.transport.get(url, headers=headers, label=self.stationID)
+
     def makeHistoricalDataRequest(self, year: int) -> requests.models.Response:
         historicalURL = f'https://www.ndbc.noaa.gov/view_text_file.php?filename={self.stationID}h{year}.txt.gz&dir=data/historical/stdmet/'
-        print(f'requesting {historicalURL} after {self.nSecondsToPauseBtwnRequests}s pause...')
-        time.sleep(self.nSecondsToPauseBtwnRequests)
-        ndbcPage = requests.get(historicalURL)       #<class 'requests.models.Response'>
+        ndbcPage = self.requestNDBCPage(historicalURL)       #<class 'requests.models.Response'>
+        return ndbcPage
+
+    def getRawHistoricalURL(self, year: int) -> str:
+        return f'https://www.ndbc.noaa.gov/data/historical/stdmet/{self.stationID}h{year}.txt.gz'
+
+    def getMonthlyHistoricalURL(self, year: int, month: int) -> str:
+        # quality controlled months of the year before NDBC publishes its yearly file, e.g. data/stdmet/Feb/462582<year>.txt.gz
+        return f'https://www.ndbc.noaa.gov/data/stdmet/{calendar.month_abbr[month]}/{self.stationID}{MONTHLY_FILE_CODES[month - 1]}{year}.txt.gz'
+
+    def makeRawHistoricalDataRequest(self, year: int) -> requests.models.Response:
+        ndbcPage = self.requestNDBCPage(self.getRawHistoricalURL(year))       #<class 'requests.models.Response'>
+        if ndbcPage.status_code == 404:
+            raise Exception(f'Could not find historical data for station {self.stationID} in {year}. This data might not exist for this station!')
         return ndbcPage
 
-    def makeRealtimeDataRequest(self) -> requests.models.Response:
+    def makeRealtimeDataRequest(self, headers: dict = None) -> requests.models.Response:
         urlRealtime = f'https://www.ndbc.noaa.gov/data/realtime2/{self.stationID}.spec'
-        print(f'requesting {urlRealtime} after {self.nSecondsToPauseBtwnRequests}s pause...')
-        time.sleep(self.nSecondsToPauseBtwnRequests)
-        ndbcPage = requests.get(urlRealtime)       #<class 'requests.models.Response'>
+        ndbcPage = self.requestNDBCPage(urlRealtime, headers)       #<class 'requests.models.Response'>
         print(f'ndbcPage response for realtime data for station {self.stationID}: {ndbcPage}')
         if ndbcPage.status_code == 404:
             raise Exception(f'Could not connect to realtime data server for station {self.stationID}. This data might not exist for this station!')
         return ndbcPage
 
-    @staticmethod
-    def parseRealtimeData(ndbcPage) -> pd.DataFrame:
-        #TODO: check other ways of doing this!!
-        buoySoup = BeautifulSoup(ndbcPage.content, 'html.parser') #<class 'bs4.BeautifulSoup'>
-
-        soupString = str(buoySoup)# convert soup to a string
-        rowList = re.split("\n+", soupString)# split string based on row divisions
-        rowList = rowList[:-1]# TODO: remove last entry if necessary
-        entryList = [re.split(" +", iRow) for iRow in rowList]# split each row into a list of individual entries using spaces, so we have a list of lists
-    
-        # build data frame
-        buoyDF = pd.DataFrame(entryList[2:], columns = entryList[0])  # ignore first 2 rows
+    def recordParse(self, startTime: float, parseStats: dict, buoyDF: pd.DataFrame):
+        self.metrics.add(self.stationID, 'parse_seconds', time.perf_counter() - startTime)
+        self.metrics.add(self.stationID, 'rows_parsed', parseStats.get('nRows', 0))
+        self.metrics.add(self.stationID, 'rows_kept', len(buoyDF))
+
+    def parseRealtimeData(self, ndbcPage) -> pd.DataFrame:
+        startTime, parseStats = time.perf_counter(), dict()
+        buoyDF = NDBCParser.parseRealtimeSpec(ndbcPage.content, parseStats)
+        self.recordParse(startTime, parseStats, buoyDF)
         return buoyDF
 
+    @staticmethod
+    def compactDataFrame(buoyDF: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Shrinks a buoy data frame for holding many stations and years in memory.
+
+        Every measurement becomes float32, directions included, so the dtypes do not depend on the data
+        and fractional degrees (e.g. the 22.5 degree steps of SwD) survive.
+        The index is replaced by a contiguous RangeIndex, which takes no memory per row, so the original
+        row numbers of the NDBC files are lost. Date stays a datetime64 column.
+        '''
+        compactDF = buoyDF.reset_index(drop=True)
+        for colName in compactDF.columns:
+            if colName == 'Date':
+                continue
+            compactDF[colName] = compactDF[colName].astype('float32')
+        return compactDF
+
+    def storeDataFrame(self, dataSetName: str, buoyDF: pd.DataFrame):
+        if self.compactStorage:
+            buoyDF = self.compactDataFrame(buoyDF)
+
+        if dataSetName == 'historical':
+            self.dataFrameHistorical = buoyDF
+        elif dataSetName == 'realtime':
+            self.dataFrameRealtime = buoyDF
+        else:
+            raise ValueError('historical and realtime are the only supported data sets')
+        self.wvhtECDFs.pop(dataSetName, None)
+
+    def getMemoryUsage(self) -> dict:
+        memoryUsage = dict()
+        for dataSetName, buoyDF in [('realtime', self.dataFrameRealtime), ('historical', self.dataFrameHistorical)]:
+            if isinstance(buoyDF, pd.DataFrame):
+                memoryUsage[dataSetName] = buoyDF.memory_usage(index=True, deep=True).to_dict()
+        return memoryUsage
+
+    def printMemoryReport(self) -> int:
+        memoryUsage = self.getMemoryUsage()
+        nTotalBytes = 0
+        for dataSetName, columnBytes in memoryUsage.items():
+            nRows = len(self.dataFrameRealtime if dataSetName == 'realtime' else self.dataFrameHistorical)
+            columnStrs = [f'{colName} {nBytes / 1e3:.1f}' for colName, nBytes in columnBytes.items()]
+            print(f'  {dataSetName:>10}: {nRows} rows, {sum(columnBytes.values()) / 1e6:.2f} MB  [kB: {", ".join(columnStrs)}]')
+            nTotalBytes += sum(columnBytes.values())
+        print(f'station {self.stationID}: {nTotalBytes / 1e6:.2f} MB')
+        return nTotalBytes
+
     def setRealtimeSamplingRate(self):
         dateSeries = self.dataFrameRealtime['Date']
         expectedInterval = pd.Timedelta(1, unit='hours')
@@ -99,32 +182,49 @@ class NDBCBuoy():
             print(f'Detected sampling period of {thisInterval} instead of {expectedInterval} for this buoy! Setting self.nSamperPerHour to {self.nSampsPerHour}')
 
     def cleanRealtimeDataFrame(self, buoyDF):
-        buoyDF['Date'] = buoyDF['#YY'] + buoyDF['MM'] + buoyDF['DD'] + buoyDF['hh'] + buoyDF['mm']# add a date column
-        buoyDF['Date'] = pd.to_datetime(buoyDF['Date'], format='%Y%m%d%H%M')
-
-        # drop unncessary columns
-        buoyDF = buoyDF.loc[:, ['Date', 'WVHT', 'SwP', 'SwD']]
-    
-        # clean data
-        buoyDF = buoyDF.applymap(cleanBuoyData)
-        print(buoyDF)
-    
-        # change type of swell size and period data
-        buoyDF["WVHT"] = pd.to_numeric(buoyDF["WVHT"])
-        buoyDF["SwP"] = pd.to_numeric(buoyDF["SwP"])
-    
-        # convert swell direction to degrees
-        buoyDF["SwD"] = buoyDF["SwD"].map(self.swellDict)
-        #print(buoyDF)
-        
-        # do we need a call to pd.to_numeric for the swell direction
-        buoyDF["SwD"] = pd.to_numeric(buoyDF["SwD"])
+        # missing (MM) readings are already NaN, so only the swell direction needs converting to degrees
+        buoyDF["SwD"] = self.swellDirLookup[buoyDF["SwD"].cat.codes.to_numpy()]
         return buoyDF
 
     def buildRealtimeDataFrame(self):
-        ndbcPage = self.makeRealtimeDataRequest()
-        rawDF = self.parseRealtimeData(ndbcPage)
-        self.dataFrameRealtime = self.cleanRealtimeDataFrame(rawDF)
+        if self.realtimeCache is None:
+            ndbcPage = self.makeRealtimeDataRequest()
+            rawDF = self.parseRealtimeData(ndbcPage)
+            self.storeDataFrame('realtime', self.cleanRealtimeDataFrame(rawDF))
+            print(self.dataFrameRealtime)
+            self.setRealtimeSamplingRate()
+            return
+
+        cacheMetadata, cachedDF = self.realtimeCache.load(self.stationID)
+        if cachedDF is not None and not self.revalidateRealtime and self.realtimeCache.isFresh(cacheMetadata):
+            print(f'Reusing cached realtime data for station {self.stationID}')
+            self.storeDataFrame('realtime', cachedDF)
+            self.setRealtimeSamplingRate()
+            return
+
+        conditionalHeaders = None
+        if cachedDF is not None:
+            conditionalHeaders = self.realtimeCache.getConditionalHeaders(cacheMetadata)
+
+        try:
+            ndbcPage = self.makeRealtimeDataRequest(conditionalHeaders)
+        except requests.exceptions.RequestException as e:
+            if cachedDF is None:
+                raise
+            print(f'Realtime request for station {self.stationID} failed ({e}), falling back to stale cached data')
+            ndbcPage = None
+
+        if ndbcPage is None or ndbcPage.status_code == 304:
+            if ndbcPage is not None:
+                print(f'Realtime data for station {self.stationID} has not changed since the last request')
+                self.realtimeCache.markRevalidated(self.stationID, cacheMetadata)
+            self.storeDataFrame('realtime', cachedDF)
+        else:
+            realtimeDF = self.cleanRealtimeDataFrame(self.parseRealtimeData(ndbcPage))
+            self.realtimeCache.store(self.stationID, realtimeDF, ndbcPage.headers)
+            self.storeDataFrame('realtime', realtimeDF)
+            print(self.dataFrameRealtime)
+
         self.setRealtimeSamplingRate()
     
     def getHistoricalYears(self, nYears: int) -> list:
@@ -143,63 +243,203 @@ class NDBCBuoy():
 
         return [(currentMonth + dMonth - 1) % 12 + 1 for dMonth in range(-nBackMonths, nForwardMonths+1)]
 
-    @staticmethod
-    def parseHistoricalData(ndbcPage, monthsToCheck: list[int]):
-        buoySoup = BeautifulSoup(ndbcPage.content, 'html.parser') #<class 'bs4.BeautifulSoup'>
-
-        soupString = str(buoySoup)# convert soup to a string
-        rowList = re.split("\n+", soupString)# split string based on row divisions
-        rowList = rowList[:-1]# TODO: remove last entry if necessary
-        entryList = [re.split(" +", iRow.strip()) for iRow in rowList]# split each row into a list of individual entries using spaces, so we have a list of lists
-    
-        # build data frame
-        buoyDF = pd.DataFrame(entryList[2:], columns = entryList[0])  # ignore first 2 rows
-        print(f'initial historical buoy df:')
+    def getHistoricalQueryFilters(self) -> dict:
+        # the same years and months buildHistoricalDataFrame requests from NDBC, as DatabaseInteractor.queryHistoricalData filters
+        years = self.getHistoricalYears(self.nYearsBack)
+        return {'months': self.getHistoricalMonths(self.nHistoricalMonths),
+                'startDate': datetime(years[0], 1, 1),
+                'endDate': datetime(years[-1] + 1, 1, 1)}
+
+    def parseHistoricalData(self, ndbcPage, monthsToCheck: list[int]):
+        startTime, parseStats = time.perf_counter(), dict()
+        buoyDF = NDBCParser.parseHistoricalStdmet(ndbcPage.content, monthsToCheck, parseStats=parseStats)
+        self.recordParse(startTime, parseStats, buoyDF)
+        print('final parsed historical df:')
         print(buoyDF)
+        return buoyDF
 
-        # remove every element that doesn't have waveheight data
-        rowsToRemove = buoyDF.loc[buoyDF['WVHT'] == '99.00']
-        buoyDF = buoyDF.drop(rowsToRemove.index)
-
-        # remove elements not in correct months
-        monthsToCheckStrs = []
-        for thisMonth in monthsToCheck:
-            monthStr = str(thisMonth)
-            if thisMonth < 10:
-                monthStr = '0' + monthStr 
-            monthsToCheckStrs.append(monthStr)
-
-        buoyDF = buoyDF[buoyDF['MM'].isin(monthsToCheckStrs)]
+    def parseRawHistoricalData(self, ndbcPage, monthsToCheck: list[int]):
+        # decompress the .txt.gz file straight into the parser
+        startTime, parseStats = time.perf_counter(), dict()
+        with gzip.GzipFile(fileobj=io.BytesIO(ndbcPage.content)) as gzipFile:
+            buoyDF = NDBCParser.parseHistoricalStdmet(gzipFile, monthsToCheck, parseStats=parseStats)
+        self.recordParse(startTime, parseStats, buoyDF)
         print('final parsed historical df:')
         print(buoyDF)
         return buoyDF
 
     @staticmethod
     def cleanHistoricalDataFrame(buoyDF):
-        # build date column
-        buoyDF['Date'] = buoyDF['#YY'] + buoyDF['MM'] + buoyDF['DD'] + buoyDF['hh'] + buoyDF['mm']# add a date column
-        buoyDF['Date'] = pd.to_datetime(buoyDF['Date'], format='%Y%m%d%H%M')
-
-        # drop unneccessary columns and convert data types
-        buoyDF = buoyDF.loc[:, ['Date', 'WVHT', 'DPD', 'MWD']]
-        buoyDF["WVHT"] = pd.to_numeric(buoyDF["WVHT"])
-        buoyDF["DPD"] = pd.to_numeric(buoyDF["DPD"])
-        buoyDF["MWD"] = pd.to_numeric(buoyDF["MWD"])
-        return buoyDF
+        # the parser already builds the date column and typed measurement columns
+        return buoyDF.loc[:, ['Date', 'WVHT', 'DPD', 'MWD']]
+
+    def fetchHistoricalYear(self, year: int, monthsToCheck: list[int]) -> pd.DataFrame:
+        if self.historicalCache is None or year >= date.today().year:
+            return self.downloadHistoricalYear(year, monthsToCheck)
+
+        # past years never change, so cache the whole year and select the months afterwards
+        yearDF = self.historicalCache.load(self.stationID, year)
+        if yearDF is None:
+            yearDF = self.downloadHistoricalYear(year, list(range(1, 13)))
+            self.historicalCache.store(self.stationID, year, yearDF)
+
+        return yearDF[yearDF['Date'].dt.month.isin(monthsToCheck)]
+
+    def downloadHistoricalYear(self, year: int, monthsToCheck: list[int]) -> pd.DataFrame:
+        if self.historicalSource == 'gzip':
+            ndbcPage = self.makeRawHistoricalDataRequest(year)
+            rawDF = self.parseRawHistoricalData(ndbcPage, monthsToCheck)
+        elif self.historicalSource == 'html':
+            ndbcPage = self.makeHistoricalDataRequest(year)
+            rawDF = self.parseHistoricalData(ndbcPage, monthsToCheck)
+        else:
+            raise ValueError('gzip and html are the only supported historical sources')
+
+        return self.cleanHistoricalDataFrame(rawDF)
+
+    def fetchPublishedHistoricalYear(self, year: int) -> pd.DataFrame:
+        # every month of the year, None when NDBC has no yearly file for it (yet)
+        if self.historicalCache is not None:
+            yearDF = self.historicalCache.load(self.stationID, year)
+            if yearDF is not None:
+                return yearDF
+
+        ndbcPage = self.requestNDBCPage(self.getRawHistoricalURL(year))
+        if ndbcPage.status_code == 404:
+            return None
+
+        yearDF = self.cleanHistoricalDataFrame(self.parseRawHistoricalData(ndbcPage, list(range(1, 13))))
+        if self.historicalCache is not None:
+            self.historicalCache.store(self.stationID, year, yearDF)
+        return yearDF
+
+    def fetchHistoricalMonth(self, year: int, month: int) -> pd.DataFrame:
+        # None when NDBC has not published the month yet
+        ndbcPage = self.requestNDBCPage(self.getMonthlyHistoricalURL(year, month))
+        if ndbcPage.status_code == 404:
+            return None
+        return self.cleanHistoricalDataFrame(self.parseRawHistoricalData(ndbcPage, [month]))
+
+    def fetchHistoricalUnit(self, kind: str, period: int) -> pd.DataFrame:
+        # one yearly or monthly file, read back from the ingest checkpoint when an interrupted run already fetched it
+        if self.ingestCheckpoint is not None:
+            isCheckpointed, unitDF = self.ingestCheckpoint.loadUnit(self.stationID, kind, period)
+            if isCheckpointed:
+                return unitDF
+
+        if kind == 'year':
+            unitDF = self.fetchPublishedHistoricalYear(period)
+        else:
+            unitDF = self.fetchHistoricalMonth(period // 100, period % 100)
+
+        if self.ingestCheckpoint is not None:
+            self.ingestCheckpoint.storeUnit(self.stationID, kind, period, unitDF)
+            self.ingestCheckpoint.clearUnitFailure(self.stationID, kind, period)
+        return unitDF
+
+    def isHistoricalUnitDue(self, kind: str, period: int) -> bool:
+        if self.ingestCheckpoint is None or self.ingestCheckpoint.isUnitDue(self.stationID, kind, period):
+            return True
+        print(f'Skipping {kind} {period} of station {self.stationID}, it failed recently and is not due for a retry yet')
+        self.historicalFailures.append((kind, period, None))
+        return False
+
+    def tryFetchHistoricalUnit(self, kind: str, period: int) -> tuple:
+        # (True, data frame) on success, (False, None) after recording the failure so the other files can still be fetched
+        try:
+            return True, self.fetchHistoricalUnit(kind, period)
+        except Exception as e:
+            print(f'Could not fetch {kind} {period} of station {self.stationID}: {e}')
+            self.historicalFailures.append((kind, period, e))
+            if self.ingestCheckpoint is not None:
+                self.ingestCheckpoint.recordUnitFailure(self.stationID, kind, period, e)
+            return False, None
+
+    def fetchHistoricalDelta(self, manifest: set) -> list[tuple]:
+        '''
+        Fetches the historical files of the last nYearsBack years and the current year that are not in manifest yet.
+
+        manifest holds the ('year', YYYY) and ('month', YYYYMM) files already stored (see DatabaseInteractor.getHistoricalManifests).
+        A year without a published yearly file (the current year, and last year for its first months) comes from its monthly
+        files instead, stopping at the first month NDBC has not published. Returns (kind, period, data frame) pieces,
+        the data frame being None for older years NDBC has no data for.
+        A file that fails to download or parse ends up in self.historicalFailures and the other years keep going,
+        so the pieces fetched so far can still be stored.
+        '''
+        currentYear = date.today().year
+        pieces = []
+        self.historicalFailures = []
+        for year in self.getHistoricalYears(self.nYearsBack) + [currentYear]:
+            if ('year', year) in manifest:
+                continue
+
+            if year < currentYear:
+                if not self.isHistoricalUnitDue('year', year):
+                    continue
+                isFetched, yearDF = self.tryFetchHistoricalUnit('year', year)
+                if not isFetched:
+                    continue
+                if yearDF is not None:
+                    pieces.append(('year', year, yearDF))
+                    continue
+                if year < currentYear - 1:
+                    print(f'Could not find historical data for station {self.stationID} in {year}, it will not be requested again')
+                    pieces.append(('year', year, None))
+                    continue
+
+            lastMonth = 12 if year < currentYear else date.today().month - 1
+            for month in range(1, lastMonth + 1):
+                if ('month', year * 100 + month) in manifest:
+                    continue
+                if not self.isHistoricalUnitDue('month', year * 100 + month):
+                    break
+                _, monthDF = self.tryFetchHistoricalUnit('month', year * 100 + month)
+                if monthDF is None:
+                    break
+                pieces.append(('month', year * 100 + month, monthDF))
+
+        print(f'Fetched {len(pieces)} new historical files for station {self.stationID}, {len(self.historicalFailures)} files failed')
+        return pieces
 
     def buildHistoricalDataFrame(self):
         yearsToCheck = self.getHistoricalYears(self.nYearsBack)
         monthsToCheck = self.getHistoricalMonths(self.nHistoricalMonths)
         print(f'Grabbing historical data from years of {yearsToCheck} and months {monthsToCheck}')
-        print(f'To limit requests to NDBC webpage, collecting {self.nYearsBack} years of historical data will take us about {self.nYearsBack * self.nSecondsToPauseBtwnRequests}s')
+        if self.rateLimiter is None:
+            print(f'To limit requests to NDBC webpage, collecting {self.nYearsBack} years of historical data will take us about {self.nYearsBack * self.nSecondsToPauseBtwnRequests}s')
         historicalDataFrames = []
         for yearToCheck in yearsToCheck:
-            ndbcPage = self.makeHistoricalDataRequest(yearToCheck)
-            rawDF = self.parseHistoricalData(ndbcPage, monthsToCheck)
-            thisDataFrame = self.cleanHistoricalDataFrame(rawDF)
-            historicalDataFrames.append(thisDataFrame)
+            historicalDataFrames.append(self.fetchHistoricalYear(yearToCheck, monthsToCheck))
 
-        self.dataFrameHistorical = pd.concat(historicalDataFrames)
+        self.storeDataFrame('historical', pd.concat(historicalDataFrames, ignore_index=self.compactStorage))
+
+    def buildFullHistoricalDataFrame(self):
+        '''
+        Every month of the last nYearsBack years for the full rewrite of UpdateSwellDB.py, one yearly file at a time.
+
+        Each year goes through fetchHistoricalUnit, so with an ingest checkpoint the fetched years are kept until the
+        station commits. A year that fails ends up in self.historicalFailures while the other years keep going, then
+        this raises instead of storing a partial history, and the next run only requests the failed years.
+        '''
+        self.historicalFailures = []
+        yearDFs = []
+        for year in self.getHistoricalYears(self.nYearsBack):
+            if not self.isHistoricalUnitDue('year', year):
+                continue
+            isFetched, yearDF = self.tryFetchHistoricalUnit('year', year)
+            if not isFetched:
+                continue
+            if yearDF is None:
+                print(f'Could not find historical data for station {self.stationID} in {year}')
+                continue
+            yearDFs.append(yearDF)
+
+        if self.historicalFailures:
+            raise Exception(f'{len(self.historicalFailures)} historical years of station {self.stationID} could not be fetched, '
+                            f'{len(yearDFs)} fetched years wait in the ingest checkpoint for the next run')
+        if not yearDFs:
+            raise Exception(f'Could not find any historical data for station {self.stationID} in the last {self.nYearsBack} years')
+        self.storeDataFrame('historical', pd.concat(yearDFs, ignore_index=self.compactStorage))
 
     def setBuoyLocationFromDB(self, dBInteractor):
         print(f'Setting buoy location for station {self.stationID}')
@@ -208,33 +448,43 @@ class NDBCBuoy():
 
     def setRealtimeDFFromDB(self, dBInteractor):
         print(f'Setting realtime dataframe for station {self.stationID}')
-        self.dataFrameRealtime = dBInteractor.getRealtimeData(self.stationID)
+        self.storeDataFrame('realtime', dBInteractor.getRealtimeData(self.stationID))
 
     def setHistoricalDFFromDB(self, dBInteractor):
         print(f'Setting historical dataframe for station {self.stationID}')
-        self.dataFrameHistorical = dBInteractor.getHistoricalData(self.stationID)
+        historicalDFs = dBInteractor.queryHistoricalData([self.stationID], **self.getHistoricalQueryFilters())
+        self.storeDataFrame('historical', historicalDFs[self.stationID])
 
     def fetchDataFromNDBCPage(self):
         self.buildRealtimeDataFrame()
         self.buildHistoricalDataFrame()
 
-    def fetchDataFromDB(self):
-        dBInteractor = DatabaseInteractor()
+    def openDBInteractor(self) -> DatabaseInteractor:
+        dBInteractor = DatabaseInteractor(backend=self.dbBackend)
         if not dBInteractor.successfulConnection:
             raise Exception('Attempt to connect to database failed')
-
-        if not dBInteractor.checkForBuoyExistenceInDB(self.stationID):
-            dBInteractor.closeConnection()
-            Exception(f'Station {self.stationID} does not exist in database!')
-
-        #self.setBuoyLocationFromDB(dBInteractor)
-        self.setRealtimeDFFromDB(dBInteractor)
-        self.setHistoricalDFFromDB(dBInteractor)
-        dBInteractor.closeConnection()
-
-    def fetchData(self, useDB: bool):
+        return dBInteractor
+
+    def fetchDataFromDB(self, dBInteractor: DatabaseInteractor = None):
+        # an injected interactor stays open for the caller, otherwise we borrow a pooled connection for this station
+        ownInteractor = dBInteractor is None
+        if ownInteractor:
+            dBInteractor = self.openDBInteractor()
+
+        try:
+            if not dBInteractor.checkForBuoyExistenceInDB(self.stationID):
+                raise Exception(f'Station {self.stationID} does not exist in database!')
+
+            #self.setBuoyLocationFromDB(dBInteractor)
+            self.setRealtimeDFFromDB(dBInteractor)
+            self.setHistoricalDFFromDB(dBInteractor)
+        finally:
+            if ownInteractor:
+                dBInteractor.closeConnection()
+
+    def fetchData(self, useDB: bool, dBInteractor: DatabaseInteractor = None):
         if useDB:
-            self.fetchDataFromDB()
+            self.fetchDataFromDB(dBInteractor)
         else:
             self.fetchDataFromNDBCPage()
         self.setRecentReadings()
@@ -244,26 +494,81 @@ class NDBCBuoy():
         self.recentSwP = self.dataFrameRealtime['SwP'].iloc[0]
         self.recentSwD = self.dataFrameRealtime['SwD'].iloc[0]
 
+    def setRecentReadingsFromLatestObs(self, latestObs: pd.Series):
+        # latest_obs.txt only has the combined sea state, so the dominant period and the mean wave direction stand in for
+        # the swell period and direction. MWD is in degrees true while our swell directions start at S (see buildSwellDirDict)
+        self.recentWVHT = latestObs['WVHT']
+        self.recentSwP = latestObs['DPD']
+        self.recentSwD = (latestObs['MWD'] + 180) % 360
+
+    def ensureHistoricalDataFrame(self, useDB: bool = False, dBInteractor: DatabaseInteractor = None):
+        # buoys filled from latest_obs.txt only load their history once something needs it
+        if isinstance(self.dataFrameHistorical, pd.DataFrame):
+            return
+
+        if not useDB:
+            self.buildHistoricalDataFrame()
+            return
+
+        if dBInteractor is not None:
+            self.setHistoricalDFFromDB(dBInteractor)
+            return
+
+        dBInteractor = self.openDBInteractor()
+        try:
+            self.setHistoricalDFFromDB(dBInteractor)
+        finally:
+            dBInteractor.closeConnection()
+
     def calcWVHTPercentile(self, dataSetName: str) -> float:
         if self.recentWVHT == -1:
             print('setting recent swell readings...')
             self.setRecentReadings()
 
+        wvhtPercentile, nTotalValues = self.calcWVHTPercentiles(dataSetName, [self.recentWVHT])
+        sourceName = 'climatology' if dataSetName == 'historical' and self.climatology is not None else dataSetName
+        print(f'current swell of {self.recentWVHT: 0.2f} m is greater than {wvhtPercentile[0] :0.1f}% of {sourceName} data, ({nTotalValues} samples)')
+        return float(wvhtPercentile[0])
+
+    def getWVHTECDF(self, dataSetName: str) -> np.ndarray:
+        '''
+        The data set's wave heights sorted ascending, built on first use and kept until storeDataFrame replaces the frame.
+
+        The realtime ECDF leaves out the newest sample, which is the reading being ranked.
+        '''
+        if dataSetName in self.wvhtECDFs:
+            return self.wvhtECDFs[dataSetName]
+
         if dataSetName == 'historical':
-            waveheightsSorted = self.dataFrameHistorical['WVHT'].sort_values().to_numpy() # ascending
+            self.ensureHistoricalDataFrame()
+            waveheights = self.dataFrameHistorical['WVHT'].to_numpy()
         elif dataSetName == 'realtime':
-            waveheightsSorted = self.dataFrameRealtime['WVHT'][1:].sort_values().to_numpy() # ascending
+            waveheights = self.dataFrameRealtime['WVHT'].to_numpy()[1:]
         else:
             raise ValueError('historical and realtime are the only supported data sets')
 
-        nTotalValues = len(waveheightsSorted)
-        ptr = 0
-        while ptr < nTotalValues and self.recentWVHT > waveheightsSorted[ptr]:
-            ptr += 1
+        waveheightsSorted = np.sort(waveheights[~np.isnan(waveheights)])
+        self.wvhtECDFs[dataSetName] = waveheightsSorted
+        return waveheightsSorted
+
+    def calcWVHTPercentiles(self, dataSetName: str, wvhts) -> tuple:
+        '''
+        % of the data set's wave heights that are smaller than each of wvhts, e.g. every realtime sample against the historical data.
+
+        Each value is one binary search in the cached ECDF (or in the climatology months when the buoy has a climatology).
+        Missing wave heights rank at 0%. Returns (percentiles array, # of samples ranked against).
+        '''
+        wvhts = np.asarray(wvhts, dtype='float64')
+        if dataSetName == 'historical' and self.climatology is not None:
+            wvhtPercentiles, nTotalValues = calcWVHTPercentileOverMonths(self.climatology, self.getHistoricalMonths(self.nHistoricalMonths), wvhts)
+        else:
+            waveheightsSorted = self.getWVHTECDF(dataSetName)
+            nTotalValues = len(waveheightsSorted)
+            if nTotalValues == 0:
+                raise ValueError(f'Station {self.stationID} has no {dataSetName} wave heights to rank against')
+            wvhtPercentiles = np.searchsorted(waveheightsSorted, wvhts, side='left') / nTotalValues * 100
 
-        wvhtPercentile = ptr / nTotalValues * 100
-        print(f'current swell of {self.recentWVHT: 0.2f} m is greater than {wvhtPercentile :0.1f}% of {dataSetName} data, ({nTotalValues} samples)')
-        return wvhtPercentile
+        return np.where(np.isnan(wvhts), 0.0, wvhtPercentiles), nTotalValues
 
     def setWVHTPercentileHistorical(self):
         self.wvhtPercentileHistorical = self.calcWVHTPercentile('historical')
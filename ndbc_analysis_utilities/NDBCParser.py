@@ -0,0 +1,201 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+
+# NDBC text files have a header line of column names and (since 2007) a second line of units, followed by
+# whitespace separated rows. Missing realtime values are written as MM, while the historical
+# stdmet files use 99.00 / 999 style sentinels instead.
+MISSING_VALUE_MARKER = 'MM'
+HISTORICAL_WVHT_SENTINEL = 99.0
+# missing value of every stdmet column, all of them become NaN
+HISTORICAL_SENTINELS = {'WDIR': 999.0, 'WSPD': 99.0, 'GST': 99.0, 'WVHT': 99.0, 'DPD': 99.0, 'APD': 99.0, 'MWD': 999.0,
+                        'PRES': 9999.0, 'ATMP': 999.0, 'WTMP': 999.0, 'DEWP': 999.0, 'VIS': 99.0, 'TIDE': 99.0}
+YEAR_COLUMN_NAMES = ['#YY', 'YYYY', 'YY']
+STATION_COLUMN_NAMES = ['#STN', 'STN']
+DATE_COLUMNS = ['#YY', 'MM', 'DD', 'hh', 'mm']
+COMPASS_COLUMNS = ['SwD', 'WWD']
+STRING_COLUMNS = ['STN', 'STEEPNESS']
+COMPASS_POINTS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                  'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+COMPASS_DTYPE = pd.CategoricalDtype(COMPASS_POINTS)
+ALL_MONTHS = set(range(1, 13))
+WHITESPACE_BYTES = [ord(' '), ord('\t'), ord('\r'), ord('\n')]
+
+REALTIME_COLUMNS = ['WVHT', 'SwP', 'SwD']
+HISTORICAL_COLUMNS = ['WVHT', 'DPD', 'MWD']
+LATEST_OBS_COLUMNS = ['STN', 'LAT', 'LON', 'WVHT', 'DPD', 'MWD']
+
+
+def openSource(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+def normalizeColumnName(colName: str) -> str:
+    # older stdmet files label the year column differently, and latest_obs.txt starts with the station column
+    if colName in YEAR_COLUMN_NAMES:
+        return '#YY'
+    if colName in STATION_COLUMN_NAMES:
+        return 'STN'
+    return colName
+
+def readHeader(stream) -> tuple:
+    '''
+    Reads the column names and skips the units line.
+
+    Stdmet files before 2007 have no units line, so their second line is already a data row. It is handed back
+    together with the column names (b'' when there was a units line) so the caller can put it in front of the rest.
+    '''
+    header = [normalizeColumnName(colName) for colName in stream.readline().decode('ascii').split()]
+    secondLine = stream.readline()
+    if secondLine.lstrip().startswith(b'#'):
+        return header, b''
+    return header, secondLine
+
+def findMonthOffset(data: bytes) -> int:
+    # the month is the second token of every row, at the same byte offset since the columns are fixed width
+    firstRow = re.match(rb'[ \t]*\S+[ \t]+', data)
+    return firstRow.end() if firstRow is not None else None
+
+def filterRowsByMonth(data: bytes, monthsToCheck: list[int]) -> tuple:
+    '''
+    Keeps the data rows whose month is in monthsToCheck by looking at the month bytes of each row, nothing gets tokenized.
+
+    Returns the kept rows as a single buffer together with their row numbers in the file and the number of rows read,
+    or None when the rows are not laid out in fixed width columns and have to be filtered after parsing instead.
+    '''
+    if not data:
+        return b'', [], 0
+
+    fileBytes = np.frombuffer(data, dtype=np.uint8)
+    rowEnds = np.flatnonzero(fileBytes == ord('\n')) + 1
+    if len(rowEnds) == 0 or rowEnds[-1] != len(fileBytes):
+        rowEnds = np.append(rowEnds, len(fileBytes))
+    rowStarts = np.concatenate(([0], rowEnds[:-1]))
+    nRows = len(rowStarts)
+    monthOffset = findMonthOffset(data)
+    if monthOffset is None:
+        return None
+
+    # rows too short to hold a month (blank lines) are skipped, any other row has to have two digits at the month offset
+    fullRows = rowEnds - rowStarts > monthOffset + 2
+    monthStarts = rowStarts[fullRows] + monthOffset
+    tensDigits = fileBytes[monthStarts].astype(np.int64) - ord('0')
+    onesDigits = fileBytes[monthStarts + 1].astype(np.int64) - ord('0')
+    isDigits = (tensDigits >= 0) & (tensDigits <= 9) & (onesDigits >= 0) & (onesDigits <= 9)
+    isSeparated = np.isin(fileBytes[monthStarts - 1], WHITESPACE_BYTES) & np.isin(fileBytes[monthStarts + 2], WHITESPACE_BYTES)
+    if not (isDigits & isSeparated).all():
+        return None
+
+    rowNumbers = np.flatnonzero(fullRows)[np.isin(tensDigits * 10 + onesDigits, list(monthsToCheck))]
+    # the rows are in time order, so the kept rows come in a few runs that get sliced out whole
+    keptRows = np.zeros(nRows + 2, dtype=np.int8)
+    keptRows[rowNumbers + 1] = 1
+    runEdges = np.flatnonzero(np.diff(keptRows))
+    keptRuns = [data[rowStarts[firstRow]:rowEnds[lastRow - 1]] for firstRow, lastRow in zip(runEdges[::2], runEdges[1::2])]
+    return b''.join(keptRuns), rowNumbers, nRows
+
+def readNDBCTable(source, columns: list[str], monthsToCheck: list[int] = None, parseStats: dict = None) -> pd.DataFrame:
+    '''
+    Tokenizes an NDBC text file straight into typed columns.
+
+    source is the raw file contents or a binary stream positioned at the first header line.
+    Only the date columns and the requested columns are kept. Date parts come back as integers,
+    compass directions as categoricals over COMPASS_POINTS and everything else as float64.
+    MM turns into NaN (or a missing category) in every column.
+
+    When monthsToCheck is given, rows from other months are dropped before tokenizing (after
+    parsing for files without fixed width columns) and the kept rows are indexed by their row
+    number in the file. Asking for every month skips the filter.
+    parseStats, when given, gets the number of data rows in the file under nRows.
+    '''
+    stream = openSource(source)
+    header, firstRow = readHeader(stream)
+    if firstRow:
+        stream = io.BytesIO(firstRow + stream.read())
+    missingColumns = [c for c in columns if c not in header]
+    if missingColumns:
+        raise ValueError(f'NDBC file is missing columns {missingColumns}')
+
+    keptColumns = [c for c in DATE_COLUMNS if c in header] + columns
+    dtypes = dict()
+    for colName in keptColumns:
+        if colName in DATE_COLUMNS:
+            dtypes[colName] = 'int64'
+        elif colName in COMPASS_COLUMNS:
+            dtypes[colName] = COMPASS_DTYPE
+        elif colName in STRING_COLUMNS:
+            dtypes[colName] = 'object'
+        else:
+            dtypes[colName] = 'float64'
+
+    rowNumbers = None
+    filterAfterParsing = False
+    if monthsToCheck is not None and not ALL_MONTHS.issubset(monthsToCheck):
+        data = stream.read()
+        filteredRows = filterRowsByMonth(data, monthsToCheck)
+        if filteredRows is None:
+            filterAfterParsing = True
+            stream = io.BytesIO(data)
+        else:
+            rowBuffer, rowNumbers, nRows = filteredRows
+            if parseStats is not None:
+                parseStats['nRows'] = nRows
+            if len(rowNumbers) == 0:
+                return pd.DataFrame({colName: pd.Series(dtype=dtypes[colName]) for colName in keptColumns})
+            stream = io.BytesIO(rowBuffer)
+
+    buoyDF = pd.read_csv(stream, sep=r'\s+', header=None, names=header, usecols=keptColumns, dtype=dtypes,
+                         na_values=[MISSING_VALUE_MARKER], keep_default_na=False, engine='c')
+    if rowNumbers is not None:
+        buoyDF.index = rowNumbers
+    elif parseStats is not None:
+        parseStats['nRows'] = len(buoyDF)
+    if filterAfterParsing:
+        buoyDF = buoyDF[buoyDF['MM'].isin(list(monthsToCheck))]
+    return buoyDF
+
+def buildDates(buoyDF: pd.DataFrame) -> pd.Series:
+    years = buoyDF['#YY']
+    if years.max() < 100:
+        years = years + 1900   # two digit years only show up in pre-1999 files
+
+    minutes = buoyDF['mm'] if 'mm' in buoyDF.columns else 0
+    return pd.to_datetime(pd.DataFrame({'year': years, 'month': buoyDF['MM'], 'day': buoyDF['DD'], 'hour': buoyDF['hh'], 'minute': minutes}))
+
+def selectColumnsWithDate(buoyDF: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    selectedDF = buoyDF.loc[:, columns]
+    selectedDF.insert(0, 'Date', buildDates(buoyDF))
+    return selectedDF
+
+def parseRealtimeSpec(source, parseStats: dict = None) -> pd.DataFrame:
+    buoyDF = readNDBCTable(source, REALTIME_COLUMNS, parseStats=parseStats)
+    return selectColumnsWithDate(buoyDF, REALTIME_COLUMNS)
+
+def parseHistoricalStdmet(source, monthsToCheck: list[int], columns: list[str] = HISTORICAL_COLUMNS, parseStats: dict = None) -> pd.DataFrame:
+    '''
+    Parses a historical stdmet file keeping only the months in monthsToCheck and the given columns.
+
+    Rows without a wave height are dropped, the 99.00 / 999 sentinels of the other columns become NaN.
+    '''
+    if 'WVHT' not in columns:
+        raise ValueError('WVHT is needed to filter out rows without waveheight data')
+
+    # months are filtered before tokenizing, the waveheight sentinel only on the parsed columns
+    buoyDF = readNDBCTable(source, columns, monthsToCheck, parseStats)
+    buoyDF = selectColumnsWithDate(buoyDF[buoyDF['WVHT'] != HISTORICAL_WVHT_SENTINEL], columns)
+    for colName in columns:
+        if colName in HISTORICAL_SENTINELS:
+            buoyDF[colName] = buoyDF[colName].mask(buoyDF[colName] == HISTORICAL_SENTINELS[colName])
+    return buoyDF
+
+def parseLatestObs(source) -> pd.DataFrame:
+    '''
+    Parses latest_obs.txt, which holds the most recent observation of every active station.
+
+    Returns one row per station indexed by station ID.
+    '''
+    buoyDF = readNDBCTable(source, LATEST_OBS_COLUMNS)
+    latestDF = selectColumnsWithDate(buoyDF, LATEST_OBS_COLUMNS).set_index('STN')
+    return latestDF[~latestDF.index.duplicated()]
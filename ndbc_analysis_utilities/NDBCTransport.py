@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from .IngestMetrics import getSharedIngestMetrics
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+DEFAULT_TIMEOUT = (10, 60)   # (connect, read) in seconds
+
+
+class RequestRecord():
+    def __init__(self, url: str, statusCode: int, latency: float, nBytesWire: int, nBytesContent: int, attempt: int, label: str = None):
+        self.url = url
+        self.statusCode = statusCode   # None if the request never got a response
+        self.latency = latency   # seconds
+        self.nBytesWire = nBytesWire   # bytes pulled over the wire, before any gzip decoding
+        self.nBytesContent = nBytesContent   # bytes of decoded content
+        self.attempt = attempt
+        self.label = label
+
+
+class NDBCTransport():
+    '''
+    Shared HTTP layer for all NDBC traffic.
+
+    Keeps one keep-alive connection pool, asks for gzip transfer encoding, applies timeouts,
+    and retries connection errors and 429/5xx responses with exponential backoff and full jitter,
+    honoring the server's Retry-After header when it sends one. A 429/5xx left after the last retry raises an HTTPError.
+    Every attempt is recorded with its latency and byte counts in self.records and in the station's ingest metrics.
+    '''
+    def __init__(self, poolSize: int = 8, timeout: tuple = DEFAULT_TIMEOUT, maxRetries: int = 4, backoffBase: float = 1.0, backoffMax: float = 60.0):
+        self.timeout = timeout
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+        self.records = []
+        self.recordsLock = threading.Lock()
+        self.metrics = getSharedIngestMetrics()
+
+    def calcBackoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+
+    def getRetryAfter(self, response: requests.models.Response) -> float:
+        retryAfter = response.headers.get('Retry-After')
+        if retryAfter is None:
+            return None
+
+        try:
+            delay = float(retryAfter)
+        except ValueError:
+            try:
+                retryDate = parsedate_to_datetime(retryAfter)
+            except (TypeError, ValueError):
+                return None
+            delay = (retryDate - datetime.now(timezone.utc)).total_seconds()
+
+        return min(max(delay, 0.0), self.backoffMax)
+
+    @staticmethod
+    def getResponseSizes(response: requests.models.Response, stream: bool) -> tuple[int]:
+        if stream:
+            # the body has not been read yet, so the best we can do is the advertised length
+            return int(response.headers.get('Content-Length', 0)), 0
+        return response.raw.tell(), len(response.content)
+
+    def resetRecords(self):
+        # long running processes (the UpdateSwellDB.py daemon) start over every cycle so the records stay bounded
+        with self.recordsLock:
+            self.records = []
+
+    def recordRequest(self, record: RequestRecord):
+        with self.recordsLock:
+            self.records.append(record)
+        self.metrics.recordRequest(record.label, record.latency, record.nBytesWire)
+
+    def get(self, url: str, headers: dict = None, stream: bool = False, label: str = None) -> requests.models.Response:
+        for attempt in range(self.maxRetries + 1):
+            startTime = time.monotonic()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.recordRequest(RequestRecord(url, None, time.monotonic() - startTime, 0, 0, attempt, label))
+                if attempt == self.maxRetries:
+                    raise
+                delay = self.calcBackoff(attempt)
+                print(f'request to {url} failed ({e}), retrying in {delay:.1f}s...')
+                time.sleep(delay)
+                continue
+
+            nBytesWire, nBytesContent = self.getResponseSizes(response, stream)
+            self.recordRequest(RequestRecord(url, response.status_code, time.monotonic() - startTime, nBytesWire, nBytesContent, attempt, label))
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.maxRetries:
+                delay = self.getRetryAfter(response)
+                if delay is None:
+                    delay = self.calcBackoff(attempt)
+                print(f'request to {url} returned {response.status_code}, retrying in {delay:.1f}s...')
+                response.close()
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                # out of retries, callers must not parse the error page as data
+                response.raise_for_status()
+            return response
+
+    def getTotals(self) -> dict:
+        with self.recordsLock:
+            records = list(self.records)
+
+        latencies = [r.latency for r in records]
+        return {
+                'nRequests': len(records),
+                'nRetries': sum(1 for r in records if r.attempt > 0),
+                'nFailures': sum(1 for r in records if r.statusCode is None or r.statusCode >= 400),
+                'nBytesWire': sum(r.nBytesWire for r in records),
+                'nBytesContent': sum(r.nBytesContent for r in records),
+                'totalLatency': sum(latencies),
+                'maxLatency': max(latencies, default=0.0),
+                }
+
+    def printSummary(self):
+        totals = self.getTotals()
+        meanLatency = totals['totalLatency'] / totals['nRequests'] if totals['nRequests'] > 0 else 0.0
+        print(f"NDBC requests: {totals['nRequests']} ({totals['nRetries']} retries, {totals['nFailures']} failed attempts), "
+              f"{totals['nBytesWire'] / 1e6:.2f} MB over the wire ({totals['nBytesContent'] / 1e6:.2f} MB decoded), "
+              f"mean latency {meanLatency:.2f} s, max latency {totals['maxLatency']:.2f} s")
+
+
+sharedTransport = None
+sharedTransportLock = threading.Lock()
+
+def getSharedTransport() -> NDBCTransport:
+    global sharedTransport
+    with sharedTransportLock:
+        if sharedTransport is None:
+            sharedTransport = NDBCTransport()
+        return sharedTransport
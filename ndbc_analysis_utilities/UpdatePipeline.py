@@ -0,0 +1,299 @@
+import queue
+import threading
+import time
+import traceback
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from .FetchEngine import FetchEngine
+from .IngestMetrics import getSharedIngestMetrics
+from .IngestCheckpoint import IngestCheckpoint
+from .db_config.DatabaseInteractor import DatabaseInteractor
+
+DEFAULT_N_WRITERS = 1
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_COMMIT_BATCH_SIZE = 8
+
+
+class StageStats():
+    # counters of one pipeline stage, busySeconds adds up the time every worker of the stage spent on items
+    def __init__(self, name: str, nWorkers: int):
+        self.name = name
+        self.nWorkers = nWorkers
+        self.nItems = 0
+        self.nFailures = 0
+        self.nRows = 0
+        self.busySeconds = 0.0
+        self.waitSeconds = 0.0
+        self.statsLock = threading.Lock()
+
+    def addItem(self, nRows: int = 0, failed: bool = False):
+        with self.statsLock:
+            self.nItems += 1
+            self.nFailures += int(failed)
+            self.nRows += nRows
+
+    def addBusy(self, busySeconds: float):
+        with self.statsLock:
+            self.busySeconds += busySeconds
+
+    def addWait(self, waitSeconds: float):
+        with self.statsLock:
+            self.waitSeconds += waitSeconds
+
+    def printSummary(self, wallSeconds: float, waitLabel: str):
+        throughput = (self.nItems - self.nFailures) / wallSeconds if wallSeconds > 0 else 0.0
+        utilization = self.busySeconds / (wallSeconds * self.nWorkers) * 100 if wallSeconds > 0 else 0.0
+        print(f'  {self.name}: {self.nItems - self.nFailures} of {self.nItems} stations, {self.nRows} rows, {throughput:.2f} stations/s, '
+              f'{self.busySeconds:.1f} s busy over {self.nWorkers} workers ({utilization:.0f}%), {self.waitSeconds:.1f} s {waitLabel}')
+
+
+class UpdatePipeline():
+    '''
+    Fetches and writes station data sets for UpdateSwellDB.py with the network, parsing and database work overlapping.
+
+    The FetchEngine's worker threads download and parse one (dataSetName, stationID) job each and put the built buoy
+    into a bounded queue, so they block once the writers fall queueSize buoys behind. nWriters threads drain the queue,
+    each through its own DatabaseInteractor, and commit every commitBatchSize stations instead of after every station.
+    A station that fails to write is rolled back together with its batch, the rest of the batch is written again.
+    With deltaHistorical, historical jobs only fetch the files missing from the station's manifest and append them
+    (see NDBCBuoy.fetchHistoricalDelta), otherwise they re-download and rewrite all nYears.
+    Stations that fail in either stage end up in self.failures keyed by (dataSetName, stationID), and together with
+    the write times and rows written in the shared IngestMetrics.
+    With a checkpoint, every historical file a job fetches is checkpointed until its station commits. A delta station
+    whose files only partly failed still gets the fetched ones written, it lands in self.partialFailures and stays
+    due for an update so the next run requests just the missing files. A full rewrite with a failed year fails the
+    station instead (see NDBCBuoy.buildFullHistoricalDataFrame), its fetched years wait in the checkpoint.
+    '''
+    def __init__(self, fetchEngine: FetchEngine, nYears: int, nWriters: int = DEFAULT_N_WRITERS, queueSize: int = DEFAULT_QUEUE_SIZE,
+                 commitBatchSize: int = DEFAULT_COMMIT_BATCH_SIZE, archive: bool = False, deltaHistorical: bool = True,
+                 checkpoint: IngestCheckpoint = None):
+        if nWriters < 1 or queueSize < 1 or commitBatchSize < 1:
+            raise ValueError('nWriters, queueSize and commitBatchSize must be at least 1')
+
+        self.fetchEngine = fetchEngine
+        self.nYears = nYears
+        self.nWriters = nWriters
+        self.queueSize = queueSize
+        self.commitBatchSize = commitBatchSize
+        self.archive = archive   # also append the realtime samples to the realtime archive
+        self.deltaHistorical = deltaHistorical
+        self.checkpoint = checkpoint
+        self.historicalManifests = dict()
+        self.failures = dict()
+        self.partialFailures = dict()   # (dataSetName, stationID) -> (kind, period) of the historical files that failed
+        self.writtenBuoys = dict()   # (dataSetName, stationID) -> buoy for every committed job
+        self.archivedStations = []
+        self.fetchStats = StageStats('fetch', fetchEngine.nWorkers)
+        self.writeStats = StageStats('write', nWriters)
+        self.nCommits = 0
+        self.maxQueueDepth = 0
+        self.stateLock = threading.Lock()
+        self.metrics = getSharedIngestMetrics()
+
+    def recordFailure(self, job: tuple, stage: str, e: Exception):
+        print('-------')
+        print(f'EXCEPTION for {job[0]} data of station {job[1]}: {e}')
+        traceback.print_exc()
+        print('-------')
+        with self.stateLock:
+            self.failures[job] = e
+        self.metrics.recordFailure(job[1], stage, e)
+
+    def recordPartialFailure(self, job: tuple, buoy):
+        if not buoy.historicalFailures:
+            return
+        with self.stateLock:
+            self.partialFailures[job] = [(kind, period) for kind, period, _ in buoy.historicalFailures]
+        for _, _, e in buoy.historicalFailures:
+            if e is not None:
+                self.metrics.recordFailure(job[1], 'fetch', e)
+
+    def fetchJob(self, job: tuple):
+        dataSetName, stationID = job
+        if dataSetName == 'realtime':
+            buoy = self.fetchEngine.makeBuoy(stationID)
+            buoy.buildRealtimeDataFrame()
+        elif self.deltaHistorical:
+            buoy = self.fetchEngine.makeBuoy(stationID, nYearsBack=self.nYears, nHistoricalMonths=12)
+            buoy.ingestCheckpoint = self.checkpoint
+            buoy.historicalDelta = buoy.fetchHistoricalDelta(self.historicalManifests.get(stationID, set()))
+            self.recordPartialFailure(job, buoy)
+        else:
+            # every month is stored, the month filters of the analysis scripts run in the database (see queryHistoricalData)
+            buoy = self.fetchEngine.makeBuoy(stationID, nYearsBack=self.nYears, nHistoricalMonths=12)
+            buoy.ingestCheckpoint = self.checkpoint
+            buoy.buildFullHistoricalDataFrame()
+        return buoy
+
+    def countFetchedRows(self, job: tuple, buoy) -> int:
+        if job[0] == 'realtime':
+            return len(buoy.dataFrameRealtime)
+        if self.deltaHistorical:
+            return sum(len(pieceDF) for _, _, pieceDF in buoy.historicalDelta if pieceDF is not None)
+        return len(buoy.dataFrameHistorical)
+
+    def produce(self, job: tuple, jobQueue: queue.Queue):
+        startTime = time.perf_counter()
+        try:
+            buoy = self.fetchJob(job)
+        except Exception as e:
+            self.recordFailure(job, 'fetch', e)
+            buoy = None
+        self.fetchStats.addBusy(time.perf_counter() - startTime)
+        if buoy is None:
+            self.fetchStats.addItem(failed=True)
+            return
+        self.fetchStats.addItem(self.countFetchedRows(job, buoy))
+
+        startTime = time.perf_counter()
+        jobQueue.put((job, buoy))
+        self.fetchStats.addWait(time.perf_counter() - startTime)
+        with self.stateLock:
+            self.maxQueueDepth = max(self.maxQueueDepth, jobQueue.qsize())
+
+    def writeJob(self, dbInteractor: DatabaseInteractor, job: tuple, buoy) -> int:
+        startTime = time.perf_counter()
+        try:
+            return self.writeJobData(dbInteractor, job, buoy)
+        finally:
+            self.metrics.add(job[1], 'db_write_seconds', time.perf_counter() - startTime)
+
+    def writeJobData(self, dbInteractor: DatabaseInteractor, job: tuple, buoy) -> int:
+        dataSetName, stationID = job
+        if dataSetName == 'historical' and self.deltaHistorical:
+            startDate = datetime(date.today().year - self.nYears, 1, 1)
+            return dbInteractor.applyHistoricalDelta(stationID, buoy.historicalDelta, startDate, commit=False, markUpdated=not buoy.historicalFailures)
+        if dataSetName == 'historical':
+            dbInteractor.updateHistoricalDataEntry(stationID, buoy.dataFrameHistorical, commit=False)
+            return len(buoy.dataFrameHistorical)
+
+        nRowsAdded = dbInteractor.updateRealtimeDataEntry(stationID, buoy.dataFrameRealtime, commit=False)
+        if self.archive:
+            dbInteractor.archiveRealtimeSamples(stationID, buoy.dataFrameRealtime, commit=False)
+        return nRowsAdded
+
+    def writeBatch(self, dbInteractor: DatabaseInteractor, batch: list):
+        # batch holds (job, buoy, # of rows) of the writes since the last commit
+        dbInteractor.connection.commit()
+        with self.stateLock:
+            self.nCommits += 1
+            self.writtenBuoys.update({job: buoy for job, buoy, _ in batch})
+            if self.archive:
+                self.archivedStations += [job[1] for job, _, _ in batch if job[0] == 'realtime']
+        for job, _, nRows in batch:
+            self.writeStats.addItem(nRows)
+            self.metrics.add(job[1], 'rows_written', nRows)
+            if self.checkpoint is not None and job[0] == 'historical':
+                self.checkpoint.clearStation(job[1])
+        batch.clear()
+
+    def rewriteBatch(self, dbInteractor: DatabaseInteractor, batch: list):
+        # a failed write leaves the transaction unusable, so the stations written before it in this batch go again
+        pendingWrites = list(batch)
+        while True:
+            dbInteractor.connection.rollback()
+            batch.clear()
+            for job, buoy, _ in pendingWrites:
+                try:
+                    batch.append((job, buoy, self.writeJob(dbInteractor, job, buoy)))
+                except Exception as e:
+                    self.writeStats.addItem(failed=True)
+                    self.recordFailure(job, 'write', e)
+                    pendingWrites = [pendingWrite for pendingWrite in pendingWrites if pendingWrite[0] != job]
+                    break
+            else:
+                return
+
+    def writeFromQueue(self, jobQueue: queue.Queue, dbInteractor: DatabaseInteractor, batch: list):
+        while True:
+            startTime = time.perf_counter()
+            queueItem = jobQueue.get()
+            self.writeStats.addWait(time.perf_counter() - startTime)
+            if queueItem is None:
+                break
+
+            job, buoy = queueItem
+            startTime = time.perf_counter()
+            try:
+                batch.append((job, buoy, self.writeJob(dbInteractor, job, buoy)))
+            except Exception as e:
+                self.writeStats.addItem(failed=True)
+                self.recordFailure(job, 'write', e)
+                self.rewriteBatch(dbInteractor, batch)
+
+            if len(batch) >= self.commitBatchSize:
+                self.writeBatch(dbInteractor, batch)
+            self.writeStats.addBusy(time.perf_counter() - startTime)
+
+        if batch:
+            startTime = time.perf_counter()
+            self.writeBatch(dbInteractor, batch)
+            self.writeStats.addBusy(time.perf_counter() - startTime)
+
+    def consume(self, jobQueue: queue.Queue):
+        batch = []
+        dbInteractor = None
+        try:
+            dbInteractor = self.fetchEngine.openDBInteractor()
+            self.writeFromQueue(jobQueue, dbInteractor, batch)
+        except Exception as e:
+            # the connection is gone, so the uncommitted batch is lost and the rest of the queue gets drained
+            # without writing, otherwise the fetch workers would block on the full queue forever
+            print('-------')
+            print(f'EXCEPTION in database writer {threading.current_thread().name}: {e}')
+            traceback.print_exc()
+            print('-------')
+            lostJobs = [job for job, _, _ in batch]
+            queueItem = jobQueue.get()
+            while queueItem is not None:
+                lostJobs.append(queueItem[0])
+                queueItem = jobQueue.get()
+            with self.stateLock:
+                for job in lostJobs:
+                    self.failures[job] = e
+            for job in lostJobs:
+                self.metrics.recordFailure(job[1], 'write', e)
+        finally:
+            if dbInteractor is not None:
+                dbInteractor.closeConnection()
+
+    def run(self, jobs: list[tuple]):
+        '''
+        Fetches and writes every (dataSetName, stationID) job, dataSetName being realtime or historical.
+        '''
+        startTime = time.perf_counter()
+        historicalStations = [stationID for dataSetName, stationID in jobs if dataSetName == 'historical']
+        if self.deltaHistorical and historicalStations:
+            # one query for what every station already has, the fetch workers only request the rest
+            dbInteractor = self.fetchEngine.openDBInteractor()
+            try:
+                self.historicalManifests = dbInteractor.getHistoricalManifests(historicalStations)
+            finally:
+                dbInteractor.closeConnection()
+
+        jobQueue = queue.Queue(maxsize=self.queueSize)
+        writers = [threading.Thread(target=self.consume, args=(jobQueue,), name=f'db-writer-{i}') for i in range(self.nWriters)]
+        for writer in writers:
+            writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.fetchEngine.nWorkers) as executor:
+                list(executor.map(lambda job: self.produce(job, jobQueue), jobs))
+        finally:
+            for _ in writers:
+                jobQueue.put(None)
+            for writer in writers:
+                writer.join()
+
+        self.wallSeconds = time.perf_counter() - startTime
+
+    def printSummary(self):
+        print(f'Update pipeline finished in {self.wallSeconds:.1f} s')
+        self.fetchStats.printSummary(self.wallSeconds, 'blocked on the full queue')
+        self.writeStats.printSummary(self.wallSeconds, 'waiting for buoys')
+        print(f'  queue: max depth {self.maxQueueDepth} of {self.queueSize}, {self.nCommits} commits of up to {self.commitBatchSize} stations')
+        for (dataSetName, stationID) in self.failures:
+            print(f'Failed to update {dataSetName} data for station {stationID}!!!')
+        for (dataSetName, stationID), failedUnits in self.partialFailures.items():
+            if (dataSetName, stationID) not in self.failures:
+                print(f'Partly updated {dataSetName} data for station {stationID}, {len(failedUnits)} files will be retried: {failedUnits}')
@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import statistics
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from .FetchEngine import FetchEngine
+from .IngestMetrics import getSharedIngestMetrics
+from .IngestCheckpoint import IngestCheckpoint
+from .NDBCTransport import getSharedTransport
+from .UpdatePipeline import UpdatePipeline, DEFAULT_N_WRITERS
+from .db_config.DatabaseInteractor import DatabaseInteractor
+
+DEFAULT_SAMPLING_INTERVAL = timedelta(hours=1)
+MIN_SAMPLING_INTERVAL = timedelta(minutes=10)
+MAX_SAMPLING_INTERVAL = timedelta(hours=1)
+N_SAMPLING_INTERVAL_OBS = 12   # newest observations the sampling interval is estimated from
+PUBLISH_DELAY = timedelta(minutes=20)   # how long after an observation its row usually shows up in the realtime file
+UNCHANGED_BACKOFF_BASE = timedelta(minutes=5)
+UNCHANGED_BACKOFF_MAX = timedelta(hours=3)
+FAILURE_BACKOFF_BASE = timedelta(minutes=15)
+FAILURE_BACKOFF_MAX = timedelta(hours=24)
+
+
+def getUTCNow() -> datetime:
+    # NDBC observation times are UTC, so the scheduler plans in naive UTC datetimes
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def getStartOfNextMonth(now: datetime) -> datetime:
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1)
+    return datetime(now.year, now.month + 1, 1)
+
+def estimateSamplingInterval(obsTimes) -> timedelta:
+    # median gap between the observations, so an outage or a dropped sample does not skew it, clamped to a sane cadence
+    obsTimes = sorted(obsTimes)
+    gaps = [later - earlier for earlier, later in zip(obsTimes, obsTimes[1:]) if later > earlier]
+    if not gaps:
+        return DEFAULT_SAMPLING_INTERVAL
+    return min(max(statistics.median(gaps), MIN_SAMPLING_INTERVAL), MAX_SAMPLING_INTERVAL)
+
+def calcBackoff(nAttempts: int, base: timedelta, maxDelay: timedelta) -> timedelta:
+    return min(base * 2 ** (nAttempts - 1), maxDelay)
+
+
+class StationSchedule():
+    '''
+    When one station's realtime or historical data set gets polled next.
+
+    Realtime polls are planned one sampling interval (plus PUBLISH_DELAY) after the newest observation. A poll that
+    brings no newer observation backs off from UNCHANGED_BACKOFF_BASE, a failed one (e.g. a 404) from FAILURE_BACKOFF_BASE,
+    doubling each time. Historical data sets are polled once a month like isItTimeToUpdateHistoricalData.
+    '''
+    def __init__(self, dataSetName: str, stationID: str):
+        self.dataSetName = dataSetName
+        self.stationID = stationID
+        self.samplingInterval = DEFAULT_SAMPLING_INTERVAL
+        self.lastObsTime = None
+        self.nUnchanged = 0
+        self.nFailures = 0
+        self.nextPollTime = None
+
+    def planFromObservations(self, newestObsTime: datetime, samplingInterval: timedelta, earliestPollTime: datetime):
+        self.lastObsTime = newestObsTime
+        self.samplingInterval = samplingInterval
+        self.nextPollTime = max(newestObsTime + samplingInterval + PUBLISH_DELAY, earliestPollTime)
+
+    def planAfterNewData(self, newestObsTime: datetime, samplingInterval: timedelta, now: datetime):
+        self.nUnchanged = 0
+        self.nFailures = 0
+        if self.dataSetName == 'historical':
+            self.nextPollTime = getStartOfNextMonth(now)
+        else:
+            self.planFromObservations(newestObsTime, samplingInterval, now + UNCHANGED_BACKOFF_BASE)
+
+    def planAfterUnchanged(self, now: datetime):
+        self.nUnchanged += 1
+        self.nFailures = 0
+        self.nextPollTime = now + calcBackoff(self.nUnchanged, UNCHANGED_BACKOFF_BASE, UNCHANGED_BACKOFF_MAX)
+
+    def planAfterFailure(self, now: datetime):
+        self.nFailures += 1
+        self.nextPollTime = now + calcBackoff(self.nFailures, FAILURE_BACKOFF_BASE, FAILURE_BACKOFF_MAX)
+
+
+class UpdateScheduler():
+    '''
+    Daemon mode of UpdateSwellDB.py: keeps every station's data sets in a priority queue ordered by next poll time.
+
+    Each round takes the data sets that are due and runs them through one UpdatePipeline, then plans their next polls
+    from what came back (see StationSchedule). Between rounds it sleeps until the next poll is due or stop is called.
+    The process-wide NDBCTransport session and database pool stay warm for the daemon's whole lifetime.
+    Every round is one ingest metrics run, exported to promFile / metricsJSON when they are set, and the transport's
+    request records start over with every round. Realtime polls always send the conditional request, since a cached
+    response inside RealtimeCache's freshness window would otherwise stand in for polls the backoff planned earlier.
+    '''
+    def __init__(self, fetchEngine: FetchEngine, nYears: int, nWriters: int = DEFAULT_N_WRITERS, archiveRetentionMonths: int = None,
+                 deltaHistorical: bool = True, promFile: str = None, metricsJSON: str = None, checkpoint: IngestCheckpoint = None):
+        self.fetchEngine = fetchEngine
+        # the schedule decides when a station is polled, the realtime cache's freshness window must not answer in its place
+        self.fetchEngine.revalidateRealtime = True
+        self.nYears = nYears
+        self.nWriters = nWriters
+        self.archiveRetentionMonths = archiveRetentionMonths   # None skips the realtime archive
+        self.deltaHistorical = deltaHistorical
+        self.checkpoint = checkpoint
+        self.metrics = getSharedIngestMetrics()
+        self.promFile = promFile
+        self.metricsJSON = metricsJSON
+        self.pollQueue = []   # (next poll time, sequence #, StationSchedule), the sequence # breaks ties
+        self.sequence = itertools.count()
+        self.stopEvent = threading.Event()
+        self.nRounds = 0
+        self.nNewData = 0
+        self.nUnchanged = 0
+        self.nFailures = 0
+
+    def push(self, schedule: StationSchedule):
+        heapq.heappush(self.pollQueue, (schedule.nextPollTime, next(self.sequence), schedule))
+
+    def seed(self, stationIDs, dbInteractor: DatabaseInteractor, now: datetime = None):
+        # plans the first poll of every station in the database from its stored observations and last historical update
+        if now is None:
+            now = getUTCNow()
+        existingStations = dbInteractor.getExistingStations(stationIDs)
+        lastHistoricalUpdates = dbInteractor.getFreshnessForStations(existingStations, 'historical')
+        for stationID in stationIDs:
+            if stationID not in existingStations:
+                print(f'station {stationID} is not in the database, so it will not be scheduled')
+                continue
+
+            realtimeSchedule = StationSchedule('realtime', stationID)
+            obsTimes = dbInteractor.getNewestObservationTimes('realtime_samples', stationID, N_SAMPLING_INTERVAL_OBS)
+            if obsTimes:
+                realtimeSchedule.planFromObservations(max(obsTimes), estimateSamplingInterval(obsTimes), now)
+            else:
+                realtimeSchedule.nextPollTime = now
+            self.push(realtimeSchedule)
+
+            historicalSchedule = StationSchedule('historical', stationID)
+            if dbInteractor.isItTimeToUpdateHistoricalData(stationID, lastHistoricalUpdates[stationID]):
+                historicalSchedule.nextPollTime = now
+            else:
+                historicalSchedule.nextPollTime = getStartOfNextMonth(now)
+            self.push(historicalSchedule)
+
+    def popDueSchedules(self, now: datetime) -> list[StationSchedule]:
+        dueSchedules = []
+        while self.pollQueue and self.pollQueue[0][0] <= now:
+            dueSchedules.append(heapq.heappop(self.pollQueue)[2])
+        return dueSchedules
+
+    def planNextPoll(self, schedule: StationSchedule, buoy, now: datetime):
+        if buoy is None:
+            schedule.planAfterFailure(now)
+            self.nFailures += 1
+            return
+
+        if schedule.dataSetName == 'historical' and buoy.historicalFailures:
+            # the files that did arrive are stored, the missing ones get retried on the failure backoff
+            schedule.planAfterFailure(now)
+            self.nFailures += 1
+            return
+
+        if schedule.dataSetName == 'historical':
+            schedule.planAfterNewData(None, None, now)
+            self.nNewData += 1
+            return
+
+        obsTimes = buoy.dataFrameRealtime['Date'].dropna().nlargest(N_SAMPLING_INTERVAL_OBS).tolist()
+        if not obsTimes:
+            raise ValueError(f'Station {schedule.stationID} has no realtime observations to plan from')
+        newestObsTime = obsTimes[0].to_pydatetime()
+        if schedule.lastObsTime is not None and newestObsTime <= schedule.lastObsTime:
+            schedule.planAfterUnchanged(now)
+            self.nUnchanged += 1
+            return
+
+        schedule.planAfterNewData(newestObsTime, estimateSamplingInterval(obsTimes), now)
+        self.nNewData += 1
+
+    def runRound(self, dueSchedules: list[StationSchedule]):
+        self.metrics.reset()
+        getSharedTransport().resetRecords()
+        pipeline = UpdatePipeline(self.fetchEngine, self.nYears, nWriters=self.nWriters, archive=self.archiveRetentionMonths is not None,
+                                  deltaHistorical=self.deltaHistorical, checkpoint=self.checkpoint)
+        pipeline.run([(schedule.dataSetName, schedule.stationID) for schedule in dueSchedules])
+        pipeline.printSummary()
+
+        now = getUTCNow()
+        for schedule in dueSchedules:
+            try:
+                self.planNextPoll(schedule, pipeline.writtenBuoys.get((schedule.dataSetName, schedule.stationID)), now)
+            except Exception as e:
+                # one station's odd data must not stop the daemon or lose the other schedules of this round
+                print(f'EXCEPTION while planning the next {schedule.dataSetName} poll of station {schedule.stationID}: {e}')
+                traceback.print_exc()
+                schedule.planAfterFailure(now)
+                self.nFailures += 1
+            print(f'Next {schedule.dataSetName} poll of station {schedule.stationID} at {schedule.nextPollTime:%Y-%m-%d %H:%M} UTC')
+            self.push(schedule)
+
+        if self.archiveRetentionMonths is not None and pipeline.archivedStations:
+            dbInteractor = self.fetchEngine.openDBInteractor()
+            try:
+                for stationID in pipeline.archivedStations:
+                    dbInteractor.compactArchivePartitions(stationID)
+                    dbInteractor.applyArchiveRetention(stationID, self.archiveRetentionMonths)
+            finally:
+                dbInteractor.closeConnection()
+
+        self.metrics.printSummary()
+        self.metrics.export(self.promFile, self.metricsJSON)
+        getSharedTransport().printSummary()
+
+    def run(self, maxRounds: int = None):
+        # polls until stop is called (or after maxRounds rounds)
+        while not self.stopEvent.is_set() and self.pollQueue:
+            now = getUTCNow()
+            dueSchedules = self.popDueSchedules(now)
+            if not dueSchedules:
+                nextPollTime = self.pollQueue[0][0]
+                print(f'Sleeping until {nextPollTime:%Y-%m-%d %H:%M:%S} UTC')
+                self.stopEvent.wait((nextPollTime - now).total_seconds())
+                continue
+
+            print(f'Round {self.nRounds + 1}: polling {len(dueSchedules)} data sets')
+            self.runRound(dueSchedules)
+            self.nRounds += 1
+            if maxRounds is not None and self.nRounds >= maxRounds:
+                break
+
+    def stop(self):
+        self.stopEvent.set()
+
+    def printSummary(self):
+        print(f'Scheduler ran {self.nRounds} rounds: {self.nNewData} polls with new data, {self.nUnchanged} unchanged, {self.nFailures} failed')
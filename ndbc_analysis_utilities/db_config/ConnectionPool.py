@@ -0,0 +1,139 @@
+import importlib
+import threading
+import time
+import pymysql
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0   # seconds a connection may sit idle before it gets pinged
+
+
+def loadConfig():
+    # the config is only needed once we actually talk to MySQL, so it is imported on first use instead of at the top
+    try:
+        return importlib.import_module(f'{__package__}.config_local')
+    except ModuleNotFoundError as e:
+        if e.name != f'{__package__}.config_local':
+            raise
+        raise Exception('ndbc_analysis_utilities/db_config/config_local.py is missing, create it with the variables of '
+                        'sample_config.py (or set NDBC_DB_BACKEND=sqlite to use a local SQLite database instead)') from e
+
+def openConnection() -> pymysql.connections.Connection:
+    config = loadConfig()
+    return pymysql.connect(host=config.ENDPOINT,
+            port=config.PORT,
+            user=config.USERNAME,
+            password=config.PASSWORD,
+            database=config.DBNAME,
+            cursorclass=pymysql.cursors.Cursor,
+            ssl_ca=config.SSL_CA
+            )
+
+
+class ConnectionPool():
+    '''
+    Process-wide pool of MySQL connections, so the TLS handshake is paid once per connection instead of once per station.
+
+    acquire hands out an idle connection or opens a new one while fewer than poolSize are open, and blocks otherwise.
+    Connections that sat idle for longer than healthCheckInterval are pinged first and reconnected if the server dropped them.
+    release rolls back anything left uncommitted and puts the connection back, connections that fail either step are discarded.
+    A pymysql connection must only be used by one thread at a time, so each worker acquires its own.
+    '''
+    def __init__(self, poolSize: int = DEFAULT_POOL_SIZE, healthCheckInterval: float = DEFAULT_HEALTH_CHECK_INTERVAL, connectFn=openConnection):
+        if poolSize < 1:
+            raise ValueError('poolSize must be at least 1')
+
+        self.poolSize = poolSize
+        self.healthCheckInterval = healthCheckInterval
+        self.connectFn = connectFn
+        self.idleConnections = []   # (connection, time it was released)
+        self.nOpenConnections = 0
+        self.nConnectionsOpened = 0
+        self.nReconnects = 0
+        self.poolCondition = threading.Condition()
+
+    def checkHealth(self, connection, idleSince: float):
+        if time.monotonic() - idleSince < self.healthCheckInterval:
+            return
+
+        threadID = connection.thread_id()
+        connection.ping(reconnect=True)
+        if connection.thread_id() != threadID:
+            with self.poolCondition:
+                self.nReconnects += 1
+
+    def discardConnection(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        with self.poolCondition:
+            self.nOpenConnections -= 1
+            self.poolCondition.notify()
+
+    def acquire(self):
+        with self.poolCondition:
+            while not self.idleConnections and self.nOpenConnections >= self.poolSize:
+                self.poolCondition.wait()
+
+            if self.idleConnections:
+                connection, idleSince = self.idleConnections.pop()
+            else:
+                connection, idleSince = None, None
+                self.nOpenConnections += 1
+
+        if connection is None:
+            try:
+                connection = self.connectFn()
+            except Exception:
+                with self.poolCondition:
+                    self.nOpenConnections -= 1
+                    self.poolCondition.notify()
+                raise
+
+            with self.poolCondition:
+                self.nConnectionsOpened += 1
+            print(f'Opened database connection {self.nConnectionsOpened} ({self.nOpenConnections} of {self.poolSize} in the pool)')
+            return connection
+
+        try:
+            self.checkHealth(connection, idleSince)
+        except Exception as e:
+            print(f'Database connection failed its health check ({e}), opening a new one')
+            self.discardConnection(connection)
+            return self.acquire()
+        return connection
+
+    def release(self, connection):
+        try:
+            connection.rollback()
+        except Exception:
+            self.discardConnection(connection)
+            return
+
+        with self.poolCondition:
+            self.idleConnections.append((connection, time.monotonic()))
+            self.poolCondition.notify()
+
+    def closeAll(self):
+        with self.poolCondition:
+            idleConnections = self.idleConnections
+            self.idleConnections = []
+
+        for connection, _ in idleConnections:
+            self.discardConnection(connection)
+
+    def printSummary(self):
+        print(f'Database connections: {self.nConnectionsOpened} opened, {self.nReconnects} reconnects, '
+              f'{len(self.idleConnections)} idle of {self.nOpenConnections} open (pool size {self.poolSize})')
+
+
+sharedPool = None
+sharedPoolLock = threading.Lock()
+
+def getSharedPool() -> ConnectionPool:
+    global sharedPool
+    with sharedPoolLock:
+        if sharedPool is None:
+            sharedPool = ConnectionPool(getattr(loadConfig(), 'POOL_SIZE', DEFAULT_POOL_SIZE))
+        return sharedPool
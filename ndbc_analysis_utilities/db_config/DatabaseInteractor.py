@@ -1,34 +1,104 @@
 import pandas as pd
 import time
 from datetime import date, datetime, timedelta
-from . import config_local as config
-import pymysql
-import sys
-
-def convertDFToJSONStr(df):
-    return df.to_json(date_format='iso', orient='records')
-
-def convertJSONStrToDF(jsonStr):
-    return pd.read_json(jsonStr, orient='records', convert_dates=['Date'])
+from .FrameSerializer import FrameSerializer
+from .StorageBackend import StorageBackend, getSharedBackend
+from ..MonthlyClimatology import MonthlyClimatology, buildClimatology
+from ..IngestMetrics import getSharedIngestMetrics
+
+# data frame column -> column of the realtime_samples / historical_samples tables
+REALTIME_SAMPLE_COLUMNS = {'Date': 'obs_time', 'WVHT': 'wvht', 'SwP': 'period', 'SwD': 'direction'}
+HISTORICAL_SAMPLE_COLUMNS = {'Date': 'obs_time', 'WVHT': 'wvht', 'DPD': 'period', 'MWD': 'direction'}
+REALTIME_RETENTION = timedelta(days=45)   # the realtime .spec files cover the last 45 days
+DEFAULT_ARCHIVE_RETENTION_MONTHS = 36
+
+def convertDFToSampleRows(stationID: str, buoyDF: pd.DataFrame, columnMap: dict) -> list[tuple]:
+    # one row per observation, with python types and None for missing readings so the driver can escape them
+    buoyDF = buoyDF.drop_duplicates('Date')
+    columns = [pd.DatetimeIndex(buoyDF['Date']).to_pydatetime().tolist()]
+    for colName in list(columnMap)[1:]:
+        columns.append([None if value != value else value for value in buoyDF[colName].tolist()])
+    return [(stationID,) + row for row in zip(*columns)]
+
+def convertSampleRowsToDF(rows: tuple, columnMap: dict) -> pd.DataFrame:
+    sampleDF = pd.DataFrame(list(rows), columns=list(columnMap))
+    sampleDF['Date'] = pd.to_datetime(sampleDF['Date'])
+    for colName in list(columnMap)[1:]:
+        sampleDF[colName] = pd.to_numeric(sampleDF[colName]).astype('float64')
+    return sampleDF
+
+def splitSampleRowsByStation(rows: tuple, stationIDs: list[str], columnMap: dict) -> dict:
+    # rows start with the station ID, stations without any rows get an empty frame
+    sampleDF = convertSampleRowsToDF([row[1:] for row in rows], columnMap)
+    rowStationIDs = [row[0] for row in rows]
+    stationDFs = {stationID: stationDF.reset_index(drop=True) for stationID, stationDF in sampleDF.groupby(rowStationIDs, sort=False)}
+    return {stationID: stationDFs.get(stationID, sampleDF.iloc[:0].copy()) for stationID in stationIDs}
+
+def getPartitionMonth(obsTime: datetime) -> int:
+    # realtime_archive partitions are months written as YYYYMM
+    return obsTime.year * 100 + obsTime.month
+
+def shiftPartitionMonth(partitionMonth: int, nMonths: int) -> int:
+    monthIndex = (partitionMonth // 100) * 12 + partitionMonth % 100 - 1 + nMonths
+    return (monthIndex // 12) * 100 + monthIndex % 12 + 1
+
+def convertSwellDirToDegreesTrue(swellDirs: pd.Series) -> pd.Series:
+    # realtime swell directions start at S (see NDBCBuoy.buildSwellDirDict) while the historical MWD is in degrees true
+    return (swellDirs + 180) % 360
+
+def getHistoricalPieceRange(kind: str, period: int) -> tuple[datetime]:
+    # [start, end) of a ('year', YYYY) or ('month', YYYYMM) historical file
+    if kind == 'year':
+        return datetime(period, 1, 1), datetime(period + 1, 1, 1)
+    year, month = divmod(period, 100)
+    return datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+
+def buildPlaceholders(values: list) -> str:
+    return ', '.join(['%s'] * len(values))
+
+def buildHistoricalFilters(stationIDs: list[str], months: list[int] = None, startDate: datetime = None, endDate: datetime = None,
+                           minPeriod: float = None, minWvht: float = None) -> tuple:
+    '''
+    Builds the WHERE clause and its parameters for historical_samples queries.
+
+    months uses the stored obs_month column, the date range is [startDate, endDate) and the period / wave height minimums
+    are inclusive. Missing readings never pass a minimum, the same as the boolean masks in pandas.
+    '''
+    conditions = [f'station_id IN ({buildPlaceholders(stationIDs)})']
+    params = list(stationIDs)
+    if months is not None:
+        conditions.append(f'obs_month IN ({buildPlaceholders(months)})')
+        params.extend(months)
+    if startDate is not None:
+        conditions.append('obs_time >= %s')
+        params.append(startDate)
+    if endDate is not None:
+        conditions.append('obs_time < %s')
+        params.append(endDate)
+    if minPeriod is not None:
+        conditions.append('period >= %s')
+        params.append(minPeriod)
+    if minWvht is not None:
+        conditions.append('wvht >= %s')
+        params.append(minWvht)
+    return ' AND '.join(conditions), params
 
 class DatabaseInteractor():
-    #TODO: the config is just for the database so maybe find a way to localize the import instead of a global one at the top of this file
-    def __init__(self):
+    '''
+    Reads and writes station data through one connection borrowed from a StorageBackend (getSharedBackend by default),
+    either the pooled MySQL database or a local SQLite file.
+
+    closeConnection hands the connection back to the backend, so creating an interactor per station or per thread is cheap.
+    '''
+    def __init__(self, serializer: FrameSerializer = None, backend: StorageBackend = None):
+        self.serializer = serializer if serializer is not None else FrameSerializer()   # format of the frame_cache blobs
+        self.backend = backend if backend is not None else getSharedBackend()
+        self.metrics = getSharedIngestMetrics()
         self.establishConnection()
-        #self.successfulConnection
 
     def establishConnection(self):
         try:
-            self.connection = pymysql.connect(host=config.ENDPOINT,
-                    port=config.PORT,
-                    user=config.USERNAME,
-                    password=config.PASSWORD,
-                    database=config.DBNAME,
-                    cursorclass=pymysql.cursors.Cursor,
-                    ssl_ca=config.SSL_CA
-                    )
-
-            print('Successful RDS connection!')
+            self.connection = self.backend.acquire()
             self.successfulConnection = True
 
         except Exception as e:
@@ -50,15 +120,27 @@ class DatabaseInteractor():
         else:
             return False
 
+    def getExistingStations(self, stationIDs: list[str]) -> set:
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return set()
+
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT id FROM stations WHERE id IN ({buildPlaceholders(stationIDs)})', stationIDs)
+        existingStations = {row[0] for row in thisCursor.fetchall()}
+        thisCursor.close()
+        return existingStations
+
     def addBuoyToStationsTable(self, stationID: str, stationLatLon: tuple):
         thisCursor = self.connection.cursor()
-        thisCursor.execute('INSERT INTO stations (id, location) VALUES (%s, POINT(%s, %s))', (stationID, stationLatLon[0], stationLatLon[1]))
+        locationColumns, locationValues = self.backend.getStationLocationInsertSql()
+        thisCursor.execute(f'INSERT INTO stations (id, {locationColumns}) VALUES (%s, {locationValues})', (stationID, stationLatLon[0], stationLatLon[1]))
         thisCursor.close()
         self.connection.commit()
 
     def getAllDataFromStationsTable(self):
         thisCursor = self.connection.cursor()
-        thisCursor.execute('SELECT id, ST_X(location) as latitude, ST_Y(location) as longitude FROM stations')
+        thisCursor.execute(f'SELECT id, {self.backend.getStationLocationSelectSql()} FROM stations')
         allRows = thisCursor.fetchall()
         thisCursor.close()
         return allRows
@@ -67,112 +149,307 @@ class DatabaseInteractor():
         allRows = self.getAllDataFromStationsTable()
         print(f'stations table = {allRows}')
 
-    def removeRealtimeSamplesForStation(self, stationID):
+    def removeSamplesForStation(self, tableName: str, stationID: str):
         thisCursor = self.connection.cursor()
-        thisCursor.execute('DELETE FROM realtime_data WHERE station_id = %s', (stationID,))
+        thisCursor.execute(f'DELETE FROM {tableName} WHERE station_id = %s', (stationID,))
         thisCursor.close()
 
-    def addRealtimeSamplesForStation(self, stationID, buoyRealtimeDataframe):
+    def addSamplesForStation(self, tableName: str, stationID: str, buoyDF: pd.DataFrame, columnMap: dict):
+        sampleRows = convertDFToSampleRows(stationID, buoyDF, columnMap)
+        print(f'Writing {len(sampleRows)} samples for station {stationID} to {tableName}')
+
+        # executemany batches these into multi-row inserts
+        sqlCmd = f'INSERT INTO {tableName} (station_id, obs_time, wvht, period, direction) VALUES (%s, %s, %s, %s, %s)'
         thisCursor = self.connection.cursor()
+        thisCursor.executemany(sqlCmd, sampleRows)
+        thisCursor.close()
 
-        print(f'buoyDF = {buoyRealtimeDataframe}')
-        # convert data frame to JSON string
-        dfJSONStr = convertDFToJSONStr(buoyRealtimeDataframe)
-        print(f'Size of json string = {sys.getsizeof(dfJSONStr)}')
+    def upsertSamplesForStation(self, tableName: str, stationID: str, buoyDF: pd.DataFrame, columnMap: dict) -> int:
+        sampleRows = convertDFToSampleRows(stationID, buoyDF, columnMap)
+        if not sampleRows:
+            return 0
 
-        # write station id and JSON string to v2 table
-        sqlCmd = 'INSERT INTO realtime_data (station_id, data) VALUES (%s, %s)'
-        thisCursor.execute(sqlCmd, (stationID, dfJSONStr))
+        upsertSuffix = self.backend.buildUpsertSuffix(['station_id', 'obs_time'], ['wvht', 'period', 'direction'])
+        sqlCmd = f'INSERT INTO {tableName} (station_id, obs_time, wvht, period, direction) VALUES (%s, %s, %s, %s, %s) {upsertSuffix}'
+        thisCursor = self.connection.cursor()
+        thisCursor.executemany(sqlCmd, sampleRows)
+        thisCursor.close()
+        return len(sampleRows)
 
+    def getNewestObservationTime(self, tableName: str, stationID: str) -> datetime:
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT MAX(obs_time) FROM {tableName} WHERE station_id = %s', (stationID,))
+        newestObsTime = thisCursor.fetchone()[0]
         thisCursor.close()
+        return newestObsTime
 
-    def updateRealtimeDataEntry(self, stationID, buoyRTDF):
-        print(f'Removing realtime data for station {stationID}')
-        startTime = time.time()
-        self.removeRealtimeSamplesForStation(stationID)
-        print(f'Removing realtime data took {time.time() - startTime} s')
+    def getNewestObservationTimes(self, tableName: str, stationID: str, nTimes: int) -> list[datetime]:
+        # newest first, walks the (station_id, obs_time) primary key backwards
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT obs_time FROM {tableName} WHERE station_id = %s ORDER BY obs_time DESC LIMIT %s', (stationID, nTimes))
+        obsTimes = [pd.Timestamp(row[0]).to_pydatetime() for row in thisCursor.fetchall()]
+        thisCursor.close()
+        return obsTimes
 
-        print(f'Adding realtime data for station {stationID}')
-        startTime = time.time()
-        self.addRealtimeSamplesForStation(stationID, buoyRTDF)
-        print(f'Adding realtime data took {time.time() - startTime} s')
-        
-        self.connection.commit()
-        print(f'Updated realtime data for station {stationID}')
+    def trimSamplesForStation(self, tableName: str, stationID: str, cutoffTime: datetime) -> int:
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'DELETE FROM {tableName} WHERE station_id = %s AND obs_time < %s', (stationID, cutoffTime))
+        nRowsTrimmed = thisCursor.rowcount
+        thisCursor.close()
+        return nRowsTrimmed
 
-    def removeHistoricalSamplesForStation(self, stationID):
+    def getSamplesForStation(self, tableName: str, stationID: str, columnMap: dict, newestFirst: bool) -> pd.DataFrame:
+        sortOrder = 'DESC' if newestFirst else 'ASC'
+        sqlCmd = f'SELECT obs_time, wvht, period, direction FROM {tableName} WHERE station_id = %s ORDER BY obs_time {sortOrder}'
         thisCursor = self.connection.cursor()
-        thisCursor.execute('DELETE FROM historical_data WHERE station_id = %s', (stationID,))
+        thisCursor.execute(sqlCmd, (stationID,))
+        sampleRows = thisCursor.fetchall()
         thisCursor.close()
+        return convertSampleRowsToDF(sampleRows, columnMap)
 
-    def addHistoricalSamplesForStation(self, stationID, buoyDF):
+    def getSamplesForStations(self, tableName: str, stationIDs: list[str], columnMap: dict, newestFirst: bool) -> dict:
+        '''
+        Loads the samples of every station in stationIDs with a single query.
+
+        Returns a dict of station ID -> data frame, ordered the same way as getSamplesForStation.
+        '''
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return dict()
+
+        sortOrder = 'DESC' if newestFirst else 'ASC'
+        sqlCmd = f'''SELECT station_id, obs_time, wvht, period, direction FROM {tableName}
+                     WHERE station_id IN ({buildPlaceholders(stationIDs)}) ORDER BY station_id, obs_time {sortOrder}'''
         thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, stationIDs)
+        sampleRows = thisCursor.fetchall()
+        thisCursor.close()
+        return splitSampleRowsByStation(sampleRows, stationIDs, columnMap)
+
+    def serializeFrame(self, stationID: str, buoyDF: pd.DataFrame) -> bytes:
+        startTime = time.perf_counter()
+        frameBlob = self.serializer.serialize(buoyDF.reset_index(drop=True))
+        self.metrics.add(stationID, 'serialize_seconds', time.perf_counter() - startTime)
+        return frameBlob
+
+    def writeFrameBlob(self, stationID: str, dataSetName: str, buoyDF: pd.DataFrame):
+        frameBlob = self.serializeFrame(stationID, buoyDF)
+        print(f'Writing {len(frameBlob) / 1e6:.2f} MB {self.serializer.frameFormat} frame blob for station {stationID}')
+        sqlCmd = f'''INSERT INTO frame_cache (station_id, data_set, data) VALUES (%s, %s, %s)
+                     {self.backend.buildUpsertSuffix(['station_id', 'data_set'], ['data'], ['created_at'])}'''
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, (stationID, dataSetName, frameBlob))
+        thisCursor.close()
 
-        print(f'buoyDF = {buoyDF}')
-        # convert data frame to JSON string
-        dfJSONStr = convertDFToJSONStr(buoyDF)
-        print(f'Size of json string = {sys.getsizeof(dfJSONStr)}')
+    def readFrameBlob(self, stationID: str, dataSetName: str) -> pd.DataFrame:
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('SELECT data FROM frame_cache WHERE station_id = %s AND data_set = %s', (stationID, dataSetName))
+        frameRow = thisCursor.fetchone()
+        thisCursor.close()
+        if frameRow is None:
+            return None
+        return self.serializer.deserialize(frameRow[0])
+
+    def readFrameBlobs(self, stationIDs: list[str], dataSetName: str) -> dict:
+        # only the stations that have a cached frame show up in the returned dict
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return dict()
+
+        sqlCmd = f'SELECT station_id, data FROM frame_cache WHERE data_set = %s AND station_id IN ({buildPlaceholders(stationIDs)})'
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, [dataSetName] + stationIDs)
+        frameRows = thisCursor.fetchall()
+        thisCursor.close()
+        return {stationID: self.serializer.deserialize(frameBlob) for stationID, frameBlob in frameRows}
 
-        # write station id and JSON string to v2 table
-        sqlCmd = 'INSERT INTO historical_data (station_id, data) VALUES (%s, %s)'
-        thisCursor.execute(sqlCmd, (stationID, dfJSONStr))
+    def removeFrameCacheForStation(self, stationID: str):
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM frame_cache WHERE station_id = %s', (stationID,))
+        thisCursor.close()
 
+    def markDataSetUpdated(self, stationID: str, dataSetName: str):
+        upsertSuffix = self.backend.buildUpsertSuffix(['station_id', 'data_set'], [], ['updated_at'])
+        sqlCmd = f'INSERT INTO data_updates (station_id, data_set) VALUES (%s, %s) {upsertSuffix}'
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, (stationID, dataSetName))
         thisCursor.close()
 
-    def updateHistoricalDataEntry(self, stationID, buoyDF):
-        print(f'Removing historical data for station {stationID}')
+    def removeDataUpdatesForStation(self, stationID: str):
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM data_updates WHERE station_id = %s', (stationID,))
+        thisCursor.close()
+
+    def removeRealtimeSamplesForStation(self, stationID):
+        self.removeSamplesForStation('realtime_samples', stationID)
+
+    def addRealtimeSamplesForStation(self, stationID, buoyRealtimeDataframe):
+        self.addSamplesForStation('realtime_samples', stationID, buoyRealtimeDataframe, REALTIME_SAMPLE_COLUMNS)
+
+    def updateRealtimeDataEntry(self, stationID, buoyRTDF, commit: bool = True) -> int:
+        '''
+        Appends the observations newer than the newest stored one and trims the ones older than REALTIME_RETENTION.
+
+        Everything happens in one transaction, so readers see either the old or the new samples but never a missing station.
+        With commit=False the caller commits, e.g. several stations at once (see UpdatePipeline). Returns the number of rows added.
+        '''
         startTime = time.time()
+        newestObsTime = self.getNewestObservationTime('realtime_samples', stationID)
+        newDF = buoyRTDF if newestObsTime is None else buoyRTDF[buoyRTDF['Date'] > pd.Timestamp(newestObsTime)]
+        nRowsAdded = self.upsertSamplesForStation('realtime_samples', stationID, newDF, REALTIME_SAMPLE_COLUMNS)
+
+        nRowsTrimmed = 0
+        if len(buoyRTDF) > 0:
+            cutoffTime = (buoyRTDF['Date'].max() - REALTIME_RETENTION).to_pydatetime()
+            nRowsTrimmed = self.trimSamplesForStation('realtime_samples', stationID, cutoffTime)
+
+        self.markDataSetUpdated(stationID, 'realtime')
+        if commit:
+            self.connection.commit()
+        print(f'Updated realtime data for station {stationID}: {nRowsAdded} rows added, {nRowsTrimmed} rows trimmed '
+              f'in {time.time() - startTime:.3f} s (newest stored observation was {newestObsTime})')
+        return nRowsAdded
+
+    def removeHistoricalSamplesForStation(self, stationID):
+        self.removeSamplesForStation('historical_samples', stationID)
+
+    def addHistoricalSamplesForStation(self, stationID, buoyDF):
+        self.addSamplesForStation('historical_samples', stationID, buoyDF, HISTORICAL_SAMPLE_COLUMNS)
+
+    def updateHistoricalDataEntry(self, stationID, buoyDF, commit: bool = True):
+        # UpdatePipeline times the whole write into the ingest metrics (db_write_seconds)
         self.removeHistoricalSamplesForStation(stationID)
-        print(f'Removing historical data took {time.time() - startTime} s')
+        self.addHistoricalSamplesForStation(stationID, buoyDF)
+        self.writeFrameBlob(stationID, 'historical', buoyDF)
+        self.writeClimatology(stationID, buildClimatology(buoyDF))
+        # the full rewrite stores whole years, so later delta updates (applyHistoricalDelta) only need the newer files
+        self.removeHistoricalManifestForStation(stationID)
+        for year, nSamples in buoyDF['Date'].dt.year.value_counts().items():
+            self.addToHistoricalManifest(stationID, 'year', int(year), int(nSamples))
+
+        self.markDataSetUpdated(stationID, 'historical')
+        if commit:
+            self.connection.commit()
+        print(f'Updated historical data for station {stationID}: {len(buoyDF)} rows')
+
+    def getHistoricalManifests(self, stationIDs: list[str]) -> dict:
+        # stationID -> {(kind, period)} of the historical files already stored, see NDBCBuoy.fetchHistoricalDelta
+        stationIDs = list(stationIDs)
+        manifests = {stationID: set() for stationID in stationIDs}
+        if not stationIDs:
+            return manifests
+
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT station_id, file_kind, period FROM historical_manifest WHERE station_id IN ({buildPlaceholders(stationIDs)})', stationIDs)
+        for stationID, kind, period in thisCursor.fetchall():
+            manifests[stationID].add((kind, period))
+        thisCursor.close()
+        return manifests
+
+    def addToHistoricalManifest(self, stationID: str, kind: str, period: int, nSamples: int):
+        upsertSuffix = self.backend.buildUpsertSuffix(['station_id', 'file_kind', 'period'], ['n_samples'], ['fetched_at'])
+        sqlCmd = f'INSERT INTO historical_manifest (station_id, file_kind, period, n_samples) VALUES (%s, %s, %s, %s) {upsertSuffix}'
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, (stationID, kind, period, nSamples))
+        thisCursor.close()
+
+    def applyHistoricalDelta(self, stationID: str, pieces: list[tuple], startDate: datetime, commit: bool = True, markUpdated: bool = True) -> int:
+        '''
+        Stores the (kind, period, data frame) pieces of NDBCBuoy.fetchHistoricalDelta in place of whatever covered their time ranges.
 
-        print(f'Adding historical data for station {stationID}')
+        A yearly file replaces the monthly files of its year, both in the samples and in the manifest. Samples and manifest
+        entries from before startDate are dropped, then the frame blob and the climatology are rebuilt from the stored samples.
+        Without markUpdated the data set stays due for an update, so files that failed to fetch get requested by the next run.
+        Returns the number of rows added.
+        '''
         startTime = time.time()
-        self.addHistoricalSamplesForStation(stationID, buoyDF)
-        print(f'Adding historical data took {time.time() - startTime} s')
-        
-        self.connection.commit()
-        print(f'Updated historical data for station {stationID}')
+        nRowsAdded = 0
+        thisCursor = self.connection.cursor()
+        for kind, period, pieceDF in pieces:
+            if pieceDF is not None:
+                rangeStart, rangeEnd = getHistoricalPieceRange(kind, period)
+                thisCursor.execute('DELETE FROM historical_samples WHERE station_id = %s AND obs_time >= %s AND obs_time < %s',
+                                   (stationID, rangeStart, rangeEnd))
+                nRowsAdded += self.upsertSamplesForStation('historical_samples', stationID, pieceDF, HISTORICAL_SAMPLE_COLUMNS)
+            if kind == 'year':
+                thisCursor.execute('DELETE FROM historical_manifest WHERE station_id = %s AND file_kind = %s AND period >= %s AND period < %s',
+                                   (stationID, 'month', period * 100, (period + 1) * 100))
+            self.addToHistoricalManifest(stationID, kind, period, 0 if pieceDF is None else len(pieceDF))
+
+        thisCursor.execute('DELETE FROM historical_samples WHERE station_id = %s AND obs_time < %s', (stationID, startDate))
+        nRowsTrimmed = thisCursor.rowcount
+        thisCursor.execute('''DELETE FROM historical_manifest WHERE station_id = %s
+                              AND ((file_kind = %s AND period < %s) OR (file_kind = %s AND period < %s))''',
+                           (stationID, 'year', startDate.year, 'month', startDate.year * 100 + startDate.month))
+        thisCursor.close()
+
+        if pieces or nRowsTrimmed > 0:
+            historicalDF = self.queryHistoricalData([stationID])[stationID]
+            self.writeFrameBlob(stationID, 'historical', historicalDF)
+            self.writeClimatology(stationID, buildClimatology(historicalDF))
+        if markUpdated:
+            self.markDataSetUpdated(stationID, 'historical')
+        if commit:
+            self.connection.commit()
+        print(f'Applied {len(pieces)} historical files for station {stationID}: {nRowsAdded} rows added, {nRowsTrimmed} rows trimmed in {time.time() - startTime:.3f} s')
+        return nRowsAdded
+
+    def removeHistoricalManifestForStation(self, stationID: str):
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM historical_manifest WHERE station_id = %s', (stationID,))
+        thisCursor.close()
 
     def getStationLocation(self, stationID: str) -> tuple[float]:
         thisCursor = self.connection.cursor()
-        sqlCmd = 'SELECT ST_X(location) as latitude, ST_Y(location) as longitude FROM stations WHERE id = %s'
+        sqlCmd = f'SELECT {self.backend.getStationLocationSelectSql()} FROM stations WHERE id = %s'
         thisCursor.execute(sqlCmd, (stationID,))
         stationLoc = thisCursor.fetchone()
         thisCursor.close()
         return stationLoc
 
     def getRealtimeData(self, stationID):
+        # newest first, like the realtime files on the NDBC webpage
+        return self.getSamplesForStation('realtime_samples', stationID, REALTIME_SAMPLE_COLUMNS, newestFirst=True)
+
+    def getRealtimeDataForStations(self, stationIDs: list[str]) -> dict:
+        return self.getSamplesForStations('realtime_samples', stationIDs, REALTIME_SAMPLE_COLUMNS, newestFirst=True)
+
+    def getFreshnessForStations(self, stationIDs: list[str], dataSetName: str) -> dict:
+        '''
+        Returns a dict of station ID -> last update timestamp of dataSetName, None for stations that were never updated.
+        '''
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return dict()
+
+        sqlCmd = f'SELECT station_id, updated_at FROM data_updates WHERE data_set = %s AND station_id IN ({buildPlaceholders(stationIDs)})'
         thisCursor = self.connection.cursor()
-        sqlCmd = 'SELECT data FROM realtime_data WHERE station_id = %s'
-        thisCursor.execute(sqlCmd, (stationID,))
-        realtimeJSONStr = thisCursor.fetchone()[0]
+        thisCursor.execute(sqlCmd, [dataSetName] + stationIDs)
+        timestamps = dict(thisCursor.fetchall())
         thisCursor.close()
+        return {stationID: timestamps.get(stationID) for stationID in stationIDs}
 
-        #print(f'realtime data JSON str for station {stationID}:')
-        #print(realtimeJSONStr)
-        realtimeDF = convertJSONStrToDF(realtimeJSONStr)
-        return realtimeDF
-
-    def getLastTableUpdateTimestamp(self, tableName: str, stationID: str):
+    def getLastTableUpdateTimestamp(self, dataSetName: str, stationID: str):
         thisCursor = self.connection.cursor()
-        sqlCmd = f'SELECT created_at FROM {tableName} WHERE station_id = %s'
-        thisCursor.execute(sqlCmd, (stationID,))
+        sqlCmd = 'SELECT updated_at FROM data_updates WHERE station_id = %s AND data_set = %s'
+        thisCursor.execute(sqlCmd, (stationID, dataSetName))
 
         timestamps = thisCursor.fetchone()
         thisCursor.close()
         if timestamps is None:
-            print(f'No {tableName} entry for station {stationID}')
+            print(f'No {dataSetName} data update for station {stationID}')
             return None 
 
         timestamp = timestamps[0]
-        print(f'last {tableName} update for station {stationID} at {timestamp}')
+        print(f'last {dataSetName} data update for station {stationID} at {timestamp}')
         return timestamp
 
-    def isItTimeToUpdateRealtimeData(self, stationID: str) -> bool:
+    def isItTimeToUpdateRealtimeData(self, stationID: str, lastUpdateTimeStamp: datetime = None) -> bool:
         updatePeriodInHours = 1
         updatePeriod = timedelta(hours=updatePeriodInHours)
 
-        lastUpdateTimeStamp = self.getLastTableUpdateTimestamp('realtime_data', stationID)
+        if lastUpdateTimeStamp is None:
+            lastUpdateTimeStamp = self.getLastTableUpdateTimestamp('realtime', stationID)
         if lastUpdateTimeStamp is None:
             return True
         currentTimestamp = datetime.now()
@@ -184,8 +461,9 @@ class DatabaseInteractor():
         else:
             return False
 
-    def isItTimeToUpdateHistoricalData(self, stationID: str) -> bool:
-        lastUpdateTimeStamp = self.getLastTableUpdateTimestamp('historical_data', stationID)
+    def isItTimeToUpdateHistoricalData(self, stationID: str, lastUpdateTimeStamp: datetime = None) -> bool:
+        if lastUpdateTimeStamp is None:
+            lastUpdateTimeStamp = self.getLastTableUpdateTimestamp('historical', stationID)
         if lastUpdateTimeStamp is None:
             return True
 
@@ -199,14 +477,256 @@ class DatabaseInteractor():
             return False
 
     def getHistoricalData(self, stationID):
+        # the whole frame is cached as a single blob, which loads much faster than the individual samples
+        historicalDF = self.readFrameBlob(stationID, 'historical')
+        if historicalDF is not None:
+            return historicalDF
+
+        historicalDF = self.getSamplesForStation('historical_samples', stationID, HISTORICAL_SAMPLE_COLUMNS, newestFirst=False)
+        return historicalDF
+
+    def getHistoricalDataForStations(self, stationIDs: list[str]) -> dict:
+        # cached frames in one query, then the samples of the stations without one in a second query
+        stationIDs = list(stationIDs)
+        historicalDFs = self.readFrameBlobs(stationIDs, 'historical')
+        uncachedStationIDs = [stationID for stationID in stationIDs if stationID not in historicalDFs]
+        sampleDFs = self.getSamplesForStations('historical_samples', uncachedStationIDs, HISTORICAL_SAMPLE_COLUMNS, newestFirst=False)
+        historicalDFs.update(sampleDFs)
+        return {stationID: historicalDFs[stationID] for stationID in stationIDs}
+
+    def queryHistoricalData(self, stationIDs: list[str], months: list[int] = None, startDate: datetime = None, endDate: datetime = None,
+                            minPeriod: float = None, minWvht: float = None, columns: list[str] = None) -> dict:
+        '''
+        Loads historical samples with the filters applied by the database, so only the matching rows cross the wire.
+
+        See buildHistoricalFilters for the filters. columns picks the data frame columns to load out of WVHT, DPD and MWD
+        (all of them by default), Date is always included. Returns a dict of station ID -> data frame in time order.
+        '''
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return dict()
+
+        if columns is None:
+            columns = list(HISTORICAL_SAMPLE_COLUMNS)[1:]
+        unknownColumns = [colName for colName in columns if colName not in HISTORICAL_SAMPLE_COLUMNS]
+        if unknownColumns:
+            raise ValueError(f'Unknown historical columns {unknownColumns}, use a subset of {list(HISTORICAL_SAMPLE_COLUMNS)[1:]}')
+        columnMap = {colName: HISTORICAL_SAMPLE_COLUMNS[colName] for colName in ['Date'] + [c for c in columns if c != 'Date']}
+
+        whereClause, params = buildHistoricalFilters(stationIDs, months, startDate, endDate, minPeriod, minWvht)
+        sqlCmd = f'''SELECT station_id, {', '.join(columnMap.values())} FROM historical_samples
+                     WHERE {whereClause} ORDER BY station_id, obs_time ASC'''
         thisCursor = self.connection.cursor()
-        sqlCmd = 'SELECT data FROM historical_data WHERE station_id = %s'
-        thisCursor.execute(sqlCmd, (stationID,))
-        historicalJSONStr = thisCursor.fetchone()[0]
+        thisCursor.execute(sqlCmd, params)
+        sampleRows = thisCursor.fetchall()
         thisCursor.close()
+        print(f'Queried {len(sampleRows)} historical samples for {len(stationIDs)} stations')
 
-        historicalDF = convertJSONStrToDF(historicalJSONStr)
-        return historicalDF
+        return splitSampleRowsByStation(sampleRows, stationIDs, columnMap)
+
+    def countHistoricalSamples(self, stationIDs: list[str], months: list[int] = None, startDate: datetime = None, endDate: datetime = None,
+                               minPeriod: float = None, minWvht: float = None) -> dict:
+        stationIDs = list(stationIDs)
+        if not stationIDs:
+            return dict()
+
+        whereClause, params = buildHistoricalFilters(stationIDs, months, startDate, endDate, minPeriod, minWvht)
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT station_id, COUNT(*) FROM historical_samples WHERE {whereClause} GROUP BY station_id', params)
+        counts = dict(thisCursor.fetchall())
+        thisCursor.close()
+        return {stationID: counts.get(stationID, 0) for stationID in stationIDs}
+
+    def writeClimatology(self, stationID: str, climatology: dict):
+        # replaces the station's climatology rows, the caller commits (see updateHistoricalDataEntry)
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM climatology WHERE station_id = %s', (stationID,))
+        sqlCmd = '''INSERT INTO climatology (station_id, month, n_samples, first_year, last_year, wvht_percentiles, period_hist, direction_hist, samples)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+        climatologyRows = [(stationID,) + monthClimatology.toRow() + (self.serializeFrame(stationID, monthClimatology.getSamplesDF()),)
+                           for monthClimatology in climatology.values()]
+        thisCursor.executemany(sqlCmd, climatologyRows)
+        thisCursor.close()
+        print(f'Wrote climatology of station {stationID} for {len(climatologyRows)} months')
+
+    def rebuildClimatology(self, stationID: str):
+        # for stations whose historical samples were stored before the climatology table existed
+        historicalDF = self.queryHistoricalData([stationID])[stationID]
+        self.writeClimatology(stationID, buildClimatology(historicalDF))
+        self.connection.commit()
+
+    def readClimatology(self, stationIDs: list[str], months: list[int] = None, withSamples: bool = True) -> dict:
+        '''
+        Reads stationID -> {month: MonthlyClimatology} with one query on the (station_id, month) primary key.
+
+        Without withSamples only the counts, percentile grid and histograms are read, which is enough for
+        MonthlyClimatology.getWvhtAtPercentile on the grid. Stations without a climatology map to an empty dict.
+        '''
+        stationIDs = list(stationIDs)
+        climatologies = {stationID: dict() for stationID in stationIDs}
+        if not stationIDs:
+            return climatologies
+
+        conditions = [f'station_id IN ({buildPlaceholders(stationIDs)})']
+        params = list(stationIDs)
+        if months is not None:
+            conditions.append(f'month IN ({buildPlaceholders(months)})')
+            params += list(months)
+
+        samplesColumn = ', samples' if withSamples else ''
+        sqlCmd = f'''SELECT station_id, month, n_samples, first_year, last_year, wvht_percentiles, period_hist, direction_hist{samplesColumn}
+                     FROM climatology WHERE {' AND '.join(conditions)}'''
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(sqlCmd, params)
+        for row in thisCursor.fetchall():
+            samplesDF = self.serializer.deserialize(row[8]) if withSamples else None
+            climatologies[row[0]][row[1]] = MonthlyClimatology.fromRow(row[1:8], samplesDF)
+        thisCursor.close()
+        return climatologies
+
+    def removeClimatologyForStation(self, stationID: str):
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM climatology WHERE station_id = %s', (stationID,))
+        thisCursor.close()
+
+    def archiveRealtimeSamples(self, stationID: str, buoyRTDF: pd.DataFrame, commit: bool = True) -> int:
+        '''
+        Appends the observations newer than the newest archived one to realtime_archive, tagged with their month partition.
+
+        Unlike realtime_samples nothing is trimmed here, see compactArchivePartitions and applyArchiveRetention.
+        Returns the number of rows added.
+        '''
+        newestObsTime = self.getNewestObservationTime('realtime_archive', stationID)
+        newDF = buoyRTDF if newestObsTime is None else buoyRTDF[buoyRTDF['Date'] > pd.Timestamp(newestObsTime)]
+        archiveRows = [sampleRow + (getPartitionMonth(sampleRow[1]),) for sampleRow in convertDFToSampleRows(stationID, newDF, REALTIME_SAMPLE_COLUMNS)]
+        if archiveRows:
+            upsertSuffix = self.backend.buildUpsertSuffix(['station_id', 'partition_month', 'obs_time'], ['wvht', 'period', 'direction'])
+            sqlCmd = f'''INSERT INTO realtime_archive (station_id, obs_time, wvht, period, direction, partition_month)
+                         VALUES (%s, %s, %s, %s, %s, %s) {upsertSuffix}'''
+            thisCursor = self.connection.cursor()
+            thisCursor.executemany(sqlCmd, archiveRows)
+            thisCursor.close()
+
+        if commit:
+            self.connection.commit()
+        print(f'Archived {len(archiveRows)} realtime rows for station {stationID}')
+        return len(archiveRows)
+
+    def readArchivePartition(self, stationID: str, partitionMonth: int) -> pd.DataFrame:
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('SELECT data FROM realtime_archive_partitions WHERE station_id = %s AND partition_month = %s', (stationID, partitionMonth))
+        partitionRow = thisCursor.fetchone()
+        thisCursor.close()
+        if partitionRow is None:
+            return None
+        return self.serializer.deserialize(partitionRow[0])
+
+    def compactArchivePartitions(self, stationID: str, now: datetime = None) -> int:
+        '''
+        Merges the rows of every finished month into one serialized frame per month in realtime_archive_partitions.
+
+        A month is only compacted once it ended more than REALTIME_RETENTION ago, so no later realtime file can add rows to it.
+        A month that already has a compacted frame gets the rows merged into it. Returns the number of months compacted.
+        '''
+        if now is None:
+            now = datetime.now()
+        firstOpenMonth = getPartitionMonth(now - REALTIME_RETENTION)
+
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('SELECT DISTINCT partition_month FROM realtime_archive WHERE station_id = %s AND partition_month < %s', (stationID, firstOpenMonth))
+        partitionMonths = sorted(row[0] for row in thisCursor.fetchall())
+
+        upsertSuffix = self.backend.buildUpsertSuffix(['station_id', 'partition_month'], ['n_samples', 'data'], ['compacted_at'])
+        for partitionMonth in partitionMonths:
+            thisCursor.execute('''SELECT obs_time, wvht, period, direction FROM realtime_archive
+                                  WHERE station_id = %s AND partition_month = %s ORDER BY obs_time''', (stationID, partitionMonth))
+            monthDF = convertSampleRowsToDF(thisCursor.fetchall(), REALTIME_SAMPLE_COLUMNS)
+            compactedDF = self.readArchivePartition(stationID, partitionMonth)
+            if compactedDF is not None:
+                monthDF = pd.concat([compactedDF, monthDF]).drop_duplicates('Date', keep='last').sort_values('Date')
+
+            frameBlob = self.serializeFrame(stationID, monthDF)
+            thisCursor.execute(f'''INSERT INTO realtime_archive_partitions (station_id, partition_month, n_samples, data)
+                                   VALUES (%s, %s, %s, %s) {upsertSuffix}''', (stationID, partitionMonth, len(monthDF), frameBlob))
+            thisCursor.execute('DELETE FROM realtime_archive WHERE station_id = %s AND partition_month = %s', (stationID, partitionMonth))
+            print(f'Compacted {len(monthDF)} archived realtime rows of station {stationID} for {partitionMonth} into {len(frameBlob) / 1e3:.1f} kB')
+
+        thisCursor.close()
+        self.connection.commit()
+        return len(partitionMonths)
+
+    def applyArchiveRetention(self, stationID: str, retentionMonths: int = DEFAULT_ARCHIVE_RETENTION_MONTHS, now: datetime = None) -> int:
+        # drops whole month partitions older than retentionMonths, returns the number of rows and compacted months removed
+        if now is None:
+            now = datetime.now()
+        cutoffMonth = shiftPartitionMonth(getPartitionMonth(now), -retentionMonths)
+
+        nRemoved = 0
+        thisCursor = self.connection.cursor()
+        for tableName in ['realtime_archive', 'realtime_archive_partitions']:
+            thisCursor.execute(f'DELETE FROM {tableName} WHERE station_id = %s AND partition_month < %s', (stationID, cutoffMonth))
+            nRemoved += thisCursor.rowcount
+        thisCursor.close()
+        self.connection.commit()
+        if nRemoved > 0:
+            print(f'Removed {nRemoved} archived realtime rows / months of station {stationID} from before {cutoffMonth}')
+        return nRemoved
+
+    def getArchivedRealtimeData(self, stationID: str, startDate: datetime = None, endDate: datetime = None) -> pd.DataFrame:
+        '''
+        Archived realtime observations in [startDate, endDate), oldest first.
+
+        Only the month partitions overlapping the range are read, from both the compacted frames and the recent rows.
+        '''
+        conditions = ['station_id = %s']
+        params = [stationID]
+        if startDate is not None:
+            conditions.append('partition_month >= %s')
+            params.append(getPartitionMonth(startDate))
+        if endDate is not None:
+            conditions.append('partition_month <= %s')
+            params.append(getPartitionMonth(endDate))
+        whereClause = ' AND '.join(conditions)
+
+        thisCursor = self.connection.cursor()
+        thisCursor.execute(f'SELECT data FROM realtime_archive_partitions WHERE {whereClause} ORDER BY partition_month', params)
+        archiveDFs = [self.serializer.deserialize(row[0]) for row in thisCursor.fetchall()]
+        thisCursor.execute(f'SELECT obs_time, wvht, period, direction FROM realtime_archive WHERE {whereClause} ORDER BY obs_time', params)
+        archiveDFs.append(convertSampleRowsToDF(thisCursor.fetchall(), REALTIME_SAMPLE_COLUMNS))
+        thisCursor.close()
+
+        archiveDF = pd.concat(archiveDFs, ignore_index=True).drop_duplicates('Date', keep='last').sort_values('Date')
+        if startDate is not None:
+            archiveDF = archiveDF[archiveDF['Date'] >= pd.Timestamp(startDate)]
+        if endDate is not None:
+            archiveDF = archiveDF[archiveDF['Date'] < pd.Timestamp(endDate)]
+        return archiveDF.reset_index(drop=True)
+
+    def getContinuousTimeline(self, stationID: str, startDate: datetime = None, endDate: datetime = None) -> pd.DataFrame:
+        '''
+        Historical samples followed by the archived realtime observations after the last historical one, in one frame.
+
+        The realtime swell period and direction stand in for DPD and MWD after the historical data ends, with the
+        direction turned into degrees true. The source column tells the two apart.
+        '''
+        historicalDF = self.queryHistoricalData([stationID], startDate=startDate, endDate=endDate)[stationID]
+        archiveStartDate = startDate
+        if len(historicalDF) > 0:
+            archiveStartDate = historicalDF['Date'].max().to_pydatetime() + timedelta(seconds=1)
+
+        archiveDF = self.getArchivedRealtimeData(stationID, archiveStartDate, endDate)
+        archiveDF = archiveDF.rename(columns={'SwP': 'DPD', 'SwD': 'MWD'})
+        archiveDF['MWD'] = convertSwellDirToDegreesTrue(archiveDF['MWD'])
+
+        timelineDF = pd.concat([historicalDF.assign(source='historical'), archiveDF.assign(source='realtime')], ignore_index=True)
+        print(f'Timeline for station {stationID}: {len(historicalDF)} historical and {len(archiveDF)} archived realtime samples')
+        return timelineDF
+
+    def removeArchiveForStation(self, stationID: str):
+        thisCursor = self.connection.cursor()
+        thisCursor.execute('DELETE FROM realtime_archive WHERE station_id = %s', (stationID,))
+        thisCursor.execute('DELETE FROM realtime_archive_partitions WHERE station_id = %s', (stationID,))
+        thisCursor.close()
 
     def removeStationsTableEntry(self, stationID):
         thisCursor = self.connection.cursor()
@@ -214,5 +734,7 @@ class DatabaseInteractor():
         thisCursor.close()
         
     def closeConnection(self):
-        self.connection.close()
+        if self.connection is not None:
+            self.backend.release(self.connection)
+            self.connection = None
 
@@ -0,0 +1,77 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+# binary blobs start with this header: magic bytes, format version and a format code
+HEADER_MAGIC = b'NDBCFRM'
+FORMAT_VERSION = 1
+FORMAT_CODES = {'parquet': 1, 'arrow': 2}
+HEADER_SIZE = len(HEADER_MAGIC) + 2
+
+DEFAULT_FORMAT = 'parquet'
+DEFAULT_COMPRESSION = 'zstd'
+
+
+def convertDFToJSONStr(df):
+    return df.to_json(date_format='iso', orient='records')
+
+def convertJSONStrToDF(jsonStr):
+    return pd.read_json(io.StringIO(jsonStr), orient='records', convert_dates=['Date'])
+
+
+class FrameSerializer():
+    '''
+    Turns data frames into blobs for the database and back.
+
+    The binary formats are Parquet or Arrow IPC with zstd or lz4 compression, prefixed by a header
+    carrying the format version and code. Blobs without the header are the JSON records written
+    before the binary formats existed, so those rows stay readable. Writing 'json' keeps producing
+    that legacy format.
+    '''
+    def __init__(self, frameFormat: str = DEFAULT_FORMAT, compression: str = DEFAULT_COMPRESSION):
+        if frameFormat not in FORMAT_CODES and frameFormat != 'json':
+            raise ValueError(f'Unsupported frame format {frameFormat}, use one of {list(FORMAT_CODES) + ["json"]}')
+        if compression not in ['zstd', 'lz4', None]:
+            raise ValueError(f'Unsupported compression {compression}, use zstd, lz4 or None')
+        self.frameFormat = frameFormat
+        self.compression = compression
+
+    @staticmethod
+    def buildHeader(frameFormat: str) -> bytes:
+        return HEADER_MAGIC + bytes([FORMAT_VERSION, FORMAT_CODES[frameFormat]])
+
+    def serialize(self, df: pd.DataFrame) -> bytes:
+        if self.frameFormat == 'json':
+            return convertDFToJSONStr(df).encode('utf-8')
+
+        buffer = io.BytesIO()
+        buffer.write(self.buildHeader(self.frameFormat))
+        if self.frameFormat == 'parquet':
+            df.to_parquet(buffer, engine='pyarrow', compression=self.compression)
+        else:
+            table = pa.Table.from_pandas(df)
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            with pa.ipc.new_file(buffer, table.schema, options=options) as writer:
+                writer.write_table(table)
+        return buffer.getvalue()
+
+    @staticmethod
+    def deserialize(blob) -> pd.DataFrame:
+        if isinstance(blob, str):
+            return convertJSONStrToDF(blob)
+
+        blob = bytes(blob)
+        if not blob.startswith(HEADER_MAGIC):
+            return convertJSONStrToDF(blob.decode('utf-8'))
+
+        formatVersion, formatCode = blob[len(HEADER_MAGIC)], blob[len(HEADER_MAGIC) + 1]
+        if formatVersion > FORMAT_VERSION:
+            raise ValueError(f'Frame blob has format version {formatVersion}, this code only reads up to {FORMAT_VERSION}')
+
+        payload = memoryview(blob)[HEADER_SIZE:]
+        if formatCode == FORMAT_CODES['parquet']:
+            return pd.read_parquet(io.BytesIO(payload), engine='pyarrow')
+        if formatCode == FORMAT_CODES['arrow']:
+            return pa.ipc.open_file(pa.BufferReader(payload)).read_all().to_pandas()
+        raise ValueError(f'Unknown frame format code {formatCode}')
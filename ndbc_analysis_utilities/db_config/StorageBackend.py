@@ -0,0 +1,277 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from .ConnectionPool import ConnectionPool, getSharedPool
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.expanduser('~'), '.ndbc_buoy_data', 'buoy_data.sqlite')
+
+
+class StorageBackend():
+    '''
+    Where DatabaseInteractor keeps its tables.
+
+    A backend hands out DB-API connections that take %s placeholders (acquire / release) and fills in the few
+    pieces of SQL that differ between databases: upserts, the current timestamp and the station locations.
+    '''
+    name = None
+    currentTimestampSql = 'CURRENT_TIMESTAMP'
+
+    def acquire(self):
+        raise NotImplementedError
+
+    def release(self, connection):
+        raise NotImplementedError
+
+    def closeAll(self):
+        pass
+
+    def printSummary(self):
+        pass
+
+    def buildUpsertSuffix(self, keyColumns: list[str], updateColumns: list[str], touchColumns: list[str] = ()) -> str:
+        '''
+        SQL appended to an INSERT so rows with existing keys get updateColumns overwritten and touchColumns set to now.
+        '''
+        raise NotImplementedError
+
+    def getStationLocationInsertSql(self) -> tuple[str]:
+        # (columns, values) that store a (latitude, longitude) pair in the stations table
+        raise NotImplementedError
+
+    def getStationLocationSelectSql(self) -> str:
+        raise NotImplementedError
+
+
+class MySQLBackend(StorageBackend):
+    '''
+    The MySQL / RDS database from config_local.py, through a ConnectionPool (the process-wide one by default).
+    '''
+    name = 'mysql'
+
+    def __init__(self, pool: ConnectionPool = None):
+        self.pool = pool if pool is not None else getSharedPool()
+
+    def acquire(self):
+        return self.pool.acquire()
+
+    def release(self, connection):
+        self.pool.release(connection)
+
+    def closeAll(self):
+        self.pool.closeAll()
+
+    def printSummary(self):
+        self.pool.printSummary()
+
+    def buildUpsertSuffix(self, keyColumns: list[str], updateColumns: list[str], touchColumns: list[str] = ()) -> str:
+        assignments = [f'{colName} = VALUES({colName})' for colName in updateColumns]
+        assignments += [f'{colName} = {self.currentTimestampSql}' for colName in touchColumns]
+        return f'ON DUPLICATE KEY UPDATE {", ".join(assignments)}'
+
+    def getStationLocationInsertSql(self) -> tuple[str]:
+        return 'location', 'POINT(%s, %s)'
+
+    def getStationLocationSelectSql(self) -> str:
+        return 'ST_X(location) as latitude, ST_Y(location) as longitude'
+
+
+def adaptDatetime(value: datetime) -> str:
+    return value.isoformat(' ')
+
+def convertDatetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode('ascii'))
+
+sqlite3.register_adapter(datetime, adaptDatetime)
+sqlite3.register_converter('DATETIME', convertDatetime)
+sqlite3.register_converter('TIMESTAMP', convertDatetime)
+
+SQLITE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS stations (
+        id TEXT NOT NULL PRIMARY KEY,
+        latitude REAL,
+        longitude REAL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS data_updates (
+        station_id TEXT NOT NULL,
+        data_set TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (station_id, data_set)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS frame_cache (
+        station_id TEXT NOT NULL,
+        data_set TEXT NOT NULL,
+        data BLOB,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (station_id, data_set)
+    )''',
+    # same layout as createHistoricalManifestTable in editDBTables.py
+    '''CREATE TABLE IF NOT EXISTS historical_manifest (
+        station_id TEXT NOT NULL,
+        file_kind TEXT NOT NULL,
+        period INTEGER NOT NULL,
+        n_samples INTEGER,
+        fetched_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (station_id, file_kind, period)
+    )''',
+    # same layout as createClimatologyTable in editDBTables.py
+    '''CREATE TABLE IF NOT EXISTS climatology (
+        station_id TEXT NOT NULL,
+        month INTEGER NOT NULL,
+        n_samples INTEGER,
+        first_year INTEGER,
+        last_year INTEGER,
+        wvht_percentiles TEXT,
+        period_hist TEXT,
+        direction_hist TEXT,
+        samples BLOB,
+        built_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (station_id, month)
+    )''',
+    # same layout as createRealtimeArchiveTables in editDBTables.py, partition_month is YYYYMM
+    '''CREATE TABLE IF NOT EXISTS realtime_archive (
+        station_id TEXT NOT NULL,
+        obs_time DATETIME NOT NULL,
+        wvht REAL,
+        period REAL,
+        direction REAL,
+        partition_month INTEGER NOT NULL,
+        PRIMARY KEY (station_id, partition_month, obs_time)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS realtime_archive_partitions (
+        station_id TEXT NOT NULL,
+        partition_month INTEGER NOT NULL,
+        n_samples INTEGER,
+        data BLOB,
+        compacted_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        PRIMARY KEY (station_id, partition_month)
+    )''',
+]
+for tableName in ['realtime_samples', 'historical_samples']:
+    # same layout and indexes as createSamplesTable in editDBTables.py
+    SQLITE_SCHEMA += [
+        f'''CREATE TABLE IF NOT EXISTS {tableName} (
+            station_id TEXT NOT NULL,
+            obs_time DATETIME NOT NULL,
+            wvht REAL,
+            period REAL,
+            direction REAL,
+            obs_month INTEGER GENERATED ALWAYS AS (CAST(strftime('%m', obs_time) AS INTEGER)) STORED,
+            PRIMARY KEY (station_id, obs_time)
+        ) WITHOUT ROWID''',
+        f'CREATE INDEX IF NOT EXISTS idx_{tableName}_month ON {tableName} (station_id, obs_month, obs_time)',
+        f'CREATE INDEX IF NOT EXISTS idx_{tableName}_time ON {tableName} (obs_time)',
+    ]
+
+
+class SQLiteCursor():
+    # sqlite3 uses ? placeholders where pymysql uses %s
+    def __init__(self, cursor: sqlite3.Cursor):
+        self.cursor = cursor
+
+    def execute(self, sqlCmd: str, params=()):
+        self.cursor.execute(sqlCmd.replace('%s', '?'), params)
+
+    def executemany(self, sqlCmd: str, paramRows):
+        self.cursor.executemany(sqlCmd.replace('%s', '?'), paramRows)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    def close(self):
+        self.cursor.close()
+
+
+class SQLiteConnection():
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteBackend(StorageBackend):
+    '''
+    Embedded database in a single local file, for running the --db path without a MySQL server.
+
+    The tables are created on first use with the same keys, indexes and stored obs_month column as the MySQL tables.
+    Station locations are plain latitude / longitude columns instead of a POINT. Every acquire opens its own
+    connection, which is cheap for a local file and keeps each worker thread on its own connection.
+    '''
+    name = 'sqlite'
+    currentTimestampSql = "datetime('now', 'localtime')"
+
+    def __init__(self, dbPath: str = DEFAULT_SQLITE_PATH):
+        self.dbPath = dbPath
+        self.schemaLock = threading.Lock()
+        self.schemaCreated = False
+
+    def createSchema(self, connection: sqlite3.Connection):
+        with self.schemaLock:
+            if self.schemaCreated:
+                return
+            for sqlCmd in SQLITE_SCHEMA:
+                connection.execute(sqlCmd)
+            connection.commit()
+            self.schemaCreated = True
+
+    def acquire(self) -> SQLiteConnection:
+        dbDir = os.path.dirname(self.dbPath)
+        if dbDir:
+            os.makedirs(dbDir, exist_ok=True)
+
+        # the timeout lets concurrent writers wait for the file lock instead of failing right away
+        connection = sqlite3.connect(self.dbPath, timeout=30.0, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self.createSchema(connection)
+        return SQLiteConnection(connection)
+
+    def release(self, connection: SQLiteConnection):
+        connection.rollback()
+        connection.close()
+
+    def printSummary(self):
+        print(f'SQLite database at {self.dbPath} ({os.path.getsize(self.dbPath) / 1e6:.2f} MB)')
+
+    def buildUpsertSuffix(self, keyColumns: list[str], updateColumns: list[str], touchColumns: list[str] = ()) -> str:
+        assignments = [f'{colName} = excluded.{colName}' for colName in updateColumns]
+        assignments += [f'{colName} = {self.currentTimestampSql}' for colName in touchColumns]
+        return f'ON CONFLICT ({", ".join(keyColumns)}) DO UPDATE SET {", ".join(assignments)}'
+
+    def getStationLocationInsertSql(self) -> tuple[str]:
+        return 'latitude, longitude', '%s, %s'
+
+    def getStationLocationSelectSql(self) -> str:
+        return 'latitude, longitude'
+
+
+sharedBackend = None
+sharedBackendLock = threading.Lock()
+
+def getSharedBackend() -> StorageBackend:
+    '''
+    The backend used when none is injected: SQLite when NDBC_DB_BACKEND=sqlite (at NDBC_SQLITE_PATH if set), MySQL otherwise.
+    '''
+    global sharedBackend
+    with sharedBackendLock:
+        if sharedBackend is None:
+            if os.environ.get('NDBC_DB_BACKEND', 'mysql') == 'sqlite':
+                sharedBackend = SQLiteBackend(os.environ.get('NDBC_SQLITE_PATH', DEFAULT_SQLITE_PATH))
+            else:
+                sharedBackend = MySQLBackend()
+        return sharedBackend
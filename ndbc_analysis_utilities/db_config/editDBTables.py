@@ -58,14 +58,167 @@ def createHistoricalDataTable(connection):
 def deleteHistoricalDataTable(connection):
     connection.cursor().execute('DROP TABLE historical_data')
 
+def createSamplesTable(connection, tableName: str):
+    # one row per observation, the primary key doubles as the index for per-station time range queries
+    connection.cursor().execute(f'''
+        CREATE TABLE {tableName} (
+            station_id VARCHAR(255) NOT NULL,
+            obs_time DATETIME NOT NULL,
+            wvht FLOAT,
+            period FLOAT,
+            direction FLOAT,
+            obs_month TINYINT AS (MONTH(obs_time)) STORED,
+            PRIMARY KEY (station_id, obs_time),
+            INDEX idx_{tableName}_month (station_id, obs_month, obs_time),
+            INDEX idx_{tableName}_time (obs_time)
+        )
+    ''')
+
+def deleteSamplesTable(connection, tableName: str):
+    connection.cursor().execute(f'DROP TABLE {tableName}')
+
+def createDataUpdatesTable(connection):
+    # when each station's realtime / historical samples were last rewritten
+    connection.cursor().execute('''
+        CREATE TABLE data_updates (
+            station_id VARCHAR(255) NOT NULL,
+            data_set VARCHAR(16) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, data_set)
+        )
+    ''')
+
+def deleteDataUpdatesTable(connection):
+    connection.cursor().execute('DROP TABLE data_updates')
+
+def createFrameCacheTable(connection):
+    # whole data frames serialized by FrameSerializer, older rows may still hold JSON text
+    connection.cursor().execute('''
+        CREATE TABLE frame_cache (
+            station_id VARCHAR(255) NOT NULL,
+            data_set VARCHAR(16) NOT NULL,
+            data LONGBLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, data_set)
+        )
+    ''')
+
+def deleteFrameCacheTable(connection):
+    connection.cursor().execute('DROP TABLE frame_cache')
+
+def createRealtimeArchiveTables(connection):
+    # every realtime observation, clustered by station and month partition (YYYYMM) so range scans only touch their months.
+    # finished months get compacted into one serialized frame per month in realtime_archive_partitions
+    connection.cursor().execute('''
+        CREATE TABLE realtime_archive (
+            station_id VARCHAR(255) NOT NULL,
+            obs_time DATETIME NOT NULL,
+            wvht FLOAT,
+            period FLOAT,
+            direction FLOAT,
+            partition_month INT NOT NULL,
+            PRIMARY KEY (station_id, partition_month, obs_time)
+        )
+    ''')
+    connection.cursor().execute('''
+        CREATE TABLE realtime_archive_partitions (
+            station_id VARCHAR(255) NOT NULL,
+            partition_month INT NOT NULL,
+            n_samples INT,
+            data LONGBLOB,
+            compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, partition_month)
+        )
+    ''')
+
+def deleteRealtimeArchiveTables(connection):
+    connection.cursor().execute('DROP TABLE realtime_archive')
+    connection.cursor().execute('DROP TABLE realtime_archive_partitions')
+
+def createClimatologyTable(connection):
+    # per station and calendar month summaries of the historical samples, see MonthlyClimatology.
+    # the percentiles and histograms are JSON arrays, samples is a FrameSerializer blob of the wave heights sorted ascending with their periods
+    connection.cursor().execute('''
+        CREATE TABLE climatology (
+            station_id VARCHAR(255) NOT NULL,
+            month TINYINT NOT NULL,
+            n_samples INT,
+            first_year SMALLINT,
+            last_year SMALLINT,
+            wvht_percentiles TEXT,
+            period_hist TEXT,
+            direction_hist TEXT,
+            samples LONGBLOB,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, month)
+        )
+    ''')
+
+def deleteClimatologyTable(connection):
+    connection.cursor().execute('DROP TABLE climatology')
+
+def createHistoricalManifestTable(connection):
+    # which yearly (period YYYY) and monthly (period YYYYMM) stdmet files are stored in historical_samples
+    connection.cursor().execute('''
+        CREATE TABLE historical_manifest (
+            station_id VARCHAR(255) NOT NULL,
+            file_kind VARCHAR(8) NOT NULL,
+            period INT NOT NULL,
+            n_samples INT,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, file_kind, period)
+        )
+    ''')
+
+def deleteHistoricalManifestTable(connection):
+    connection.cursor().execute('DROP TABLE historical_manifest')
+
 def createStationsTable(connection):
     connection.cursor().execute('''
         CREATE TABLE stations (
-            id VARCHAR(255),
-            location POINT
+            id VARCHAR(255) NOT NULL,
+            location POINT,
+            PRIMARY KEY (id)
         )
     ''')
 
+def migrateBlobTable(connection, blobTableName: str, samplesTableName: str, dataSetName: str, columnNames: tuple):
+    # expand every JSON blob into rows with JSON_TABLE (MySQL 8), the dates were written by pandas in ISO format
+    periodCol, directionCol = columnNames
+    connection.cursor().execute(f'''
+        INSERT IGNORE INTO {samplesTableName} (station_id, obs_time, wvht, period, direction)
+        SELECT b.station_id, STR_TO_DATE(j.obs_time, '%Y-%m-%dT%H:%i:%s.%f'), j.wvht, j.period, j.direction
+        FROM {blobTableName} b,
+        JSON_TABLE(b.data, '$[*]' COLUMNS (
+            obs_time VARCHAR(32) PATH '$.Date',
+            wvht DOUBLE PATH '$.WVHT',
+            period DOUBLE PATH '$.{periodCol}',
+            direction DOUBLE PATH '$.{directionCol}'
+        )) j
+    ''')
+    connection.cursor().execute(f'''
+        INSERT INTO data_updates (station_id, data_set, updated_at)
+        SELECT station_id, '{dataSetName}', MAX(created_at) FROM {blobTableName} GROUP BY station_id
+        ON DUPLICATE KEY UPDATE updated_at = VALUES(updated_at)
+    ''')
+
+def migrateBlobTables(connection):
+    # moves the old one-JSON-blob-per-station tables into the row per sample tables, the old tables are kept
+    createSamplesTable(connection, 'realtime_samples')
+    createSamplesTable(connection, 'historical_samples')
+    createDataUpdatesTable(connection)
+    connection.cursor().execute('ALTER TABLE stations MODIFY id VARCHAR(255) NOT NULL, ADD PRIMARY KEY (id)')
+    migrateBlobTable(connection, 'realtime_data', 'realtime_samples', 'realtime', ('SwP', 'SwD'))
+    migrateBlobTable(connection, 'historical_data', 'historical_samples', 'historical', ('DPD', 'MWD'))
+
+    # the JSON blobs stay readable through FrameSerializer until the next update rewrites them in binary
+    createFrameCacheTable(connection)
+    connection.cursor().execute('''
+        INSERT INTO frame_cache (station_id, data_set, data, created_at)
+        SELECT station_id, 'historical', data, created_at FROM historical_data
+        ON DUPLICATE KEY UPDATE data = VALUES(data), created_at = VALUES(created_at)
+    ''')
+
 def deleteStationsTable(connection):
     connection.cursor().execute('DROP TABLE stations')
 
@@ -79,17 +232,46 @@ def main():
         return
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("--action", type=str, required=True, help="create-tables or delete-tables")
+    parser.add_argument("--action", type=str, required=True, help="create-tables, delete-tables, create-archive-tables, create-climatology-table, create-manifest-table, migrate-blob-tables or delete-blob-tables")
 
     args = parser.parse_args()
 
     if args.action == 'create-tables':
         createStationsTable(connection)
-        createRealtimeDataTable(connection)
-        createHistoricalDataTable(connection)
+        createSamplesTable(connection, 'realtime_samples')
+        createSamplesTable(connection, 'historical_samples')
+        createDataUpdatesTable(connection)
+        createFrameCacheTable(connection)
+        createRealtimeArchiveTables(connection)
+        createClimatologyTable(connection)
+        createHistoricalManifestTable(connection)
         connection.commit()
     elif args.action == 'delete-tables':
         deleteStationsTable(connection)
+        deleteSamplesTable(connection, 'realtime_samples')
+        deleteSamplesTable(connection, 'historical_samples')
+        deleteDataUpdatesTable(connection)
+        deleteFrameCacheTable(connection)
+        deleteRealtimeArchiveTables(connection)
+        deleteClimatologyTable(connection)
+        deleteHistoricalManifestTable(connection)
+        connection.commit()
+    elif args.action == 'create-archive-tables':
+        # for databases created before the realtime archive existed
+        createRealtimeArchiveTables(connection)
+        connection.commit()
+    elif args.action == 'create-climatology-table':
+        # for databases created before the climatology existed, fill it with UpdateSwellDB.py --rebuildClimatology
+        createClimatologyTable(connection)
+        connection.commit()
+    elif args.action == 'create-manifest-table':
+        # for databases created before delta historical updates, the first delta update fetches every year once
+        createHistoricalManifestTable(connection)
+        connection.commit()
+    elif args.action == 'migrate-blob-tables':
+        migrateBlobTables(connection)
+        connection.commit()
+    elif args.action == 'delete-blob-tables':
         deleteRealtimeDataTable(connection)
         deleteHistoricalDataTable(connection)
         connection.commit()
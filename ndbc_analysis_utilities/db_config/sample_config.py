@@ -5,4 +5,4 @@ ENDPOINT = ''
 PORT = 3306
 DBNAME = ''   # name of the schema
 SSL_CA = ''
-
+POOL_SIZE = 4   # connections kept open per process, at least the # of FetchEngine workers
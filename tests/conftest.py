@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# the buoys create their shared caches on construction, keep them out of the user's cache directory
+os.environ.setdefault('NDBC_CACHE_DIR', tempfile.mkdtemp(prefix='ndbc_test_cache_'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
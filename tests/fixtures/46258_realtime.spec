@@ -0,0 +1,6 @@
+#YY  MM DD hh mm WVHT  SwH  SwP  WWH  WWP SwD WWD  STEEPNESS  APD MWD
+#yr  mo dy hr mn    m    m  sec    m  sec  -  degT     -      sec degT
+2024 02 01 01 30  1.2  1.1 14.3  0.4  4.3   W WNW    AVERAGE  7.3 272
+2024 02 01 01 00   MM   MM   MM   MM   MM  MM  MM         MM   MM  MM
+2024 02 01 00 30  1.4  1.3 15.4  0.5  5.0 WSW   W    AVERAGE  7.9 255
+2024 02 01 00 00  1.3  1.2   MM  0.5  5.0   S  NW      SWELL  8.1 180
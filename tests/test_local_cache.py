@@ -0,0 +1,28 @@
+import pandas as pd
+from ndbc_analysis_utilities.LocalCache import HistoricalCache, RealtimeCache
+
+
+def makeRealtimeDF() -> pd.DataFrame:
+    return pd.DataFrame({'Date': pd.date_range(end='2024-02-01', periods=3, freq='h')[::-1], 'WVHT': [1.0, 1.5, 2.0]})
+
+def test_historical_entry_without_format_version_is_a_miss(tmp_path):
+    cache = HistoricalCache(str(tmp_path))
+    yearDF = pd.DataFrame({'Date': pd.date_range('2020-01-01', periods=3, freq='h'), 'WVHT': [1.0, 99.0, 2.0]})
+    yearDF.to_parquet(cache.getFilePath('test', 2020))   # written before the entries were versioned
+    assert cache.load('test', 2020) is None
+    assert cache.listEntries() == []
+
+    cache.store('test', 2020, yearDF)
+    assert yearDF.attrs == {}
+    pd.testing.assert_frame_equal(cache.load('test', 2020), yearDF)
+
+def test_realtime_memory_hits_hand_out_copies(tmp_path):
+    cache = RealtimeCache(str(tmp_path))
+    realtimeDF = makeRealtimeDF()
+    cache.store('test', realtimeDF, {'ETag': '"abc"'})
+    realtimeDF.loc[0, 'WVHT'] = -1.0
+
+    _, firstDF = cache.load('test')
+    firstDF.loc[1, 'WVHT'] = -1.0
+    _, secondDF = cache.load('test')
+    pd.testing.assert_frame_equal(secondDF, makeRealtimeDF())
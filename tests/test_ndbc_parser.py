@@ -0,0 +1,76 @@
+import os
+import numpy as np
+import pandas as pd
+from ndbc_analysis_utilities import NDBCParser
+from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def readFixture(fileName: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, fileName), 'rb') as f:
+        return f.read()
+
+def readDataRows(fileName: str) -> bytes:
+    # the fixture without its header and units lines, the way filterRowsByMonth sees it
+    return b''.join(readFixture(fileName).splitlines(keepends=True)[2:])
+
+def makeHistoricalFrame(dates: list[str], wvhts: list[float], dpds: list[float], mwds: list[float], rowNumbers: list[int]) -> pd.DataFrame:
+    return pd.DataFrame({'Date': pd.to_datetime(dates), 'WVHT': wvhts, 'DPD': dpds, 'MWD': mwds}, index=rowNumbers)
+
+def test_realtime_table_types_and_missing_values():
+    buoyDF = NDBCParser.readNDBCTable(readFixture('46258_realtime.spec'), NDBCParser.REALTIME_COLUMNS)
+    assert list(buoyDF.columns) == NDBCParser.DATE_COLUMNS + NDBCParser.REALTIME_COLUMNS
+    assert (buoyDF[NDBCParser.DATE_COLUMNS].dtypes == 'int64').all()
+    assert buoyDF['SwD'].dtype == NDBCParser.COMPASS_DTYPE
+    np.testing.assert_array_equal(buoyDF['WVHT'], [1.2, np.nan, 1.4, 1.3])
+    np.testing.assert_array_equal(buoyDF['SwP'], [14.3, np.nan, 15.4, np.nan])
+    assert buoyDF['SwD'].isna().tolist() == [False, True, False, False]
+
+def test_realtime_spec_is_cleaned_to_degrees():
+    buoy = NDBCBuoy('46258')
+    realtimeDF = buoy.cleanRealtimeDataFrame(NDBCParser.parseRealtimeSpec(readFixture('46258_realtime.spec')))
+    expectedDF = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-02-01 01:30', '2024-02-01 01:00', '2024-02-01 00:30', '2024-02-01 00:00']),
+        'WVHT': [1.2, np.nan, 1.4, 1.3],
+        'SwP': [14.3, np.nan, 15.4, np.nan],
+        'SwD': [90.0, np.nan, 67.5, 0.0]})
+    pd.testing.assert_frame_equal(realtimeDF, expectedDF)
+
+def test_month_filter_keeps_whole_rows_of_the_requested_months():
+    data = readDataRows('46258h2010_excerpt.txt')
+    rowBuffer, rowNumbers, nRows = NDBCParser.filterRowsByMonth(data, [2])
+    assert nRows == 6
+    assert rowNumbers.tolist() == [2, 3, 4]
+    assert rowBuffer == b''.join(data.splitlines(keepends=True)[2:5])
+
+    rowBuffer, rowNumbers, nRows = NDBCParser.filterRowsByMonth(data, [1, 3])
+    assert rowNumbers.tolist() == [0, 1, 5]
+
+def test_month_filter_gives_up_on_rows_without_fixed_width_columns():
+    assert NDBCParser.filterRowsByMonth(readDataRows('46258h2010_unaligned.txt'), [2]) is None
+
+def test_stdmet_sentinels_become_missing():
+    parseStats = dict()
+    buoyDF = NDBCParser.parseHistoricalStdmet(readFixture('46258h2010_excerpt.txt'), [2], parseStats=parseStats)
+    # the row with a 99.00 wave height is dropped, the DPD and MWD sentinels of the others become NaN
+    expectedDF = makeHistoricalFrame(['2010-02-01 01:50', '2010-02-01 02:50'], [2.04, 2.11], [np.nan, 15.38], [np.nan, 276.0], [3, 4])
+    pd.testing.assert_frame_equal(buoyDF, expectedDF)
+    assert parseStats['nRows'] == 6
+
+def test_unaligned_stdmet_is_filtered_after_parsing():
+    alignedDF = NDBCParser.parseHistoricalStdmet(readFixture('46258h2010_excerpt.txt'), [1, 3])
+    unalignedDF = NDBCParser.parseHistoricalStdmet(readFixture('46258h2010_unaligned.txt'), [1, 3])
+    expectedDF = makeHistoricalFrame(['2010-01-31 22:50', '2010-01-31 23:50', '2010-03-01 00:50'],
+                                     [1.85, 1.92, 2.50], [14.29, 13.33, 11.76], [282.0, 279.0, 290.0], [0, 1, 5])
+    pd.testing.assert_frame_equal(alignedDF, expectedDF)
+    pd.testing.assert_frame_equal(unalignedDF, expectedDF)
+
+def test_pre_2007_stdmet_without_units_line():
+    # two digit years, no minute column and no units line, so the second line already holds data
+    fileContents = readFixture('46258h1998_excerpt.txt')
+    allMonthsDF = NDBCParser.parseHistoricalStdmet(fileContents, list(range(1, 13)))
+    expectedDF = makeHistoricalFrame(['1998-01-31 23:00', '1998-02-01 00:00', '1998-02-01 02:00'],
+                                     [1.20, 1.31, 1.42], [12.50, 13.33, np.nan], [280.0, np.nan, 284.0], [0, 1, 3])
+    pd.testing.assert_frame_equal(allMonthsDF, expectedDF)
+    pd.testing.assert_frame_equal(NDBCParser.parseHistoricalStdmet(fileContents, [2]), expectedDF.loc[[1, 3]])
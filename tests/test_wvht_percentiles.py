@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from ndbc_analysis_utilities.NDBCBuoy import NDBCBuoy
+from ndbc_analysis_utilities.MonthlyClimatology import buildClimatology
+
+
+def makeBuoy() -> NDBCBuoy:
+    rng = np.random.default_rng(7)
+    dates = pd.date_range('2021-01-01', '2023-12-31 23:00', freq='h')
+    wvhts = np.round(rng.gamma(2.0, 0.6, len(dates)), 2)
+    wvhts[rng.random(len(dates)) < 0.02] = np.nan
+    historicalDF = pd.DataFrame({'Date': dates, 'WVHT': wvhts, 'DPD': rng.uniform(4, 20, len(dates)).round(), 'MWD': rng.uniform(0, 360, len(dates)).round()})
+
+    realtimeDates = pd.date_range(end='2024-02-01', periods=200, freq='h')[::-1]
+    realtimeDF = pd.DataFrame({'Date': realtimeDates, 'WVHT': np.round(rng.gamma(2.0, 0.6, 200), 2), 'SwP': 10.0, 'SwD': 270.0})
+    realtimeDF.loc[[5, 17], 'WVHT'] = np.nan
+
+    buoy = NDBCBuoy('test')
+    buoy.realtimeCache = None
+    buoy.historicalCache = None
+    buoy.storeDataFrame('historical', historicalDF)
+    buoy.storeDataFrame('realtime', realtimeDF)
+    return buoy
+
+def calcScalarPercentiles(buoy: NDBCBuoy, dataSetName: str, wvhts: np.ndarray) -> list[float]:
+    # the single reading path, one calcWVHTPercentile call per wave height
+    percentiles = []
+    for wvht in wvhts:
+        buoy.recentWVHT = wvht
+        percentiles.append(buoy.calcWVHTPercentile(dataSetName))
+    return percentiles
+
+def calcReferencePercentiles(waveheights: np.ndarray, wvhts: np.ndarray) -> list[float]:
+    # % of the samples strictly smaller, with missing readings at 0% like the old sort-and-walk loop
+    waveheights = waveheights[~np.isnan(waveheights)]
+    return [0.0 if np.isnan(wvht) else np.count_nonzero(waveheights < wvht) / len(waveheights) * 100 for wvht in wvhts]
+
+def test_batch_matches_scalar_and_reference():
+    buoy = makeBuoy()
+    wvhts = buoy.dataFrameRealtime['WVHT'].to_numpy()
+    for dataSetName, waveheights in [('historical', buoy.dataFrameHistorical['WVHT'].to_numpy()),
+                                     ('realtime', buoy.dataFrameRealtime['WVHT'].to_numpy()[1:])]:
+        batchPercentiles, nTotalValues = buoy.calcWVHTPercentiles(dataSetName, wvhts)
+        assert nTotalValues == np.count_nonzero(~np.isnan(waveheights))
+        np.testing.assert_allclose(batchPercentiles, calcScalarPercentiles(buoy, dataSetName, wvhts))
+        np.testing.assert_allclose(batchPercentiles, calcReferencePercentiles(waveheights, wvhts))
+
+def test_climatology_batch_matches_samples():
+    buoy = makeBuoy()
+    wvhts = buoy.dataFrameRealtime['WVHT'].to_numpy()
+    samplePercentiles, nSamples = buoy.calcWVHTPercentiles('historical', wvhts)
+
+    buoy.nHistoricalMonths = 12
+    buoy.climatology = buildClimatology(buoy.dataFrameHistorical)
+    climatologyPercentiles, nClimatologySamples = buoy.calcWVHTPercentiles('historical', wvhts)
+    assert nClimatologySamples == nSamples
+    np.testing.assert_allclose(climatologyPercentiles, samplePercentiles)
+    np.testing.assert_allclose(climatologyPercentiles, calcScalarPercentiles(buoy, 'historical', wvhts))
+
+def test_ecdf_is_rebuilt_when_the_frame_changes():
+    buoy = makeBuoy()
+    before, _ = buoy.calcWVHTPercentiles('historical', [1.0])
+    buoy.storeDataFrame('historical', buoy.dataFrameHistorical.assign(WVHT=buoy.dataFrameHistorical['WVHT'] * 2))
+    after, _ = buoy.calcWVHTPercentiles('historical', [1.0])
+    assert after[0] < before[0]